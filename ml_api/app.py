@@ -21,35 +21,49 @@ CORS(app)  # Autoriser les requêtes depuis Next.js
 # Imports des modules ML
 from database import (
     load_recipe_templates, load_user_profile, load_user_interactions,
-    activate_model
+    activate_model, active_model_version, upsert_user_profile, upsert_user_profiles,
+    catalog_version, DB_BACKEND
 )
-from dataset_loader import load_recipe_dataset, load_recipe_dataset_filtered
-from feature_extractor import FeatureExtractor
+from dataset_loader import load_recipe_dataset, load_recipe_dataset_filtered, load_recipe_catalog
+from feature_extractor import FeatureExtractor, HASH_BUCKETS
+from interaction_buffer import get_interaction_buffer, BufferFullError
+from catalog_cache import register as register_derived_cache
 from classification_model import ClassificationModel
 from generation_model import GenerationModel
+from recipe_dedup import DEDUP_THRESHOLD
 
 # Modèles ML (seront chargés à la demande)
 classification_model: Optional[ClassificationModel] = None
 generation_model: Optional[GenerationModel] = None
+# Version active de chaque modèle au moment de son chargement (rechargé si elle change)
+classification_model_version = None
+generation_model_version = None
 feature_extractor = FeatureExtractor()
 
+# Artefacts dérivés du catalogue de recettes (invalidés quand sa version change)
+recipes_by_id = register_derived_cache('recipes_by_id', lambda version: {r['id']: r for r in load_recipe_templates()})
+
 def get_classification_model() -> Optional[ClassificationModel]:
-    """Charge le modèle de classification depuis la DB si disponible"""
-    global classification_model
-    if classification_model is None:
+    """Charge le modèle de classification depuis la DB si disponible (ou si une autre version a été activée)"""
+    global classification_model, classification_model_version
+    version = active_model_version('recipe_classification')
+    if classification_model is None or version != classification_model_version:
         try:
             classification_model = ClassificationModel.load_from_db()
+            classification_model_version = version
             print("✅ Modèle de classification chargé depuis la DB")
         except Exception as e:
             print(f"⚠️  Modèle de classification non disponible: {e}")
     return classification_model
 
 def get_generation_model() -> Optional[GenerationModel]:
-    """Charge le modèle de génération depuis la DB si disponible"""
-    global generation_model
-    if generation_model is None:
+    """Charge le modèle de génération depuis la DB si disponible (ou si une autre version a été activée)"""
+    global generation_model, generation_model_version
+    version = active_model_version('recipe_generation')
+    if generation_model is None or version != generation_model_version:
         try:
             generation_model = GenerationModel.load_from_db()
+            generation_model_version = version
             print("✅ Modèle de génération chargé depuis la DB")
         except Exception as e:
             print(f"⚠️  Modèle de génération non disponible: {e}")
@@ -61,9 +75,27 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'ML API is running',
-        'database': 'JSON file'
+        'database': 'SQLite' if DB_BACKEND == 'sqlite' else 'JSON file',
+        'catalogVersion': catalog_version()
     })
 
+# Nombre maximal d'utilisateurs par appel à /api/ml/sync-users
+SYNC_USERS_MAX_BATCH = int(os.getenv('ML_SYNC_USERS_MAX_BATCH', 10000))
+
+def user_profile_from_payload(data: Dict) -> Dict:
+    """Convertit un utilisateur envoyé par Next.js ({ userId, email, profile }) au format du profil stocké"""
+    profile = data.get('profile') or {}
+    return {
+        'user_id': data.get('userId'),
+        'email': data.get('email'),
+        'age': profile.get('age'),
+        'gender': profile.get('gender'),
+        'activity_level': profile.get('activity_level'),
+        'dietary_preference': profile.get('dietary_preference'),
+        'allergies': profile.get('allergies', []),
+        'health_conditions': profile.get('health_conditions', [])
+    }
+
 @app.route('/api/ml/sync-user', methods=['POST'])
 def sync_user():
     """
@@ -73,46 +105,12 @@ def sync_user():
     try:
         data = request.json
         user_id = data.get('userId')
-        email = data.get('email')
-        profile = data.get('profile', {})
         
         if not user_id:
             return jsonify({'error': 'userId is required'}), 400
         
-        # Charger les données actuelles
-        from database import load_data, save_data
-        db_data = load_data()
-        
-        # Vérifier si l'utilisateur existe déjà
-        user_profiles = db_data.get('user_profiles', [])
-        existing_profile = next((p for p in user_profiles if p.get('user_id') == user_id), None)
-        
-        if existing_profile:
-            # Mettre à jour le profil existant
-            existing_profile.update({
-                'age': profile.get('age'),
-                'gender': profile.get('gender'),
-                'activity_level': profile.get('activity_level'),
-                'dietary_preference': profile.get('dietary_preference'),
-                'allergies': profile.get('allergies', []),
-                'health_conditions': profile.get('health_conditions', [])
-            })
-        else:
-            # Créer un nouveau profil
-            new_profile = {
-                'user_id': user_id,
-                'email': email,
-                'age': profile.get('age'),
-                'gender': profile.get('gender'),
-                'activity_level': profile.get('activity_level'),
-                'dietary_preference': profile.get('dietary_preference'),
-                'allergies': profile.get('allergies', []),
-                'health_conditions': profile.get('health_conditions', [])
-            }
-            user_profiles.append(new_profile)
-        
-        db_data['user_profiles'] = user_profiles
-        save_data(db_data)
+        # Ajouter le profil au journal (pas de réécriture complète du fichier JSON)
+        upsert_user_profile(user_profile_from_payload(data))
         
         return jsonify({
             'success': True,
@@ -123,6 +121,102 @@ def sync_user():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ml/sync-users', methods=['POST'])
+def sync_users():
+    """
+    Synchronise un lot d'utilisateurs en une seule écriture (backfills, pics d'inscriptions)
+    Input: { users: [{ userId, email, profile: {...} }, ...] }
+    Output: { synced, created, updated, errors, results: [{ userId, status, error? }] }
+    """
+    try:
+        data = request.json or {}
+        users = data.get('users')
+        
+        if not isinstance(users, list):
+            return jsonify({'error': 'users must be a list'}), 400
+        if len(users) > SYNC_USERS_MAX_BATCH:
+            return jsonify({'error': f'At most {SYNC_USERS_MAX_BATCH} users per call'}), 413
+        
+        profiles = [user_profile_from_payload(u) if isinstance(u, dict) else {} for u in users]
+        # Même règle que /api/ml/sync-user : userId 0 ou vide est refusé
+        for profile in profiles:
+            if not profile.get('user_id'):
+                profile['user_id'] = None
+        
+        results = upsert_user_profiles(profiles)
+        
+        counts = {'created': 0, 'updated': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        
+        return jsonify({
+            'success': counts['error'] == 0,
+            'synced': counts['created'] + counts['updated'],
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'errors': counts['error'],
+            'results': [
+                {'userId': r['user_id'], 'status': r['status'], **({'error': 'userId is required'} if r['status'] == 'error' else {})}
+                for r in results
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Types d'interactions acceptés (ENUM de user_interactions.interaction_type)
+INTERACTION_TYPES = {'view', 'like', 'dislike', 'save', 'generate'}
+
+def interaction_from_payload(event: Dict) -> Dict:
+    """Convertit un événement envoyé par Next.js au format des interactions stockées"""
+    if not isinstance(event, dict):
+        raise ValueError('event must be an object')
+    if not event.get('userId'):
+        raise ValueError('userId is required')
+    interaction_type = event.get('interactionType', 'view')
+    if interaction_type not in INTERACTION_TYPES:
+        raise ValueError(f'interactionType must be one of {sorted(INTERACTION_TYPES)}')
+    return {
+        'user_id': event.get('userId'),
+        'recipe_template_id': event.get('recipeTemplateId'),
+        'interaction_type': interaction_type,
+        'generated_recipe_id': event.get('generatedRecipeId'),
+        'feedback_score': event.get('feedbackScore'),
+        'created_at': event.get('createdAt')
+    }
+
+@app.route('/api/ml/interactions', methods=['POST'])
+def record_interactions():
+    """
+    Enregistre des interactions utilisateur (écriture différée, par lots)
+    Input: { userId, recipeTemplateId, interactionType, generatedRecipeId, feedbackScore }
+           ou { events: [ {...}, ... ] }
+    Output: 202 { accepted } ; 429 si la file d'attente est pleine
+    """
+    try:
+        data = request.json
+        events = data.get('events') if isinstance(data, dict) and 'events' in data else [data]
+        
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'events must be a non-empty list'}), 400
+        
+        try:
+            interactions = [interaction_from_payload(e) for e in events]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            accepted = get_interaction_buffer().submit(interactions)
+        except BufferFullError as e:
+            response = jsonify({'error': str(e), 'success': False})
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        
+        return jsonify({'success': True, 'accepted': accepted}), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ml/predict-profile', methods=['POST'])
 def predict_profile():
     """
@@ -140,9 +234,8 @@ def predict_profile():
         # Charger les interactions depuis MySQL
         interactions = load_user_interactions(user_id)
         
-        # Charger les recettes depuis MySQL
-        recipes = load_recipe_templates()
-        recipe_dict = {r['id']: r for r in recipes}
+        # Recettes indexées par id (reconstruit uniquement si le catalogue change)
+        recipe_dict = recipes_by_id.get()
         
         # Analyser les interactions pour prédire les préférences
         preferred_cuisines = {}
@@ -164,7 +257,7 @@ def predict_profile():
             top_cuisine = max(preferred_cuisines.items(), key=lambda x: x[1])[0]
             top_type = max(preferred_types.items(), key=lambda x: x[1])[0] if preferred_types else 'savory'
             
-            for recipe in recipes:
+            for recipe in recipe_dict.values():
                 if recipe.get('cuisine_type') == top_cuisine and recipe.get('recipe_type') == top_type:
                     recommended_recipes.append({
                         'id': recipe['id'],
@@ -223,33 +316,11 @@ def suggest_recipes():
         dietary_preference = db_profile.get('dietary_preference', 'normal')
         is_healthy = dietary_preference in ['healthy', 'vegetarian', 'vegan']
         
-        # Charger les recettes depuis MySQL
-        recipes = load_recipe_templates()
+        # Recettes sans allergène ni ingrédient exclu par le régime (masques du catalogue)
+        recipes = load_recipe_dataset_filtered(allergies=allergies, dietary_preference=dietary_preference)
         suggestions = []
         
         for recipe in recipes:
-            # Filtrer selon les allergies
-            recipe_ingredients = recipe.get('ingredients', [])
-            if isinstance(recipe_ingredients, str):
-                try:
-                    recipe_ingredients = json.loads(recipe_ingredients)
-                except:
-                    recipe_ingredients = []
-            
-            has_allergen = any(
-                allergen.lower() in ' '.join(recipe_ingredients).lower() 
-                for allergen in allergies
-            )
-            
-            if has_allergen:
-                continue
-            
-            # Filtrer selon les préférences alimentaires
-            if dietary_preference in ['vegetarian', 'vegan']:
-                meat_ingredients = ['chicken', 'beef', 'pork', 'fish', 'meat', 'bacon', 'sausage']
-                if any(meat in ' '.join(recipe_ingredients).lower() for meat in meat_ingredients):
-                    continue
-            
             # Score de correspondance
             score = 0
             if recipe.get('is_healthy') == is_healthy:
@@ -305,21 +376,23 @@ def generate_meal():
         
         if model:
             try:
-                # Charger les recettes pour construire les features
-                recipes = load_recipe_dataset()
-                if recipes:
-                    feature_extractor = FeatureExtractor()
-                    feature_extractor.build_vocabularies(recipes)
-                    stats = feature_extractor.calculate_dataset_stats(recipes)
+                # Catalogue compilé pour lire la recette prédite (pas de parsing des recettes)
+                catalog = load_recipe_catalog()
+                if len(catalog):
+                    # Vocabulaires et statistiques enregistrés avec le modèle (ceux de l'entraînement)
+                    feature_extractor = model.feature_extractor
+                    stats = feature_extractor.stats
                     
-                    # Extraire les features
-                    user_features = feature_extractor.extract_user_request_features(
-                        available_ingredients,
-                        recipe_type,
-                        cuisine_type,
-                        is_healthy,
-                        allergies,
-                        stats
+                    # Extraire les features (même API groupée que l'entraînement, un seul exemple ;
+                    # ligne CSR si le modèle a une entrée creuse)
+                    user_features = feature_extractor.extract_user_request_features_batch(
+                        [available_ingredients],
+                        [recipe_type],
+                        [cuisine_type],
+                        [is_healthy],
+                        [allergies],
+                        stats,
+                        sparse=model.sparse_input
                     )
                     
                     # Prédire avec le modèle
@@ -328,8 +401,8 @@ def generate_meal():
                     if predictions:
                         # Charger la recette recommandée
                         recipe_id = predictions[0]['recipeId']
-                        if recipe_id < len(recipes):
-                            best_recipe = recipes[recipe_id]
+                        if recipe_id < len(catalog):
+                            best_recipe = catalog.recipe(recipe_id)
                             
                             # Trouver les ingrédients manquants
                             recipe_ingredients = best_recipe.get('ingredients', [])
@@ -339,13 +412,11 @@ def generate_meal():
                                 except:
                                     recipe_ingredients = []
                             
-                            missing_ingredients = [
-                                ing for ing in recipe_ingredients
-                                if not any(
-                                    av.lower() in ing.lower() or ing.lower() in av.lower()
-                                    for av in available_ingredients
-                                )
-                            ]
+                            # Comparaison par ids canoniques ("tomatoes" = "tomato", "tomato" couvre
+                            # "cherry tomato") : index des noms construit une fois par catalogue
+                            missing_ingredients = catalog.canonical_ingredients().missing(
+                                recipe_ingredients, available_ingredients
+                            )
                             
                             return jsonify({
                                 'name': best_recipe['name'],
@@ -370,7 +441,9 @@ def generate_meal():
         # Fallback: algorithme de similarité simple
         print("📊 Utilisation de l'algorithme de fallback...")
         try:
-            recipes = load_recipe_dataset_filtered(recipe_type=recipe_type)
+            recipes = load_recipe_dataset_filtered(
+                recipe_type=recipe_type, allergies=allergies, dietary_preference=dietary_preference
+            )
             print(f"✅ {len(recipes)} recettes chargées pour le type {recipe_type}")
         except Exception as e:
             print(f"❌ Erreur lors du chargement des recettes: {e}")
@@ -379,9 +452,13 @@ def generate_meal():
             return jsonify({'error': f'Error loading recipes: {str(e)}'}), 500
         
         matching_recipes = []
+        # Ingrédients du catalogue couverts par les ingrédients disponibles (ids canoniques),
+        # calculés une fois pour toutes les recettes
+        canonical = load_recipe_catalog().canonical_ingredients()
+        covered_ids = canonical.matching_ids(available_ingredients)
         
         for recipe in recipes:
-            # Vérifier les allergies
+            # Ingrédients de la recette
             recipe_ingredients = recipe.get('ingredients', [])
             if isinstance(recipe_ingredients, str):
                 try:
@@ -389,36 +466,13 @@ def generate_meal():
                 except:
                     recipe_ingredients = []
             
-            has_allergen = any(
-                allergen.lower() in ' '.join(recipe_ingredients).lower() 
-                for allergen in allergies
-            )
-            if has_allergen:
-                continue
-            
-            # Vérifier les préférences alimentaires
-            if dietary_preference in ['vegetarian', 'vegan']:
-                meat_ingredients = ['chicken', 'beef', 'pork', 'fish', 'meat', 'bacon', 'sausage']
-                if any(meat in ' '.join(recipe_ingredients).lower() for meat in meat_ingredients):
-                    continue
-            
             # Calculer la similarité
-            recipe_ingredients_lower = [ing.lower() for ing in recipe_ingredients]
-            available_lower = [ing.lower() for ing in available_ingredients]
-            
-            matches = sum(
-                1 for ing in recipe_ingredients_lower
-                if any(av in ing or ing in av for av in available_lower)
-            )
-            similarity = matches / len(recipe_ingredients) if recipe_ingredients else 0
-            
             missing_ingredients = [
                 ing for ing in recipe_ingredients
-                if not any(
-                    av.lower() in ing.lower() or ing.lower() in av.lower()
-                    for av in available_ingredients
-                )
+                if canonical.dictionary.lookup(ing) not in covered_ids
             ]
+            matches = len(recipe_ingredients) - len(missing_ingredients)
+            similarity = matches / len(recipe_ingredients) if recipe_ingredients else 0
             
             matching_recipes.append({
                 **recipe,
@@ -515,6 +569,27 @@ def generate_meal():
         traceback.print_exc()
         return jsonify({'error': str(e), 'details': traceback.format_exc() if os.getenv('FLASK_DEBUG') else None}), 500
 
+@app.route('/api/ml/models/gc', methods=['POST'])
+def gc_models():
+    """
+    Applique la politique de rétention des modèles et supprime les archives orphelines
+    Input: { keepRecent, keepBest, metric, dryRun }
+    """
+    try:
+        data = request.json or {}
+        
+        import model_gc
+        report = model_gc.gc_models(
+            keep_recent=int(data.get('keepRecent', model_gc.KEEP_RECENT)),
+            keep_best=int(data.get('keepBest', model_gc.KEEP_BEST)),
+            metric=data.get('metric'),
+            dry_run=bool(data.get('dryRun', False))
+        )
+        
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+
 @app.route('/api/ml/train-classification', methods=['POST'])
 def train_classification():
     """Entraîne le modèle de classification"""
@@ -530,7 +605,9 @@ def train_classification():
             validation_split=data.get('validationSplit', 0.15),
             hidden_layers=data.get('hiddenLayers', [512, 512, 256, 128, 64]),
             learning_rate=data.get('learningRate', 0.0004),
-            dropout=data.get('dropout', 0.4)
+            dropout=data.get('dropout', 0.4),
+            dedup_threshold=data.get('dedupThreshold', DEDUP_THRESHOLD),
+            hash_buckets=int(data.get('hashBuckets', HASH_BUCKETS))
         )
         
         # Sauvegarder le modèle
@@ -562,7 +639,9 @@ def train_generation():
             batch_size=data.get('batchSize', 64),
             hidden_layers=data.get('hiddenLayers', [512, 256, 128, 64]),
             learning_rate=data.get('learningRate', 0.0003),
-            dropout=data.get('dropout', 0.35)
+            dropout=data.get('dropout', 0.35),
+            dedup_threshold=data.get('dedupThreshold', DEDUP_THRESHOLD),
+            hash_buckets=int(data.get('hashBuckets', HASH_BUCKETS))
         )
         
         # Sauvegarder le modèle
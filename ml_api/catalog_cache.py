@@ -0,0 +1,71 @@
+"""
+Caches dérivés du catalogue de recettes
+Tout ce qui est calculé à partir de la liste des recettes (catalogue compilé, vocabulaires,
+statistiques, index, tables de correspondance) s'enregistre ici avec sa fonction de
+construction. La valeur est reconstruite paresseusement au premier accès après un
+changement de version du catalogue (database.catalog_version()), jamais à chaque requête.
+
+Usage:
+    recipes_by_id = register('recipes_by_id', lambda version: {...})
+    mapping = recipes_by_id.get()
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from database import catalog_version
+
+class DerivedCache:
+    """Valeur dérivée du catalogue, associée à la version à partir de laquelle elle a été construite"""
+
+    def __init__(self, name: str, build: Callable[[str], Any]):
+        self.name = name
+        self.build = build
+        self.version: Optional[str] = None
+        self.builds = 0
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Valeur pour la version courante du catalogue (reconstruite si elle a changé)"""
+        version = catalog_version()
+        if self.version == version:
+            return self._value
+
+        with self._lock:
+            if self.version != version:
+                value = self.build(version)
+                self._value = value
+                self.version = version
+                self.builds += 1
+            return self._value
+
+    def invalidate(self) -> None:
+        """Force la reconstruction au prochain accès"""
+        with self._lock:
+            self.version = None
+            self._value = None
+
+_registry: Dict[str, DerivedCache] = {}
+_registry_lock = threading.Lock()
+
+def register(name: str, build: Callable[[str], Any]) -> DerivedCache:
+    """Enregistre (ou retourne, si le nom existe déjà) un cache dérivé du catalogue"""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = DerivedCache(name, build)
+            _registry[name] = cache
+        return cache
+
+def invalidate_all() -> None:
+    """Invalide tous les caches dérivés (ex: après une modification hors processus non détectée)"""
+    for cache in list(_registry.values()):
+        cache.invalidate()
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Version et nombre de reconstructions de chaque cache enregistré"""
+    return {
+        name: {'version': cache.version, 'builds': cache.builds}
+        for name, cache in _registry.items()
+    }
@@ -31,12 +31,14 @@ tf.get_logger().setLevel('ERROR')
 
 from tensorflow import keras
 from tensorflow.keras import layers, models, callbacks
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 import json
 import pickle
-from database import save_model_to_db, activate_model, load_model_from_db
-from feature_extractor import FeatureExtractor
-from dataset_loader import load_recipe_dataset
+from database import save_model_to_db, activate_model, load_model_from_db, extract_model_archive
+from feature_extractor import FeatureExtractor, SPARSE_FEATURES, HASH_BUCKETS, as_model_input
+from dataset_loader import load_recipe_dataset, load_recipe_catalog
+from recipe_dedup import RecipeClasses, DEDUP_THRESHOLD, training_classes, class_positions
+from training_data import make_dataset, predict_classes
 
 class ClassificationModel:
     """Modèle de classification pour recommandations de recettes"""
@@ -45,6 +47,17 @@ class ClassificationModel:
         self.model: Optional[keras.Model] = None
         self.feature_extractor = FeatureExtractor()
         self.recipes: List[Dict[str, Any]] = []
+        # Catalogue compilé (RecipeCatalog), utilisé à la place de `recipes` après chargement
+        self.catalog = None
+        # Métriques du dernier entraînement (enregistrées avec le modèle)
+        self.metrics: Dict[str, float] = {}
+        # Classes de sortie : les recettes quasi-identiques partagent une classe
+        self.classes: Optional[RecipeClasses] = None
+        self.dedup_threshold: Optional[float] = DEDUP_THRESHOLD
+        # Position dans le catalogue de la recette de chaque classe (modèle chargé)
+        self.class_positions: Optional[np.ndarray] = None
+        # Entrée creuse (features CSR) : la première couche Dense ne touche que les ingrédients présents
+        self.sparse_input: bool = SPARSE_FEATURES
     
     def create_model(
         self,
@@ -53,9 +66,10 @@ class ClassificationModel:
         hidden_layers: List[int] = [512, 512, 256, 128, 64],
         learning_rate: float = 0.0004,
         dropout: float = 0.4,
-        name_prefix: str = ''
+        name_prefix: str = '',
+        sparse_input: bool = False
     ) -> keras.Model:
-        """Crée un modèle de classification"""
+        """Crée un modèle de classification (sparse_input : entrée creuse, features en CSR)"""
         # Réinitialiser self.model pour éviter les conflits de noms
         self.model = None
         
@@ -70,9 +84,15 @@ class ClassificationModel:
         model = keras.Sequential()
         
         # Input layer avec batch normalization
+        if sparse_input:
+            # Entrée creuse : la première couche Dense fait un produit creux x dense
+            model.add(keras.Input(shape=(input_size,), sparse=True, name=f'{prefix}sparse_input'))
+            first_layer = {}
+        else:
+            first_layer = {'input_shape': (input_size,)}
         model.add(layers.Dense(
             hidden_layers[0],
-            input_shape=(input_size,),
+            **first_layer,
             activation='relu',
             kernel_initializer='he_normal',
             kernel_regularizer=keras.regularizers.l2(0.0001),
@@ -103,7 +123,7 @@ class ClassificationModel:
         # Compiler
         model.compile(
             optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
-            loss='categorical_crossentropy',
+            loss='sparse_categorical_crossentropy',  # Labels entiers (pas de one-hot)
             metrics=['accuracy']
         )
         
@@ -120,76 +140,38 @@ class ClassificationModel:
         self.feature_extractor.build_vocabularies(recipes)
         stats = self.feature_extractor.calculate_dataset_stats(recipes)
         
-        # Générer les données d'entraînement
-        features = []
-        labels = []
+        # Classes de sortie (doublons regroupés), calculées une fois par entraînement
+        if self.classes is None or len(self.classes.labels) != len(recipes):
+            self.classes = training_classes(recipes, self.dedup_threshold)
+        classes = self.classes
         
         if use_real_interactions:
             # TODO: Charger les vraies interactions depuis la DB
             pass
         
-        # Générer des données synthétiques
-        user_profiles = [
-            {'age': 25, 'gender': 'female', 'activity': 'active', 'diet': 'healthy', 'healthy': True},
-            {'age': 35, 'gender': 'male', 'activity': 'moderate', 'diet': 'normal', 'healthy': False},
-            {'age': 45, 'gender': 'female', 'activity': 'light', 'diet': 'vegetarian', 'healthy': True},
-        ]
-        
         cuisines = ['Italian', 'Tunisian', 'French', 'Asian', 'Mediterranean', 'Mexican', 'Indian', 'American', 'Other']
         # Réduire le nombre d'exemples pour éviter les blocages (peut être augmenté plus tard)
         examples_per_recipe = max(20, 5000 // len(recipes))  # Réduit de 12000 à 5000
         
-        for recipe in recipes:
-            for i in range(examples_per_recipe):
-                profile = user_profiles[i % len(user_profiles)]
-                
-                # Déterminer les correspondances
-                cuisine_match = np.random.random() < 0.7
-                cuisine = recipe['cuisine_type'] if cuisine_match else np.random.choice(cuisines)
-                
-                recipe_type = recipe.get('recipe_type', 'savory')
-                is_healthy = recipe.get('is_healthy', False)
-                
-                # Ingrédients disponibles (30-80% de la recette)
-                ingredients = recipe.get('ingredients', [])
-                if isinstance(ingredients, str):
-                    ingredients = json.loads(ingredients)
-                
-                ingredient_ratio = 0.3 + np.random.random() * 0.5
-                num_ingredients = max(1, int(len(ingredients) * ingredient_ratio))
-                available_ingredients = np.random.choice(ingredients, min(num_ingredients, len(ingredients)), replace=False).tolist()
-                
-                # Extraire les features
-                user_features = self.feature_extractor.extract_user_request_features(
-                    available_ingredients,
-                    recipe_type,
-                    cuisine,
-                    is_healthy,
-                    [],
-                    stats
-                )
-                
-                features.append(user_features)
-                labels.append(recipes.index(recipe))
-        
-        # Convertir en numpy arrays
-        X = np.array(features)
-        y = np.array(labels)
-        
-        # One-hot encoding des labels
-        y_one_hot = keras.utils.to_categorical(y, num_classes=len(recipes))
+        # Données synthétiques générées en une fois (recette, cuisine à 70%, 30-80% des
+        # ingrédients ; CSR si le modèle a une entrée creuse), dans l'ordre des recettes
+        X = self.feature_extractor.extract_sampled_request_features(
+            recipes, examples_per_recipe, cuisines, sparse=self.sparse_input
+        )
+        # Labels entiers (classe de la recette de chaque exemple)
+        y = np.repeat(np.asarray(classes.labels, dtype=np.int32), examples_per_recipe)
         
         # Split train/validation/test (70/15/15)
-        n = len(X)
+        n = X.shape[0]
         train_end = int(n * 0.7)
         val_end = train_end + int(n * 0.15)
         
         X_train = X[:train_end]
-        y_train = y_one_hot[:train_end]
+        y_train = y[:train_end]
         X_val = X[train_end:val_end]
-        y_val = y_one_hot[train_end:val_end]
+        y_val = y[train_end:val_end]
         X_test = X[val_end:]
-        y_test = y_one_hot[val_end:]
+        y_test = y[val_end:]
         
         return X_train, y_train, X_val, y_val, X_test, y_test
     
@@ -201,23 +183,39 @@ class ClassificationModel:
         hidden_layers: List[int] = [512, 512, 256, 128, 64],
         learning_rate: float = 0.0004,
         dropout: float = 0.4,
-        model_name: str = ''
+        model_name: str = '',
+        dedup_threshold: Optional[float] = DEDUP_THRESHOLD,
+        sparse_input: bool = SPARSE_FEATURES,
+        hash_buckets: int = HASH_BUCKETS
     ) -> Dict[str, Any]:
-        """Entraîne le modèle"""
+        """
+        Entraîne le modèle (dedup_threshold=None : une classe par recette, sans regroupement ;
+        sparse_input : features CSR et entrée creuse ; hash_buckets > 0 : ingrédients hashés
+        dans un nombre fixe de colonnes, taille d'entrée indépendante du vocabulaire)
+        """
         # Charger les recettes
         recipes = load_recipe_dataset()
         self.recipes = recipes
+        self.dedup_threshold = dedup_threshold
+        self.classes = None
+        self.sparse_input = sparse_input
+        self.feature_extractor = FeatureExtractor(hash_buckets=hash_buckets)
         
         if len(recipes) < 50:
             raise ValueError(f"Dataset trop petit ({len(recipes)} recettes). Minimum 50 requis.")
         
         # Préparer les données
         X_train, y_train, X_val, y_val, X_test, y_test = self.prepare_training_data(recipes)
+        # Pipeline tf.data : lots lus dans les features à la demande, ordre mélangé à chaque epoch
+        train_data = make_dataset(X_train, y_train, batch_size, shuffle=True)
+        val_data = make_dataset(X_val, y_val, batch_size)
+        test_data = make_dataset(X_test, y_test, batch_size)
         
         # Créer le modèle avec un préfixe unique
         input_size = X_train.shape[1]
-        output_size = len(recipes)
-        model = self.create_model(input_size, output_size, hidden_layers, learning_rate, dropout, name_prefix=model_name)
+        output_size = self.classes.num_classes
+        model = self.create_model(input_size, output_size, hidden_layers, learning_rate, dropout,
+                                  name_prefix=model_name, sparse_input=sparse_input)
         
         # Callback personnalisé pour afficher l'accuracy (avec flush pour éviter les buffers)
         class AccuracyCallback(callbacks.Callback):
@@ -309,10 +307,9 @@ class ClassificationModel:
             
             # Entraîner le modèle (silencieusement)
             history = model.fit(
-                X_train, y_train,
-                validation_data=(X_val, y_val),
+                train_data,
+                validation_data=val_data,
                 epochs=epochs,
-                batch_size=batch_size,
                 callbacks=[early_stopping, reduce_lr, accuracy_callback],
                 verbose=0
             )
@@ -334,7 +331,7 @@ class ClassificationModel:
         # Évaluer
         print("\n📊 Évaluation sur le jeu de test...", flush=True)
         sys.stdout.flush()
-        test_loss, test_accuracy = model.evaluate(X_test, y_test, verbose=0)
+        test_loss, test_accuracy = model.evaluate(test_data, verbose=0)
         print(f"   ✅ Test Accuracy: {test_accuracy*100:.2f}%", flush=True)
         print(f"   ✅ Test Loss: {test_loss:.4f}", flush=True)
         sys.stdout.flush()
@@ -342,9 +339,8 @@ class ClassificationModel:
         # Calculer precision, recall, F1
         print("📈 Calcul des métriques détaillées...", flush=True)
         sys.stdout.flush()
-        y_pred = model.predict(X_test, verbose=0)
-        y_pred_classes = np.argmax(y_pred, axis=1)
-        y_true_classes = np.argmax(y_test, axis=1)
+        y_pred_classes = predict_classes(model, test_data)
+        y_true_classes = y_test
         
         from sklearn.metrics import precision_score, recall_score, f1_score
         precision = precision_score(y_true_classes, y_pred_classes, average='macro', zero_division=0)
@@ -365,6 +361,7 @@ class ClassificationModel:
         }
         
         self.model = model
+        self.metrics = metrics
         return metrics
     
     def save(self, model_version: str = None) -> int:
@@ -396,6 +393,9 @@ class ClassificationModel:
                 shutil.copy(model_path_keras, os.path.join(saved_model_dir, 'model.keras'))
                 model_path = saved_model_dir
             
+            # Vocabulaires et statistiques de l'entraînement, dans la même archive que les poids
+            self.feature_extractor.save_to_dir(model_path)
+            
             # Lire les fichiers du modèle
             import zipfile
             zip_path = os.path.join(tmpdir, 'model.zip')
@@ -417,7 +417,11 @@ class ClassificationModel:
             'outputSize': int(self.model.output_shape[1]),
             'hiddenLayers': [layer.units for layer in self.model.layers if isinstance(layer, layers.Dense)][:-1],
             'trainingDataSize': len(self.recipes),
-            'accuracy': 0.0,  # Sera mis à jour après l'entraînement
+            'accuracy': self.metrics.get('accuracy', 0.0),
+            'metrics': self.metrics,
+            'sparseInput': self.sparse_input,
+            # Recette canonique de chaque classe de sortie
+            **(self.classes or RecipeClasses.identity(self.recipes)).to_metadata(self.dedup_threshold),
         }
         
         # Sauvegarder dans le JSON
@@ -433,13 +437,13 @@ class ClassificationModel:
         
         return model_id
     
-    def predict(self, user_features: List[float], top_k: int = 10) -> List[Dict[str, float]]:
+    def predict(self, user_features: Union[List[float], np.ndarray], top_k: int = 10) -> List[Dict[str, float]]:
         """Prédit les recettes recommandées"""
         if self.model is None:
             raise ValueError("Modèle non chargé")
         
-        # Prédire
-        X = np.array([user_features])
+        # Prédire (liste, ligne ndarray ou ligne CSR de features)
+        X = as_model_input(user_features, self.sparse_input)
         predictions = self.model.predict(X, verbose=0)[0]
         
         # Trier et prendre top K
@@ -447,8 +451,12 @@ class ClassificationModel:
         
         results = []
         for idx in top_indices:
+            # Classe -> position de sa recette canonique dans le catalogue
+            position = self.class_positions[idx] if self.class_positions is not None else idx
+            if position < 0:
+                continue
             results.append({
-                'recipeId': int(idx),
+                'recipeId': int(position),
                 'score': float(predictions[idx])
             })
         
@@ -461,41 +469,33 @@ class ClassificationModel:
         if result is None:
             raise ValueError("Modèle non trouvé")
         
-        # Désérialiser le modèle
+        # Désérialiser le modèle (archive lue directement depuis le stockage externe)
         import tempfile
         import os
-        import zipfile
-        import base64
-        
-        model_data_str = result['model_data']
-        
-        # Décoder depuis base64 si nécessaire
-        if isinstance(model_data_str, str):
-            try:
-                model_data = base64.b64decode(model_data_str)
-            except:
-                # Si ce n'est pas du base64, essayer directement
-                model_data = model_data_str.encode('latin-1') if isinstance(model_data_str, str) else model_data_str
-        else:
-            model_data = model_data_str
         
         with tempfile.TemporaryDirectory() as tmpdir:
-            zip_path = os.path.join(tmpdir, 'model.zip')
-            with open(zip_path, 'wb') as f:
-                f.write(model_data)
-            
             model_path = os.path.join(tmpdir, 'model')
-            with zipfile.ZipFile(zip_path, 'r') as zipf:
-                zipf.extractall(model_path)
+            extract_model_archive(result, model_path)
             
             # Charger le modèle
             instance = cls()
             instance.model = keras.models.load_model(model_path)
             
-            # Charger les recettes pour avoir les métadonnées
-            instance.recipes = load_recipe_dataset()
-            instance.feature_extractor.build_vocabularies(instance.recipes)
-            instance.feature_extractor.calculate_dataset_stats(instance.recipes)
+            # Vocabulaires et statistiques enregistrés avec le modèle : identiques à ceux de
+            # l'entraînement, sans parcourir le catalogue
+            instance.catalog = load_recipe_catalog()
+            feature_extractor = FeatureExtractor.load_from_dir(model_path)
+            if feature_extractor is not None:
+                instance.feature_extractor = feature_extractor
+            else:
+                # Ancien modèle : vocabulaires reconstruits depuis le catalogue compilé
+                instance.feature_extractor.build_vocabularies_from_catalog(instance.catalog)
+                instance.feature_extractor.calculate_dataset_stats_from_catalog(instance.catalog)
+                input_shape = getattr(instance.model, 'input_shape', None)
+                if input_shape is not None and input_shape[1] != instance.feature_extractor.request_feature_size():
+                    raise ValueError("Le catalogue a changé depuis l'entraînement : vocabulaire incompatible avec le modèle, réentraîner")
+            instance.class_positions = class_positions(result.get('model_metadata'), instance.catalog)
+            instance.sparse_input = bool((result.get('model_metadata') or {}).get('sparseInput', False))
         
         return instance
 
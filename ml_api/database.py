@@ -1,51 +1,718 @@
 """
 Module de gestion de base de données JSON statique
 Utilise un fichier JSON pour l'hébergement (plus simple que MySQL)
+
+Les écritures unitaires (profils utilisateurs, interactions) sont ajoutées à un
+journal NDJSON (data.journal.ndjson) au lieu de réécrire tout le fichier JSON.
+Les lectures superposent le journal au fichier de base, et une compaction en
+arrière-plan replie périodiquement le journal dans data.json.
+
+Les lectures ne décodent que la section de premier niveau utile (voir json_sections.py) :
+charger les recettes ne parse pas les modèles, et inversement.
+
+Les écritures sont protégées par un verrou inter-processus (fcntl, data.json.lock)
+et data.json est remplacé atomiquement (fichier temporaire + fsync + os.replace) :
+plusieurs workers WSGI et scripts d'entraînement peuvent l'utiliser en parallèle
+et les lecteurs ne voient jamais un JSON partiel.
 """
 
 import json
+import os
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable, BinaryIO
 import threading
+import time
 from contextlib import contextmanager
 
+from json_sections import JsonSections
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : seul le verrou entre threads est disponible
+    fcntl = None
+
 # Chemin vers le fichier JSON
 DATA_FILE = Path(__file__).parent / 'data.json'
-_lock = threading.Lock()  # Pour la sécurité des threads lors de l'écriture
+# Journal en ajout seul des écritures unitaires (une opération JSON par ligne)
+JOURNAL_FILE = Path(__file__).parent / 'data.journal.ndjson'
+# Stockage des archives de modèles, adressé par contenu (models/<sha256>.zip)
+MODELS_DIR = Path(__file__).parent / 'models'
+# Fichier de verrou partagé par tous les processus qui écrivent les données
+LOCK_FILE = Path(__file__).parent / 'data.json.lock'
+# Taille du journal au-delà de laquelle une compaction est déclenchée
+JOURNAL_COMPACT_BYTES = int(os.getenv('ML_JOURNAL_COMPACT_BYTES', 1024 * 1024))
+
+# Backend de stockage : 'json' (data.json, par défaut) ou 'sqlite' (voir sqlite_backend.py)
+DB_BACKEND = os.getenv('ML_DB_BACKEND', 'json').lower()
+
+_lock = threading.RLock()  # Pour la sécurité des threads lors de l'écriture
+_lock_fd: Optional[int] = None  # Descripteur du verrou inter-processus (détenu par le thread qui a _lock)
+_lock_depth = 0
+
+# Lecture partagée (lecture seule) du fichier JSON, section par section
+# Réindexé uniquement si le fichier change (mtime/taille/inode) ou si save_data est appelé
+_snapshot_lock = threading.RLock()
+_sections_state: Optional[Tuple[JsonSections, Tuple, Dict[str, Any]]] = None
+# Profils et interactions superposés au journal
+_journal_view: Optional[Dict[str, Any]] = None
+_journal_view_key: Optional[Tuple] = None
+_journal_view_pos: Optional[Tuple[int, int]] = None
+# Instantané complet (clé, vue du journal, données) pour load_snapshot()
+_snapshot: Optional[Tuple[Tuple, Dict[str, Any], Dict[str, Any]]] = None
+_profile_index: Optional[Tuple[Dict[str, Any], Dict[Any, Dict[str, Any]]]] = None
+# Clé (hors noms de sections) du hash des recettes dans le cache des sections décodées
+_CATALOG_VERSION_KEY = ('hash', 'recipes')
+_generation = 0
+
+_compaction_thread: Optional[threading.Thread] = None
+
+def _sqlite_backend():
+    """Retourne le module sqlite_backend si ce backend est actif, sinon None"""
+    if DB_BACKEND != 'sqlite':
+        return None
+    import sqlite_backend
+    return sqlite_backend
+
+@contextmanager
+def write_lock():
+    """
+    Verrou exclusif pour les écritures, entre threads et entre processus.
+    Réentrant : une fonction qui le détient peut appeler save_data() sans se bloquer.
+    """
+    global _lock_fd, _lock_depth
+    with _lock:
+        if _lock_depth == 0 and fcntl is not None:
+            fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            _lock_fd = fd
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0 and _lock_fd is not None:
+                fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+                os.close(_lock_fd)
+                _lock_fd = None
+
+@contextmanager
+def transaction():
+    """
+    Lecture-modification-écriture atomique de data.json.
+    Le verrou est conservé du chargement à la sauvegarde : aucune écriture
+    concurrente (thread ou processus) ne peut être perdue.
+    
+    Usage:
+        with transaction() as data:
+            data['recipes'].append(...)
+    """
+    with write_lock():
+        data = load_data()
+        yield data
+        save_data(data)
+
+def _atomic_write(path: Path, write, binary: bool = False) -> None:
+    """Écrit un fichier via un fichier temporaire + fsync + os.replace (jamais de fichier partiel)"""
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with (open(tmp_path, 'wb') if binary else open(tmp_path, 'w', encoding='utf-8')) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    
+    # Rendre le renommage durable
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
 
 def ensure_data_file():
     """Crée le fichier JSON avec structure par défaut s'il n'existe pas"""
-    if not DATA_FILE.exists():
-        default_data = {
-            "recipes": [],
-            "user_profiles": [],
-            "interactions": [],
-            "ml_models": []
-        }
-        save_data(default_data)
+    if DATA_FILE.exists():
+        return
+    with write_lock():
+        # Un autre processus a peut-être créé le fichier entre-temps
+        if not DATA_FILE.exists():
+            default_data = {
+                "recipes": [],
+                "user_profiles": [],
+                "interactions": [],
+                "ml_models": []
+            }
+            save_data(default_data)
+
+def _load_base_data() -> Dict[str, Any]:
+    """Charge le fichier JSON de base, sans le journal"""
+    ensure_data_file()
+    # Le fichier est toujours remplacé atomiquement : un JSON invalide ne peut venir que
+    # d'un écrivain externe non atomique. On réessaie brièvement, sans jamais écraser
+    # les données existantes par une structure vide.
+    for attempt in range(3):
+        try:
+            with open(DATA_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            if attempt == 2:
+                raise ValueError(f"Fichier JSON corrompu ({DATA_FILE}): {e}") from e
+            time.sleep(0.05)
+
+def _load_with_journal() -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+    """Charge le fichier de base et lui superpose le journal (données, position lue dans le journal)"""
+    data = _load_base_data()
+    records, journal_pos = _read_journal()
+    _apply_journal(data, records)
+    return data, journal_pos
 
 def load_data() -> Dict[str, Any]:
-    """Charge les données depuis le fichier JSON"""
+    """Charge les données depuis le fichier JSON (journal inclus)"""
+    data, _ = _load_with_journal()
+    return data
+
+def save_data(data: Dict[str, Any]) -> None:
+    """
+    Sauvegarde les données dans le fichier JSON.
+    Les entrées du journal déjà présentes dans `data` (voir '_journal_seq') sont
+    considérées comme repliées ; les suivantes restent superposées à la lecture.
+    """
+    global _generation
+    with write_lock():
+        _atomic_write(DATA_FILE, lambda f: json.dump(data, f, indent=2, ensure_ascii=False))
+        # Invalider l'instantané même si le mtime n'a pas changé (résolution grossière)
+        _generation += 1
+
+def rewrite_section(
+    name: str,
+    write_value: Callable[[JsonSections, BinaryIO], None],
+    view: Optional[JsonSections] = None
+) -> None:
+    """
+    Remplace une seule section de premier niveau de data.json sans décoder les autres :
+    leurs octets sont recopiés tels quels dans le nouveau fichier (écrit atomiquement).
+    write_value(view, f) écrit en octets la nouvelle valeur JSON de la section, `view`
+    étant la version de data.json en cours de remplacement.
+    Une vue déjà ouverte peut être fournie si l'appelant détient write_lock() depuis son ouverture.
+    """
+    global _generation
     ensure_data_file()
+    with write_lock():
+        own_view = view is None
+        if own_view:
+            view = JsonSections(DATA_FILE)
+        try:
+            names = list(view.sections)
+            if name not in view.sections:
+                names.append(name)
+            
+            def write(f):
+                f.write(b'{')
+                for i, key in enumerate(names):
+                    f.write(b',\n  ' if i else b'\n  ')
+                    f.write(json.dumps(key, ensure_ascii=False).encode('utf-8') + b': ')
+                    if key == name:
+                        write_value(view, f)
+                        continue
+                    # Recopie par blocs : une grosse section n'est jamais chargée en entier
+                    start, end = view.sections[key]
+                    for offset in range(start, end, 1 << 20):
+                        f.write(view.slice(offset, min(end, offset + (1 << 20))))
+                f.write(b'\n}\n')
+            
+            _atomic_write(DATA_FILE, write, binary=True)
+            _generation += 1
+        finally:
+            if own_view:
+                view.close()
+
+# ============================================================================
+# Journal en ajout seul (profils utilisateurs et interactions)
+# ============================================================================
+
+def _journal_signature() -> Optional[Tuple[int, int]]:
+    """Signature du journal (inode, taille) ou None s'il n'existe pas"""
+    try:
+        st = os.stat(JOURNAL_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size)
+
+def _read_journal(offset: int = 0) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+    """
+    Lit les entrées du journal à partir de `offset`.
+    Retourne (entrées, (inode, position après la dernière ligne complète)).
+    Une dernière ligne incomplète (écriture en cours) est ignorée.
+    """
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Créer le fichier avec des données par défaut
-        default_data = {
-            "recipes": [],
-            "user_profiles": [],
-            "interactions": [],
-            "ml_models": []
+        f = open(JOURNAL_FILE, 'rb')
+    except FileNotFoundError:
+        return [], None
+    
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        f.seek(offset)
+        chunk = f.read()
+    
+    end = chunk.rfind(b'\n') + 1
+    records = []
+    for line in chunk[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            print(f"⚠️  Entrée de journal corrompue ignorée: {line[:80]!r}")
+    
+    return records, (inode, offset + end)
+
+# Champs conservés à la mise à jour d'un profil s'ils ne sont pas fournis (None) : comme la
+# synchronisation d'origine, qui ne touchait pas à l'email d'un profil existant
+PROFILE_KEEP_IF_MISSING = ('email',)
+
+def _profile_update(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Enregistrement d'upsert sans les champs de PROFILE_KEEP_IF_MISSING absents (None)"""
+    if all(profile.get(k) is not None for k in PROFILE_KEEP_IF_MISSING if k in profile):
+        return profile
+    return {k: v for k, v in profile.items() if not (k in PROFILE_KEEP_IF_MISSING and v is None)}
+
+def _apply_journal(data: Dict[str, Any], records: List[Dict[str, Any]]) -> None:
+    """Superpose les entrées du journal aux données (seules celles pas encore repliées)"""
+    folded_seq = data.get('_journal_seq', 0)
+    pending = [r for r in records if r.get('seq', 0) > folded_seq]
+    if not pending:
+        return
+    
+    profiles = data.setdefault('user_profiles', [])
+    interactions = data.setdefault('interactions', [])
+    profile_index = None
+    
+    for record in pending:
+        op = record.get('op')
+        if op == 'upsert_profile':
+            if profile_index is None:
+                profile_index = {p.get('user_id'): i for i, p in enumerate(profiles)}
+            # Les anciennes entrées du journal peuvent contenir 'email': None
+            profile = _profile_update(record['record'])
+            pos = profile_index.get(profile.get('user_id'))
+            if pos is None:
+                profile_index[profile.get('user_id')] = len(profiles)
+                profiles.append(dict(profile))
+            else:
+                # Nouveau dictionnaire : les instantanés précédents restent inchangés
+                profiles[pos] = {**profiles[pos], **profile}
+        elif op == 'add_interaction':
+            interactions.append(dict(record['record']))
+        
+        data['_journal_seq'] = max(data.get('_journal_seq', 0), record.get('seq', 0))
+
+def _journal_last_seq() -> int:
+    """Numéro de séquence de la dernière entrée du journal (lit uniquement la fin du fichier)"""
+    try:
+        f = open(JOURNAL_FILE, 'rb')
+    except FileNotFoundError:
+        f = None
+    
+    if f is not None:
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+        for line in reversed(tail.splitlines()):
+            try:
+                return json.loads(line).get('seq', 0)
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                continue
+    
+    # Journal absent ou vide : repartir de la séquence repliée dans le fichier de base
+    return load_section('_journal_seq', 0)
+
+def _append_journal(entries: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """
+    Ajoute des opérations au journal en une seule écriture.
+    entries: liste de (op, record). Retourne le dernier numéro de séquence attribué.
+    """
+    if not entries:
+        return 0
+    
+    with write_lock():
+        seq = _journal_last_seq()
+        lines = []
+        for op, record in entries:
+            seq += 1
+            lines.append(json.dumps({'seq': seq, 'op': op, 'record': record}, ensure_ascii=False))
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        
+        with open(JOURNAL_FILE, 'ab') as f:
+            # Ne pas coller l'entrée à une ligne incomplète (écriture interrompue)
+            if f.tell() > 0:
+                with open(JOURNAL_FILE, 'rb') as r:
+                    r.seek(-1, os.SEEK_END)
+                    if r.read(1) != b'\n':
+                        payload = b'\n' + payload
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        journal_size = os.path.getsize(JOURNAL_FILE)
+    
+    if journal_size > JOURNAL_COMPACT_BYTES:
+        compact_journal_async()
+    
+    return seq
+
+def upsert_user_profile(profile: Dict[str, Any]) -> None:
+    """Crée ou met à jour le profil d'un utilisateur (écriture O(enregistrement) dans le journal)"""
+    if profile.get('user_id') is None:
+        raise ValueError("user_id est requis")
+    profile = _profile_update(profile)
+    backend = _sqlite_backend()
+    if backend is not None:
+        backend.upsert_user_profiles([profile])
+        return
+    _append_journal([('upsert_profile', profile)])
+
+def upsert_user_profiles(profiles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Crée ou met à jour plusieurs profils en une seule écriture (un ajout au journal,
+    ou une transaction SQLite).
+    Retourne un résultat par enregistrement, dans l'ordre :
+    {'user_id', 'status': 'created' | 'updated' | 'error', 'error' (si status == 'error')}
+    """
+    backend = _sqlite_backend()
+    candidate_ids = [p.get('user_id') for p in profiles if isinstance(p, dict) and p.get('user_id') is not None]
+    if backend is not None:
+        known_ids = backend.existing_user_ids(candidate_ids)
+    else:
+        known_ids = _profiles_by_user_id().keys()
+    
+    results = []
+    valid = []
+    seen = set()
+    for profile in profiles:
+        user_id = profile.get('user_id') if isinstance(profile, dict) else None
+        if user_id is None:
+            results.append({'user_id': None, 'status': 'error', 'error': 'user_id est requis'})
+            continue
+        status = 'updated' if user_id in seen or user_id in known_ids else 'created'
+        seen.add(user_id)
+        valid.append(_profile_update(profile))
+        results.append({'user_id': user_id, 'status': status})
+    
+    if valid:
+        if backend is not None:
+            backend.upsert_user_profiles(valid)
+        else:
+            _append_journal([('upsert_profile', p) for p in valid])
+    
+    return results
+
+def append_interactions(interactions: List[Dict[str, Any]]) -> int:
+    """Ajoute des interactions utilisateur au journal en une seule écriture"""
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.append_interactions(interactions)
+    _append_journal([('add_interaction', i) for i in interactions])
+    return len(interactions)
+
+def compact_journal() -> int:
+    """
+    Replie le journal dans data.json et le remplace par un point de reprise.
+    Retourne le nombre d'entrées repliées.
+    """
+    with write_lock():
+        records, _ = _read_journal()
+        data = _load_base_data()
+        _apply_journal(data, records)
+        # Profiter de la réécriture pour sortir les anciens modèles base64 du JSON
+        _externalize_inline_models(data.get('ml_models', []))
+        folded_seq = data.get('_journal_seq', 0)
+        save_data(data)
+        
+        # Le journal ne contient plus qu'un point de reprise pour conserver la séquence
+        _atomic_write(JOURNAL_FILE, lambda f: f.write(json.dumps({'seq': folded_seq, 'op': 'checkpoint'}) + '\n'))
+    
+    return len(records)
+
+def compact_journal_async() -> None:
+    """Lance la compaction du journal dans un thread d'arrière-plan (si aucune n'est en cours)"""
+    global _compaction_thread
+    with _lock:
+        if _compaction_thread is not None and _compaction_thread.is_alive():
+            return
+        
+        def run():
+            try:
+                folded = compact_journal()
+                print(f"✅ Journal compacté ({folded} entrées repliées dans {DATA_FILE.name})")
+            except Exception as e:
+                print(f"❌ Erreur lors de la compaction du journal: {e}")
+        
+        _compaction_thread = threading.Thread(target=run, name='journal-compaction', daemon=True)
+        _compaction_thread.start()
+
+# ============================================================================
+# Stockage des archives de modèles (adressé par contenu)
+# ============================================================================
+
+def store_model_blob(model_data: bytes) -> Tuple[str, int]:
+    """Écrit une archive de modèle dans models/<sha256>.zip (dédupliquée) et retourne (sha256, taille)"""
+    import hashlib
+    model_sha256 = hashlib.sha256(model_data).hexdigest()
+    blob_path = MODELS_DIR / f'{model_sha256}.zip'
+    
+    if not blob_path.exists():
+        MODELS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_name(f'{blob_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(model_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, blob_path)
+    else:
+        # Archive déjà présente (même contenu) : rajeunie pour qu'elle ne soit pas supprimée
+        # comme orpheline avant l'enregistrement de la nouvelle version (voir model_gc)
+        os.utime(blob_path)
+    
+    return model_sha256, len(model_data)
+
+def model_blob_path(model_entry: Dict[str, Any]) -> Optional[Path]:
+    """Chemin de l'archive d'un modèle dans le stockage externe (None pour l'ancien format base64)"""
+    model_sha256 = model_entry.get('model_sha256')
+    if not model_sha256:
+        return None
+    return MODELS_DIR / f'{model_sha256}.zip'
+
+def extract_model_archive(model_entry: Dict[str, Any], dest_dir: str) -> None:
+    """Extrait l'archive d'un modèle dans `dest_dir`, en la lisant directement depuis le disque"""
+    import zipfile
+    
+    blob_path = model_blob_path(model_entry)
+    if blob_path is not None:
+        if not blob_path.exists():
+            raise FileNotFoundError(f"Archive du modèle introuvable: {blob_path}")
+        with zipfile.ZipFile(blob_path, 'r') as zipf:
+            zipf.extractall(dest_dir)
+        return
+    
+    # Ancien format : archive encodée en base64 dans le JSON
+    import base64
+    import io
+    model_data_str = model_entry.get('model_data')
+    if model_data_str is None:
+        raise ValueError("Le modèle ne contient aucune donnée")
+    if isinstance(model_data_str, str):
+        try:
+            model_data = base64.b64decode(model_data_str)
+        except:
+            # Si ce n'est pas du base64, essayer directement
+            model_data = model_data_str.encode('latin-1')
+    else:
+        model_data = model_data_str
+    
+    with zipfile.ZipFile(io.BytesIO(model_data), 'r') as zipf:
+        zipf.extractall(dest_dir)
+
+def _model_bytes(model_data: Any) -> bytes:
+    """Archive d'un modèle en bytes (l'ancien format la sérialisait en base64 ou en latin-1)"""
+    if isinstance(model_data, bytes):
+        return model_data
+    import base64
+    try:
+        return base64.b64decode(model_data, validate=True)
+    except Exception:
+        return model_data.encode('latin-1')
+
+def _externalize_inline_models(models: List[Dict[str, Any]]) -> int:
+    """Déplace les archives encodées en base64 vers le stockage externe (modifie `models` sur place)"""
+    moved = 0
+    for model in models:
+        model_data_str = model.get('model_data')
+        if model.get('model_sha256') or not isinstance(model_data_str, str):
+            continue
+        model['model_sha256'], model['model_size'] = store_model_blob(_model_bytes(model_data_str))
+        del model['model_data']
+        moved += 1
+    return moved
+
+def externalize_model_blobs() -> int:
+    """Migre tous les modèles encore stockés en base64 dans data.json vers models/. Retourne le nombre migré."""
+    with write_lock():
+        data = load_data()
+        moved = _externalize_inline_models(data.get('ml_models', []))
+        if moved:
+            save_data(data)
+    return moved
+
+# ============================================================================
+# Instantané partagé en lecture seule
+# ============================================================================
+
+def _file_signature() -> Optional[Tuple[int, int, int]]:
+    """Signature du fichier JSON (mtime, taille, inode) ou None s'il n'existe pas"""
+    try:
+        st = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def snapshot_version() -> Tuple:
+    """Version courante des données (change à chaque écriture du fichier ou du journal)"""
+    return (_file_signature(), _generation, _journal_signature())
+
+def _current_sections() -> Tuple[JsonSections, Tuple, Dict[str, Any]]:
+    """
+    Vue par sections de la version courante de data.json : (vue, clé de version, sections décodées).
+    Le fichier n'est réindexé que s'il a changé ; chaque section est décodée au plus une fois.
+    """
+    global _sections_state
+    state = _sections_state
+    if state is not None and state[1] == (_file_signature(), _generation):
+        return state
+    
+    ensure_data_file()
+    with _snapshot_lock:
+        # Un autre thread a peut-être déjà réindexé le fichier
+        generation = _generation
+        state = _sections_state
+        if state is not None and state[1] == (_file_signature(), generation):
+            return state
+        
+        # Le fichier est toujours remplacé atomiquement : un JSON invalide ne peut venir que
+        # d'un écrivain externe non atomique. On réessaie brièvement.
+        for attempt in range(3):
+            try:
+                view = JsonSections(DATA_FILE)
+                break
+            except ValueError as e:
+                if attempt == 2:
+                    raise ValueError(f"Fichier JSON corrompu ({DATA_FILE}): {e}") from e
+                time.sleep(0.05)
+        
+        # La signature vient du fichier ouvert : si il est remplacé entre-temps,
+        # le prochain appel verra une signature différente et réindexera
+        state = (view, (view.signature, generation), {})
+        _sections_state = state
+        return state
+
+def _decode_section(state: Tuple[JsonSections, Tuple, Dict[str, Any]], name: str, default: Any = None) -> Any:
+    """Décode une section d'une vue donnée (au plus une fois par version du fichier)"""
+    view, _, decoded = state
+    if name not in decoded:
+        # Décodage hors verrou : au pire deux threads décodent la même section
+        decoded.setdefault(name, view.load(name, default))
+    return decoded[name]
+
+def load_section(name: str, default: Any = None) -> Any:
+    """
+    Décode une seule section de premier niveau de data.json ('recipes', 'ml_models', ...),
+    sans le journal. Les autres sections ne sont ni lues ni décodées.
+    La valeur retournée est partagée entre les appels : elle ne doit PAS être modifiée.
+    """
+    return _decode_section(_current_sections(), name, default)
+
+def _journal_snapshot() -> Dict[str, Any]:
+    """
+    Profils et interactions du fichier de base superposés au journal (partagé, lecture seule).
+    Si seul le journal a grandi, seules les nouvelles entrées sont lues et superposées.
+    """
+    global _journal_view, _journal_view_key, _journal_view_pos
+    state = _current_sections()
+    key = state[1]
+    if _journal_view is not None and key == _journal_view_key and _journal_signature() == _journal_view_pos:
+        return _journal_view
+    
+    with _snapshot_lock:
+        journal_sig = _journal_signature()
+        if _journal_view is not None and key == _journal_view_key:
+            if journal_sig == _journal_view_pos:
+                return _journal_view
+            
+            # Même fichier de base, journal plus long : lire uniquement la fin du journal
+            if (journal_sig is not None and _journal_view_pos is not None
+                    and journal_sig[0] == _journal_view_pos[0]
+                    and journal_sig[1] > _journal_view_pos[1]):
+                records, journal_pos = _read_journal(_journal_view_pos[1])
+                if journal_pos is not None and journal_pos[0] == _journal_view_pos[0]:
+                    view = dict(_journal_view)
+                    view['user_profiles'] = list(view['user_profiles'])
+                    view['interactions'] = list(view['interactions'])
+                    _apply_journal(view, records)
+                    _journal_view = view
+                    _journal_view_pos = journal_pos
+                    return _journal_view
+        
+        # Copies superficielles : les sections décodées restent intactes
+        view = {
+            'user_profiles': list(_decode_section(state, 'user_profiles', [])),
+            'interactions': list(_decode_section(state, 'interactions', [])),
+            '_journal_seq': _decode_section(state, '_journal_seq', 0),
         }
-        save_data(default_data)
-        return default_data
+        records, journal_pos = _read_journal()
+        _apply_journal(view, records)
+        _journal_view = view
+        _journal_view_key = key
+        _journal_view_pos = journal_pos
+        return _journal_view
 
-def save_data(data: Dict[str, Any]) -> None:
-    """Sauvegarde les données dans le fichier JSON"""
+def load_snapshot() -> Dict[str, Any]:
+    """
+    Retourne l'instantané partagé de toutes les données (journal inclus), sans relire
+    le fichier s'il n'a pas changé. Préférer load_section() quand une seule section suffit.
+    Le dictionnaire retourné est partagé entre les appels : il ne doit PAS être modifié.
+    Pour modifier les données, utiliser load_data() puis save_data().
+    """
+    global _snapshot
+    state = _current_sections()
+    key = state[1]
+    journal_view = _journal_snapshot()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == key and snapshot[1] is journal_view:
+        return snapshot[2]
+    
+    data = {name: _decode_section(state, name) for name in state[0].sections}
+    data.update(journal_view)
+    _snapshot = (key, journal_view, data)
+    return data
+
+def catalog_version() -> str:
+    """
+    Version du contenu du catalogue de recettes (hash), pour savoir si un artefact dérivé
+    (catalogue compilé, vocabulaires, index...) est à jour.
+    En JSON, c'est le hash des octets de la section 'recipes' de data.json, calculé une fois
+    par version du fichier : toute écriture des recettes (init_data.py, transaction()...) la
+    change, les autres écritures (compaction du journal, profils) la laissent intacte.
+    """
+    import hashlib
+    backend = _sqlite_backend()
+    if backend is not None:
+        return hashlib.sha1(repr(backend.recipes_version()).encode('utf-8')).hexdigest()
+    
+    view, _, decoded = _current_sections()
+    version = decoded.get(_CATALOG_VERSION_KEY)
+    if version is None:
+        version = hashlib.sha1(view.raw('recipes') or b'').hexdigest()
+        decoded[_CATALOG_VERSION_KEY] = version
+    return version
+
+def invalidate_snapshot() -> None:
+    """Force le rechargement de l'instantané au prochain accès"""
+    global _generation
     with _lock:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        _generation += 1
 
 class Database:
     """Gestionnaire de base de données JSON"""
@@ -60,27 +727,26 @@ class Database:
     
     @staticmethod
     def execute_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """Exécute une requête SELECT simulée"""
-        data = load_data()
-        
+        """Exécute une requête SELECT simulée (seule la section concernée est décodée)"""
         # Simuler des requêtes SQL simples
         if 'recipe_templates' in query.lower() or 'recipes' in query.lower():
-            return data.get('recipes', [])
+            return load_section('recipes', [])
         elif 'user_profiles' in query.lower():
             user_id = params[0] if params else None
-            profiles = data.get('user_profiles', [])
+            profiles = _journal_snapshot()['user_profiles']
             if user_id:
                 return [p for p in profiles if p.get('user_id') == user_id]
             return profiles
         elif 'user_interactions' in query.lower() or 'interactions' in query.lower():
             user_id = params[0] if params else None
-            interactions = data.get('interactions', [])
+            interactions = _journal_snapshot()['interactions']
             if user_id:
                 return [i for i in interactions if i.get('user_id') == user_id]
             return interactions
         elif 'ml_models' in query.lower():
+            import model_registry
             model_name = params[0] if params else None
-            models = data.get('ml_models', [])
+            models = model_registry.list_models()
             if model_name:
                 return [m for m in models if m.get('model_name') == model_name and m.get('is_active', False)]
             return models
@@ -89,51 +755,45 @@ class Database:
     
     @staticmethod
     def execute_update(query: str, params: tuple = None) -> int:
-        """Exécute une requête INSERT/UPDATE simulée"""
-        data = load_data()
+        """Exécute une requête INSERT/UPDATE simulée (les modèles vont dans le registre)"""
+        import model_registry
         last_id = 0
         
         if 'INSERT INTO ml_models' in query.upper():
             # Ajouter un modèle
-            models = data.get('ml_models', [])
-            last_id = len(models) + 1
-            
-            model_data = {
-                'id': last_id,
-                'model_name': params[0],
-                'model_type': params[1],
-                'model_version': params[2],
-                'model_data': params[3].decode('latin-1') if isinstance(params[3], bytes) else params[3],  # Stocker en string
-                'model_metadata': json.loads(params[4]) if isinstance(params[4], str) else params[4],
-                'training_data_size': params[5],
-                'is_active': bool(params[6]),
-                'created_at': None  # Peut être ajouté si nécessaire
-            }
-            
-            models.append(model_data)
-            data['ml_models'] = models
-            save_data(data)
+            last_id = save_model_to_db(
+                params[0],
+                params[1],
+                params[2],
+                params[3],
+                json.loads(params[4]) if isinstance(params[4], str) else params[4],
+                params[5],
+                bool(params[6])
+            )
         
         elif 'UPDATE ml_models' in query.upper():
             # Mettre à jour un modèle
-            models = data.get('ml_models', [])
             model_name = params[0] if params else None
             
             if model_name:
-                for model in models:
-                    if model.get('model_name') == model_name:
-                        if 'is_active' in query.upper():
-                            model['is_active'] = bool(params[1] if len(params) > 1 else False)
-                        else:
-                            # Mise à jour complète
-                            if len(params) > 3:
-                                model['model_data'] = params[3].decode('latin-1') if isinstance(params[3], bytes) else params[3]
-                                model['model_metadata'] = json.loads(params[4]) if isinstance(params[4], str) else params[4]
-                                model['training_data_size'] = params[5]
-                        break
-            
-            data['ml_models'] = models
-            save_data(data)
+                models = model_registry.list_models(model_name)
+                if models:
+                    model = models[0]
+                    if 'is_active' in query.upper():
+                        if params[1] if len(params) > 1 else False:
+                            activate_model(model['id'], model_name)
+                        elif model['is_active']:
+                            model_registry.deactivate_model(model_name)
+                    else:
+                        # Mise à jour complète
+                        if len(params) > 3:
+                            model_sha256, model_size = store_model_blob(_model_bytes(params[3]))
+                            model_registry.update_model(model['id'], {
+                                'model_sha256': model_sha256,
+                                'model_size': model_size,
+                                'model_metadata': json.loads(params[4]) if isinstance(params[4], str) else params[4],
+                                'training_data_size': params[5]
+                            })
         
         return last_id
 
@@ -141,8 +801,10 @@ class Database:
 def load_recipe_templates() -> List[Dict[str, Any]]:
     """Charge toutes les recettes depuis le JSON"""
     try:
-        data = load_data()
-        recipes = data.get('recipes', [])
+        backend = _sqlite_backend()
+        if backend is not None:
+            return backend.load_recipe_templates()
+        recipes = load_section('recipes', [])
         if not recipes:
             print("⚠️  Aucune recette dans le fichier JSON")
         return recipes
@@ -152,19 +814,32 @@ def load_recipe_templates() -> List[Dict[str, Any]]:
         traceback.print_exc()
         return []
 
+def _profiles_by_user_id() -> Dict[Any, Dict[str, Any]]:
+    """Index user_id -> profil (journal inclus), reconstruit uniquement quand les profils changent"""
+    global _profile_index
+    journal_view = _journal_snapshot()
+    index = _profile_index
+    if index is None or index[0] is not journal_view:
+        profiles = {}
+        for profile in journal_view['user_profiles']:
+            profiles.setdefault(profile.get('user_id'), profile)
+        index = (journal_view, profiles)
+        _profile_index = index
+    return index[1]
+
 def load_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
     """Charge le profil d'un utilisateur"""
-    data = load_data()
-    profiles = data.get('user_profiles', [])
-    for profile in profiles:
-        if profile.get('user_id') == user_id:
-            return profile
-    return None
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.load_user_profile(user_id)
+    return _profiles_by_user_id().get(user_id)
 
 def load_user_interactions(user_id: int, limit: int = 10000) -> List[Dict[str, Any]]:
     """Charge les interactions d'un utilisateur"""
-    data = load_data()
-    interactions = data.get('interactions', [])
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.load_user_interactions(user_id, limit)
+    interactions = _journal_snapshot()['interactions']
     user_interactions = [
         i for i in interactions 
         if i.get('user_id') == user_id and i.get('recipe_template_id') is not None
@@ -180,81 +855,50 @@ def save_model_to_db(
     training_data_size: int = 0,
     is_active: bool = False
 ) -> int:
-    """Sauvegarde un modèle ML dans le JSON"""
-    data = load_data()
-    models = data.get('ml_models', [])
-    
-    # Trouver le dernier ID
-    last_id = max([m.get('id', 0) for m in models], default=0) + 1
-    
-    # Convertir les bytes en string pour JSON
-    if isinstance(model_data, bytes):
-        import base64
-        model_data_str = base64.b64encode(model_data).decode('utf-8')
-    else:
-        model_data_str = model_data
-    
-    model_entry = {
-        'id': last_id,
-        'model_name': model_name,
-        'model_type': model_type,
-        'model_version': model_version,
-        'model_data': model_data_str,  # Stocké en base64
-        'model_metadata': metadata,
-        'training_data_size': training_data_size,
-        'is_active': is_active
-    }
+    """
+    Sauvegarde un modèle ML : l'archive est écrite dans models/<sha256>.zip,
+    seuls le hash et les métadonnées sont enregistrés dans le registre (models/registry.json)
+    """
+    # Écrire l'archive avant de référencer son hash
+    model_sha256, model_size = store_model_blob(_model_bytes(model_data))
     
-    # Désactiver les autres modèles du même type
-    if is_active:
-        for model in models:
-            if model.get('model_name') == model_name:
-                model['is_active'] = False
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.save_model_to_db(
+            model_name, model_type, model_version, model_sha256, model_size,
+            metadata, training_data_size, is_active
+        )
     
-    models.append(model_entry)
-    data['ml_models'] = models
-    save_data(data)
-    
-    return last_id
+    import model_registry
+    return model_registry.register_model(
+        model_name, model_type, model_version, model_sha256, model_size,
+        metadata, training_data_size, is_active
+    )
 
 def load_model_from_db(model_name: str, model_version: str = 'latest') -> Optional[Dict[str, Any]]:
-    """Charge un modèle depuis le JSON"""
-    data = load_data()
-    models = data.get('ml_models', [])
-    
-    if model_version == 'latest':
-        # Trouver le modèle actif le plus récent
-        active_models = [
-            m for m in models 
-            if m.get('model_name') == model_name and m.get('is_active', False)
-        ]
-        if active_models:
-            # Trier par ID (le plus récent)
-            active_models.sort(key=lambda x: x.get('id', 0), reverse=True)
-            return active_models[0]
-    else:
-        # Trouver le modèle avec la version spécifiée
-        for model in models:
-            if model.get('model_name') == model_name and model.get('model_version') == model_version:
-                return model
-    
-    return None
+    """Charge l'entrée d'un modèle depuis le registre"""
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.load_model_from_db(model_name, model_version)
+    import model_registry
+    return model_registry.load_model(model_name, model_version)
 
 def activate_model(model_id: int, model_name: str) -> None:
-    """Active un modèle et désactive les autres du même type"""
-    data = load_data()
-    models = data.get('ml_models', [])
-    
-    # Désactiver tous les modèles du même nom
-    for model in models:
-        if model.get('model_name') == model_name:
-            model['is_active'] = False
-    
-    # Activer le modèle spécifié
-    for model in models:
-        if model.get('id') == model_id:
-            model['is_active'] = True
-            break
-    
-    data['ml_models'] = models
-    save_data(data)
+    """Active un modèle et désactive les autres du même type (seul le pointeur actif est réécrit)"""
+    backend = _sqlite_backend()
+    if backend is not None:
+        backend.activate_model(model_id, model_name)
+        return
+    import model_registry
+    model_registry.activate_model(model_id, model_name)
+
+def active_model_version(model_name: str) -> Any:
+    """
+    Jeton de la version active d'un modèle : change à chaque activation.
+    Assez léger pour être vérifié à chaque requête (un stat() en JSON, une requête indexée en SQLite).
+    """
+    backend = _sqlite_backend()
+    if backend is not None:
+        return backend.active_model_version(model_name)
+    import model_registry
+    return model_registry.active_model_version(model_name)
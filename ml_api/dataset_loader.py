@@ -4,8 +4,33 @@ Chargeur de dataset depuis le fichier JSON statique
 
 from typing import List, Dict, Any
 from database import load_recipe_templates
+from recipe_catalog import RecipeCatalog, get_recipe_catalog
+from recipe_bitsets import exclusion_keywords, has_excluded_ingredient
+from catalog_cache import register
 import json
 
+def _parse_recipe_fields(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertit les champs JSON stockés en string (copie si une conversion est nécessaire)"""
+    if not isinstance(recipe.get('ingredients'), str) and not isinstance(recipe.get('steps'), str):
+        return recipe
+    recipe = dict(recipe)
+    
+    # Convertir ingredients si c'est une string
+    if isinstance(recipe.get('ingredients'), str):
+        try:
+            recipe['ingredients'] = json.loads(recipe['ingredients'])
+        except:
+            recipe['ingredients'] = []
+    
+    # Convertir steps si c'est une string
+    if isinstance(recipe.get('steps'), str):
+        try:
+            recipe['steps'] = json.loads(recipe['steps'])
+        except:
+            recipe['steps'] = []
+    
+    return recipe
+
 def load_recipe_dataset() -> List[Dict[str, Any]]:
     """Charge toutes les recettes depuis le JSON"""
     try:
@@ -18,23 +43,9 @@ def load_recipe_dataset() -> List[Dict[str, Any]]:
         
         print(f"✅ {len(recipes)} recettes chargées")
         
-        # Convertir les champs JSON si nécessaire
-        for recipe in recipes:
-            # Convertir ingredients si c'est une string
-            if isinstance(recipe.get('ingredients'), str):
-                try:
-                    recipe['ingredients'] = json.loads(recipe['ingredients'])
-                except:
-                    recipe['ingredients'] = []
-            
-            # Convertir steps si c'est une string
-            if isinstance(recipe.get('steps'), str):
-                try:
-                    recipe['steps'] = json.loads(recipe['steps'])
-                except:
-                    recipe['steps'] = []
-        
-        return recipes
+        # Les recettes proviennent de l'instantané partagé de la base :
+        # on copie la liste et les recettes à convertir au lieu de les modifier sur place
+        return [_parse_recipe_fields(recipe) for recipe in recipes]
     except Exception as e:
         print(f"❌ Erreur lors du chargement des recettes: {e}")
         import traceback
@@ -44,41 +55,93 @@ def load_recipe_dataset() -> List[Dict[str, Any]]:
 def load_recipe_dataset_filtered(
     recipe_type: str = None,
     cuisine_type: str = None,
-    is_healthy: bool = None
+    is_healthy: bool = None,
+    allergies: List[str] = None,
+    dietary_preference: str = None
 ) -> List[Dict[str, Any]]:
-    """Charge les recettes avec filtres"""
+    """
+    Charge les recettes avec filtres.
+    Utilise l'index composite du catalogue compilé : seules les recettes retenues sont lues.
+    Les recettes contenant une allergie ou un ingrédient exclu par le régime sont retirées
+    par les masques d'exclusion du catalogue (un ET bit à bit sur toutes les positions).
+    """
     try:
-        recipes = load_recipe_dataset()
+        recipes = load_recipe_templates()
         
         if not recipes:
             print("⚠️  Aucune recette trouvée dans le dataset")
             return []
         
-        filtered = []
-        for recipe in recipes:
-            # Filtrer par type de recette
-            if recipe_type:
-                recipe_recipe_type = recipe.get('recipe_type', '').lower()
-                if recipe_recipe_type != recipe_type.lower():
-                    continue
-            
-            # Filtrer par type de cuisine
-            if cuisine_type:
-                recipe_cuisine = recipe.get('cuisine_type', '').lower()
-                if recipe_cuisine != cuisine_type.lower():
-                    continue
-            
-            # Filtrer par santé
-            if is_healthy is not None:
-                recipe_is_healthy = recipe.get('is_healthy', False)
-                if recipe_is_healthy != is_healthy:
-                    continue
-            
-            filtered.append(recipe)
+        catalog = load_recipe_catalog()
+        positions = catalog.filter_index().positions(recipe_type, cuisine_type, is_healthy)
+        if allergies or dietary_preference:
+            positions = positions[catalog.exclusion_bitsets().allowed(allergies, dietary_preference, positions)]
+        
+        # Le catalogue est compilé dans l'ordre des recettes : vérifier qu'il correspond
+        # toujours à la liste lue (fichier modifié entre les deux lectures)
+        if len(catalog) == len(recipes):
+            filtered = []
+            for i in positions:
+                recipe = recipes[i]
+                if recipe.get('id') is not None and recipe.get('id') != int(catalog.ids[i]):
+                    break
+                filtered.append(_parse_recipe_fields(recipe))
+            else:
+                return filtered
         
-        return filtered
+        return _filter_recipes(
+            load_recipe_dataset(), recipe_type, cuisine_type, is_healthy, allergies, dietary_preference
+        )
     except Exception as e:
         print(f"❌ Erreur lors du filtrage des recettes: {e}")
         import traceback
         traceback.print_exc()
         return []
+
+def _filter_recipes(
+    recipes: List[Dict[str, Any]],
+    recipe_type: str = None,
+    cuisine_type: str = None,
+    is_healthy: bool = None,
+    allergies: List[str] = None,
+    dietary_preference: str = None
+) -> List[Dict[str, Any]]:
+    """Filtrage par parcours complet (si le catalogue ne correspond pas aux recettes lues)"""
+    keywords = exclusion_keywords(allergies, dietary_preference)
+    filtered = []
+    for recipe in recipes:
+        # Filtrer par type de recette
+        if recipe_type:
+            recipe_recipe_type = recipe.get('recipe_type', '').lower()
+            if recipe_recipe_type != recipe_type.lower():
+                continue
+        
+        # Filtrer par type de cuisine
+        if cuisine_type:
+            recipe_cuisine = recipe.get('cuisine_type', '').lower()
+            if recipe_cuisine != cuisine_type.lower():
+                continue
+        
+        # Filtrer par santé
+        if is_healthy is not None:
+            recipe_is_healthy = recipe.get('is_healthy', False)
+            if recipe_is_healthy != is_healthy:
+                continue
+        
+        # Filtrer par allergies et régime
+        if keywords and has_excluded_ingredient(recipe.get('ingredients', []), keywords):
+            continue
+        
+        filtered.append(recipe)
+    
+    return filtered
+
+# Catalogue compilé de la version courante (son index de filtres vit avec lui)
+_catalog_cache = register('recipe_catalog', lambda version: get_recipe_catalog(version, load_recipe_dataset))
+
+def load_recipe_catalog() -> RecipeCatalog:
+    """
+    Charge le catalogue de recettes compilé (colonnes NumPy en mémoire partagée).
+    Compilé une seule fois par version des recettes, puis partagé par tous les workers.
+    """
+    return _catalog_cache.get()
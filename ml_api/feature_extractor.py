@@ -3,17 +3,85 @@ Extraction de features pour les modèles ML
 Convertit les données brutes en vecteurs numériques
 """
 
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
 import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from ingredient_canonicalizer import CANONICAL_INGREDIENTS, canonical_name
+
+# Allergènes encodés dans les features des requêtes (vecteur de pénalités)
+COMMON_ALLERGENS = ['nuts', 'peanuts', 'shellfish', 'fish', 'eggs',
+                    'milk', 'soy', 'wheat', 'gluten', 'sesame']
+
+# Features en CSR pour l'entraînement : la première couche Dense reçoit une entrée creuse
+# (produit creux x dense), le coût suit le nombre d'ingrédients par exemple et non la
+# taille du vocabulaire
+SPARSE_FEATURES = os.getenv('ML_SPARSE_FEATURES', '1').lower() not in ('0', 'false', 'no')
+
+# Hashing des ingrédients : nombre fixe de colonnes quelle que soit la taille du vocabulaire
+# (0 = désactivé, une colonne par ingrédient du vocabulaire)
+HASH_BUCKETS = int(os.getenv('ML_FEATURE_HASH_BUCKETS', 0))
+
+# Fichier de l'archive d'un modèle contenant l'état de son extracteur de features
+FEATURES_FILE = 'features.json'
+
+def as_model_input(features, sparse: bool):
+    """
+    Convertit des features (liste, ligne ou matrice ndarray, matrice CSR) en entrée de
+    modèle : CSR float32 pour un modèle à entrée creuse, ndarray float32 (2D) sinon
+    """
+    if sp.issparse(features):
+        X = features.astype(np.float32)
+        return X.tocsr() if sparse else X.toarray()
+    X = np.asarray(features, dtype=np.float32)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    return sp.csr_matrix(X) if sparse else X
+
+@lru_cache(maxsize=1 << 16)
+def hashed_column(key: str, buckets: int) -> Tuple[int, float]:
+    """
+    Colonne et signe (+1 / -1) d'un ingrédient en mode hashing. Hash stable (blake2b,
+    indépendant de PYTHONHASHSEED) : les mêmes colonnes à l'entraînement et au chargement.
+    Le signe rend nulle en moyenne la contribution des collisions.
+    """
+    h = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return h % buckets, (1.0 if h >> 63 else -1.0)
 
 class FeatureExtractor:
     """Extracteur de features pour les modèles ML"""
     
-    def __init__(self):
+    def __init__(self, canonicalize: bool = CANONICAL_INGREDIENTS, hash_buckets: int = HASH_BUCKETS):
+        # Vocabulaire sur les noms canoniques ("tomatoes" et "tomato" -> une seule feature)
+        self.canonicalize = canonicalize
+        # Mode hashing : ingrédients répartis dans `hash_buckets` colonnes (0 = vocabulaire)
+        self.hash_buckets = hash_buckets
         self.ingredient_vocabulary: Dict[str, int] = {}
         self.cuisine_types: Dict[str, int] = {}
         self.stats: Optional[Dict[str, float]] = None
     
+    def ingredient_key(self, ingredient: str) -> str:
+        """Clé d'un ingrédient dans le vocabulaire (nom canonique, ou minuscules sans espaces superflus)"""
+        if self.canonicalize:
+            return canonical_name(ingredient)
+        return ingredient.lower().strip()
+    
+    def ingredient_width(self) -> int:
+        """Nombre de colonnes du bloc ingrédients"""
+        return self.hash_buckets or len(self.ingredient_vocabulary) or 100
+    
+    def ingredient_column(self, key: str) -> Optional[Tuple[int, float]]:
+        """Colonne et valeur d'un ingrédient (clé de ingredient_key), None s'il est inconnu"""
+        if self.hash_buckets:
+            return hashed_column(key, self.hash_buckets)
+        idx = self.ingredient_vocabulary.get(key)
+        return (idx, 1.0) if idx is not None else None
+    
     def build_vocabularies(self, recipes: List[Dict[str, Any]]) -> None:
         """Construit les vocabulaires d'ingrédients et de cuisines"""
         ingredient_set = set()
@@ -26,7 +94,7 @@ class FeatureExtractor:
                 ingredients = json.loads(ingredients)
             
             for ing in ingredients:
-                ingredient_set.add(ing.lower().strip())
+                ingredient_set.add(self.ingredient_key(ing))
             
             # Cuisines
             cuisine = recipe.get('cuisine_type', 'Other')
@@ -40,6 +108,35 @@ class FeatureExtractor:
             cuisine: idx for idx, cuisine in enumerate(sorted(cuisine_set))
         }
     
+    def build_vocabularies_from_catalog(self, catalog) -> None:
+        """Construit les vocabulaires depuis un RecipeCatalog (mêmes index que build_vocabularies)"""
+        ingredients = catalog.ingredient_vocabulary
+        if self.canonicalize:
+            ingredients = catalog.canonical_ingredients().dictionary.names
+        self.ingredient_vocabulary = {
+            ing: idx for idx, ing in enumerate(ingredients)
+        }
+        self.cuisine_types = {
+            cuisine: idx for idx, cuisine in enumerate(catalog.cuisine_vocabulary)
+        }
+    
+    def calculate_dataset_stats_from_catalog(self, catalog) -> Dict[str, float]:
+        """Calcule les statistiques depuis les colonnes d'un RecipeCatalog (sans parcourir les recettes)"""
+        columns = {
+            'Calories': catalog.numeric_values('calories'),
+            'Price': catalog.numeric_values('estimated_price'),
+            'PrepTime': catalog.numeric_values('prep_time'),
+            'CookTime': catalog.numeric_values('cook_time'),
+        }
+        defaults = {'Calories': 1000, 'Price': 50, 'PrepTime': 180, 'CookTime': 180}
+        
+        self.stats = {}
+        for name, values in columns.items():
+            self.stats[f'min{name}'] = float(values.min()) if len(values) else 0
+            self.stats[f'max{name}'] = float(values.max()) if len(values) else defaults[name]
+        
+        return self.stats
+    
     def calculate_dataset_stats(self, recipes: List[Dict[str, Any]]) -> Dict[str, float]:
         """Calcule les statistiques du dataset pour la normalisation"""
         calories = []
@@ -70,6 +167,47 @@ class FeatureExtractor:
         
         return self.stats
     
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        État de l'extracteur (vocabulaires et statistiques) sous forme compacte : les
+        vocabulaires sont des listes dont la position est l'index de la feature (en mode
+        hashing, le vocabulaire d'ingrédients n'est pas enregistré : taille bornée)
+        """
+        return {
+            'ingredients': [] if self.hash_buckets else sorted(self.ingredient_vocabulary, key=self.ingredient_vocabulary.get),
+            'cuisines': sorted(self.cuisine_types, key=self.cuisine_types.get),
+            'stats': self.stats,
+            'canonicalize': self.canonicalize,
+            'hashBuckets': self.hash_buckets,
+        }
+    
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'FeatureExtractor':
+        """Recrée un extracteur depuis to_dict() (mêmes index de features qu'à l'entraînement)"""
+        extractor = cls(canonicalize=state.get('canonicalize', False), hash_buckets=state.get('hashBuckets', 0))
+        extractor.ingredient_vocabulary = {ing: idx for idx, ing in enumerate(state.get('ingredients', []))}
+        extractor.cuisine_types = {cuisine: idx for idx, cuisine in enumerate(state.get('cuisines', []))}
+        extractor.stats = state.get('stats')
+        return extractor
+    
+    def save_to_dir(self, directory: str) -> None:
+        """Écrit l'état de l'extracteur dans le répertoire d'un modèle (avant archivage)"""
+        with open(os.path.join(directory, FEATURES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+    
+    @classmethod
+    def load_from_dir(cls, directory: str) -> Optional['FeatureExtractor']:
+        """Extracteur enregistré avec un modèle (None pour les modèles qui n'en ont pas)"""
+        path = os.path.join(directory, FEATURES_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+    
+    def request_feature_size(self) -> int:
+        """Nombre de features d'une requête utilisateur (taille d'entrée des modèles)"""
+        return self.ingredient_width() + 1 + (len(self.cuisine_types) or 10) + 1 + len(COMMON_ALLERGENS)
+    
     def normalize(self, value: float, min_val: float, max_val: float) -> float:
         """Normalise une valeur entre 0 et 1"""
         if max_val == min_val:
@@ -91,14 +229,13 @@ class FeatureExtractor:
         
         features = []
         
-        # Encodage one-hot des ingrédients disponibles
-        vocab_size = len(self.ingredient_vocabulary) or 100
-        ingredient_vector = [0.0] * vocab_size
+        # Encodage one-hot des ingrédients disponibles (ou hashing signé)
+        ingredient_vector = [0.0] * self.ingredient_width()
         
-        for ing in available_ingredients:
-            idx = self.ingredient_vocabulary.get(ing.lower().strip())
-            if idx is not None:
-                ingredient_vector[idx] = 1.0
+        for key in {self.ingredient_key(ing) for ing in available_ingredients}:
+            column = self.ingredient_column(key)
+            if column is not None:
+                ingredient_vector[column[0]] += column[1]
         
         features.extend(ingredient_vector)
         
@@ -117,11 +254,10 @@ class FeatureExtractor:
         features.append(1.0 if is_healthy else 0.0)
         
         # Allergies (vecteur de pénalités)
-        common_allergens = ['nuts', 'peanuts', 'shellfish', 'fish', 'eggs', 
-                           'milk', 'soy', 'wheat', 'gluten', 'sesame']
-        allergen_vector = [0.0] * len(common_allergens)
-        for i, allergen in enumerate(common_allergens):
-            if allergen.lower() in [a.lower() for a in allergies]:
+        user_allergies = {a.lower() for a in allergies}
+        allergen_vector = [0.0] * len(COMMON_ALLERGENS)
+        for i, allergen in enumerate(COMMON_ALLERGENS):
+            if allergen in user_allergies:
                 allergen_vector[i] = -1.0  # Pénalité
         features.extend(allergen_vector)
         
@@ -138,18 +274,17 @@ class FeatureExtractor:
         
         features = []
         
-        # Encodage one-hot des ingrédients
-        vocab_size = len(self.ingredient_vocabulary) or 100
-        ingredient_vector = [0.0] * vocab_size
+        # Encodage one-hot des ingrédients (ou hashing signé)
+        ingredient_vector = [0.0] * self.ingredient_width()
         
         ingredients = recipe.get('ingredients', [])
         if isinstance(ingredients, str):
             ingredients = json.loads(ingredients)
         
-        for ing in ingredients:
-            idx = self.ingredient_vocabulary.get(ing.lower().strip())
-            if idx is not None:
-                ingredient_vector[idx] = 1.0
+        for key in {self.ingredient_key(ing) for ing in ingredients}:
+            column = self.ingredient_column(key)
+            if column is not None:
+                ingredient_vector[column[0]] += column[1]
         
         features.extend(ingredient_vector)
         
@@ -181,4 +316,308 @@ class FeatureExtractor:
         features.append(1.0 if recipe.get('is_healthy', False) else 0.0)
         
         return features
+    
+    def _ingredient_entries(self, ingredient_lists: List[List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(lignes, colonnes, valeurs) des ingrédients connus, une seule entrée par ingrédient et par ligne"""
+        rows = []
+        cols = []
+        values = []
+        for row, ingredients in enumerate(ingredient_lists):
+            if isinstance(ingredients, str):
+                ingredients = json.loads(ingredients)
+            for key in {self.ingredient_key(ing) for ing in ingredients}:
+                column = self.ingredient_column(key)
+                if column is not None:
+                    rows.append(row)
+                    cols.append(column[0])
+                    values.append(column[1])
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(values)
+    
+    def _cuisine_entries(self, cuisines: List[str], offset: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(lignes, colonnes) du one-hot des cuisines, à partir de la colonne `offset`"""
+        idx = np.array([self.cuisine_types.get(c.lower(), -1) for c in cuisines], dtype=np.int64)
+        known = np.flatnonzero(idx >= 0)
+        return known, offset + idx[known]
+    
+    @staticmethod
+    def _assemble(shape: Tuple[int, int], entries: List[tuple], dtype, sparse: bool):
+        """
+        Matrice à partir de blocs (lignes, colonnes, valeurs) : dense, ou CSR sans jamais
+        allouer la matrice dense (taille proportionnelle au nombre d'entrées non nulles).
+        Les entrées sur une même case s'additionnent (collisions du mode hashing).
+        """
+        rows = np.concatenate([np.asarray(r, dtype=np.int64) for r, _, _ in entries])
+        cols = np.concatenate([np.asarray(c, dtype=np.int64) for _, c, _ in entries])
+        values = np.concatenate([
+            np.broadcast_to(np.asarray(v, dtype=dtype), (len(r),)) for r, _, v in entries
+        ])
+        if sparse:
+            nonzero = values != 0
+            X = sp.csr_matrix((values[nonzero], (rows[nonzero], cols[nonzero])), shape=shape, dtype=dtype)
+            X.eliminate_zeros()
+            return X
+        X = np.zeros(shape, dtype=dtype)
+        np.add.at(X, (rows, cols), values)
+        return X
+    
+    def extract_user_request_features_batch(
+        self,
+        available_ingredients: List[List[str]],
+        recipe_types: List[str],
+        cuisine_types: List[str],
+        is_healthy: List[bool],
+        allergies: Optional[List[List[str]]] = None,
+        stats: Optional[Dict[str, float]] = None,
+        dtype=np.float32,
+        sparse: bool = False
+    ):
+        """
+        Features de plusieurs requêtes (une ligne par requête), même disposition que
+        extract_user_request_features : [ingrédients | type | cuisines | santé | allergènes]
+        
+        Returns:
+            np.ndarray, ou scipy.sparse.csr_matrix si sparse=True
+        """
+        n = len(available_ingredients)
+        vocab_size = self.ingredient_width()
+        cuisine_size = len(self.cuisine_types) or 10
+        type_col = vocab_size
+        cuisine_col = type_col + 1
+        healthy_col = cuisine_col + cuisine_size
+        allergen_col = healthy_col + 1
+        
+        all_rows = np.arange(n)
+        entries = [
+            self._ingredient_entries(available_ingredients),
+            (all_rows, np.full(n, type_col), [0 if t == 'sweet' else 1 for t in recipe_types]),
+            (*self._cuisine_entries(cuisine_types, cuisine_col), 1),
+            (all_rows, np.full(n, healthy_col), [1 if h else 0 for h in is_healthy]),
+        ]
+        
+        if allergies is not None:
+            allergen_index = {allergen: i for i, allergen in enumerate(COMMON_ALLERGENS)}
+            rows = []
+            cols = []
+            for row, user_allergies in enumerate(allergies):
+                for allergen in {a.lower() for a in user_allergies or []}:
+                    i = allergen_index.get(allergen)
+                    if i is not None:
+                        rows.append(row)
+                        cols.append(allergen_col + i)
+            entries.append((rows, cols, -1))  # Pénalité
+        
+        return self._assemble((n, allergen_col + len(COMMON_ALLERGENS)), entries, dtype, sparse)
+
+    def extract_sampled_request_features(
+        self,
+        recipes: List[Dict[str, Any]],
+        examples_per_recipe: int,
+        cuisines: List[str],
+        cuisine_match: float = 0.7,
+        min_ratio: float = 0.3,
+        max_ratio: float = 0.8,
+        dtype=np.float32,
+        sparse: bool = False
+    ):
+        """
+        Requêtes simulées pour l'entraînement, `examples_per_recipe` par recette (ordre des
+        recettes), générées en une fois avec NumPy. Chaque requête reprend le type et la santé
+        de sa recette, sa cuisine (probabilité `cuisine_match`, sinon une cuisine de
+        `cuisines` au hasard) et un sous-ensemble aléatoire de `min_ratio` à `max_ratio` de
+        ses ingrédients (au moins un). Même disposition que extract_user_request_features_batch
+        (sans allergies).
+        """
+        ingredient_lists = [recipe.get('ingredients', []) for recipe in recipes]
+        ingredient_lists = [json.loads(ings) if isinstance(ings, str) else ings for ings in ingredient_lists]
+        n = len(recipes) * examples_per_recipe
+        vocab_size = self.ingredient_width()
+        cuisine_size = len(self.cuisine_types) or 10
+        type_col = vocab_size
+        cuisine_col = type_col + 1
+        healthy_col = cuisine_col + cuisine_size
+        allergen_col = healthy_col + 1
+        all_rows = np.arange(n)
+        
+        # Matrice CSR recette -> clés d'ingrédients (liste d'origine, doublons compris)
+        key_index: Dict[str, int] = {}
+        recipe_keys = np.array([
+            key_index.setdefault(self.ingredient_key(ing), len(key_index))
+            for ings in ingredient_lists for ing in ings
+        ], dtype=np.int64)
+        lengths = np.array([len(ings) for ings in ingredient_lists], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        columns = [self.ingredient_column(key) for key in key_index]
+        key_cols = np.array([c[0] if c is not None else -1 for c in columns] or [-1], dtype=np.int64)
+        key_values = np.array([c[1] if c is not None else 0.0 for c in columns] or [0.0])
+        
+        # Recette de chaque requête, puis une entrée par ingrédient de cette recette
+        sample_recipes = np.repeat(np.arange(len(recipes)), examples_per_recipe)
+        sample_lengths = lengths[sample_recipes]
+        ratios = min_ratio + np.random.random(n) * (max_ratio - min_ratio)
+        sample_counts = np.minimum(np.maximum(1, (sample_lengths * ratios).astype(np.int64)), sample_lengths)
+        entry_samples = np.repeat(all_rows, sample_lengths)
+        entry_offsets = np.arange(len(entry_samples)) - np.repeat(np.cumsum(sample_lengths) - sample_lengths, sample_lengths)
+        entry_keys = recipe_keys[np.repeat(indptr[sample_recipes], sample_lengths) + entry_offsets]
+        
+        # Tirage sans remise : rang aléatoire dans chaque requête, on garde les `sample_counts` premiers
+        order = np.lexsort((np.random.random(len(entry_samples)), entry_samples))
+        ranks = np.empty(len(entry_samples), dtype=np.int64)
+        ranks[order] = entry_offsets
+        chosen = ranks < sample_counts[entry_samples]
+        
+        # Une entrée par clé et par requête (les collisions du mode hashing s'additionnent ensuite)
+        width = max(len(key_index), 1)
+        pairs = np.unique(entry_samples[chosen] * width + entry_keys[chosen])
+        ingredient_rows = pairs // width
+        ingredient_keys = pairs % width
+        known = key_cols[ingredient_keys] >= 0
+        
+        # Cuisine de la recette, ou cuisine au hasard
+        recipe_cuisines = np.array([
+            self.cuisine_types.get(recipe.get('cuisine_type', 'Other').lower(), -1) for recipe in recipes
+        ] or [-1], dtype=np.int64)
+        random_cuisines = np.array([self.cuisine_types.get(c.lower(), -1) for c in cuisines], dtype=np.int64)
+        cuisine_ids = np.where(
+            np.random.random(n) < cuisine_match,
+            recipe_cuisines[sample_recipes],
+            random_cuisines[np.random.randint(len(cuisines), size=n)]
+        )
+        cuisine_known = np.flatnonzero(cuisine_ids >= 0)
+        
+        savory = np.array([recipe.get('recipe_type', 'savory') != 'sweet' for recipe in recipes] or [True])
+        healthy = np.array([bool(recipe.get('is_healthy', False)) for recipe in recipes] or [False])
+        
+        entries = [
+            (ingredient_rows[known], key_cols[ingredient_keys[known]], key_values[ingredient_keys[known]]),
+            (all_rows, np.full(n, type_col), savory[sample_recipes]),
+            (cuisine_known, cuisine_col + cuisine_ids[cuisine_known], 1),
+            (all_rows, np.full(n, healthy_col), healthy[sample_recipes]),
+        ]
+        return self._assemble((n, allergen_col + len(COMMON_ALLERGENS)), entries, dtype, sparse)
 
+    def extract_recipe_features_batch(
+        self,
+        recipes: List[Dict[str, Any]],
+        stats: Optional[Dict[str, float]] = None,
+        dtype=np.float32,
+        sparse: bool = False
+    ):
+        """
+        Features de plusieurs recettes (une ligne par recette), même disposition que
+        extract_recipe_features : [ingrédients | type | cuisines | 4 numériques | santé]
+        
+        Returns:
+            np.ndarray, ou scipy.sparse.csr_matrix si sparse=True
+        """
+        if stats is None:
+            stats = self.stats or {}
+        
+        n = len(recipes)
+        vocab_size = self.ingredient_width()
+        cuisine_size = len(self.cuisine_types) or 10
+        type_col = vocab_size
+        cuisine_col = type_col + 1
+        numeric_col = cuisine_col + cuisine_size
+        healthy_col = numeric_col + 4
+        
+        all_rows = np.arange(n)
+        entries = [
+            self._ingredient_entries([recipe.get('ingredients', []) for recipe in recipes]),
+            (all_rows, np.full(n, type_col),
+             [0 if recipe.get('recipe_type', 'savory') == 'sweet' else 1 for recipe in recipes]),
+            (*self._cuisine_entries([recipe.get('cuisine_type', 'Other') for recipe in recipes], cuisine_col), 1),
+        ]
+        
+        # Features numériques normalisées (calcul en float64 comme normalize())
+        numeric = [
+            ('calories', 'minCalories', 'maxCalories', 1000),
+            ('estimated_price', 'minPrice', 'maxPrice', 50),
+            ('prep_time', 'minPrepTime', 'maxPrepTime', 180),
+            ('cook_time', 'minCookTime', 'maxCookTime', 180),
+        ]
+        for j, (field, min_key, max_key, max_default) in enumerate(numeric):
+            values = np.array([float(recipe.get(field, 0)) for recipe in recipes])
+            min_val = stats.get(min_key, 0)
+            max_val = stats.get(max_key, max_default)
+            if max_val == min_val:
+                values = np.full(n, 0.5)
+            else:
+                values = (values - min_val) / (max_val - min_val)
+            entries.append((all_rows, np.full(n, numeric_col + j), values.astype(dtype)))
+        
+        entries.append((all_rows, np.full(n, healthy_col),
+                        [1 if recipe.get('is_healthy', False) else 0 for recipe in recipes]))
+        return self._assemble((n, healthy_col + 1), entries, dtype, sparse)
+    
+    def extract_recipe_features_from_catalog(
+        self,
+        catalog,
+        stats: Optional[Dict[str, float]] = None,
+        dtype=np.float32,
+        sparse: bool = False
+    ):
+        """
+        Features de toutes les recettes d'un RecipeCatalog, calculées depuis ses colonnes
+        (aucune recette reconstruite en dictionnaire). Ligne i identique à
+        extract_recipe_features(catalog.recipe(i)).
+        """
+        if stats is None:
+            stats = self.stats or {}
+        
+        n = len(catalog)
+        vocab_size = self.ingredient_width()
+        cuisine_size = len(self.cuisine_types) or 10
+        type_col = vocab_size
+        cuisine_col = type_col + 1
+        numeric_col = cuisine_col + cuisine_size
+        healthy_col = numeric_col + 4
+        all_rows = np.arange(n)
+        
+        # Vocabulaire du catalogue -> clé de cet extracteur -> (colonne, valeur), colonne -1 si inconnue
+        raw_keys = [self.ingredient_key(ing) for ing in catalog.ingredient_vocabulary]
+        keys = sorted(set(raw_keys))
+        key_index = {key: i for i, key in enumerate(keys)}
+        raw_to_key = np.array([key_index[key] for key in raw_keys] or [0], dtype=np.int64)
+        columns = [self.ingredient_column(key) for key in keys]
+        key_cols = np.array([c[0] if c is not None else -1 for c in columns] or [-1], dtype=np.int64)
+        key_values = np.array([c[1] if c is not None else 0.0 for c in columns] or [0.0])
+        
+        # Plusieurs variantes d'une recette peuvent avoir la même clé (vocabulaire canonique)
+        indptr = np.asarray(catalog.ingredient_indptr, dtype=np.int64)
+        ingredient_rows = np.repeat(all_rows, np.diff(indptr))
+        width = max(len(keys), 1)
+        pairs = np.unique(ingredient_rows * width + raw_to_key[np.asarray(catalog.ingredient_indices, dtype=np.int64)])
+        ingredient_rows = pairs // width
+        ingredient_keys = pairs % width
+        known = key_cols[ingredient_keys] >= 0
+        
+        sweet = np.array([label == 'sweet' for label in catalog.recipe_type_labels] or [False])
+        cuisine_map = np.array([self.cuisine_types.get(c, -1) for c in catalog.cuisine_vocabulary] or [-1], dtype=np.int64)
+        cuisine_cols = cuisine_map[np.asarray(catalog.cuisine_ids, dtype=np.int64)]
+        cuisine_known = np.flatnonzero(cuisine_cols >= 0)
+        
+        entries = [
+            (ingredient_rows[known], key_cols[ingredient_keys[known]], key_values[ingredient_keys[known]]),
+            (all_rows, np.full(n, type_col), np.where(sweet[np.asarray(catalog.recipe_type_ids)], 0, 1)),
+            (cuisine_known, cuisine_col + cuisine_cols[cuisine_known], 1),
+        ]
+        
+        # Valeurs absentes (NaN dans le catalogue) : 0, comme recipe.get(field, 0)
+        numeric = [
+            ('calories', 'minCalories', 'maxCalories', 1000),
+            ('estimated_price', 'minPrice', 'maxPrice', 50),
+            ('prep_time', 'minPrepTime', 'maxPrepTime', 180),
+            ('cook_time', 'minCookTime', 'maxCookTime', 180),
+        ]
+        for j, (column, min_key, max_key, max_default) in enumerate(numeric):
+            values = np.nan_to_num(np.asarray(catalog.arrays[column], dtype=np.float64), nan=0.0)
+            min_val = stats.get(min_key, 0)
+            max_val = stats.get(max_key, max_default)
+            if max_val == min_val:
+                values = np.full(n, 0.5)
+            else:
+                values = (values - min_val) / (max_val - min_val)
+            entries.append((all_rows, np.full(n, numeric_col + j), values.astype(dtype)))
+        
+        entries.append((all_rows, np.full(n, healthy_col), np.asarray(catalog.is_healthy)))
+        return self._assemble((n, healthy_col + 1), entries, dtype, sparse)
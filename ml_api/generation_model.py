@@ -3,15 +3,25 @@ Modèle de génération pour création de recettes personnalisées
 Utilise TensorFlow/Keras pour générer des recettes basées sur les ingrédients disponibles
 """
 
+import os
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, models, callbacks
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 import json
-from database import save_model_to_db, activate_model, load_model_from_db
-from feature_extractor import FeatureExtractor
-from dataset_loader import load_recipe_dataset
+from database import save_model_to_db, activate_model, load_model_from_db, extract_model_archive
+from feature_extractor import FeatureExtractor, SPARSE_FEATURES, HASH_BUCKETS, as_model_input
+from dataset_loader import load_recipe_dataset, load_recipe_catalog
+from recipe_features import get_recipe_feature_matrix, request_query
+from recipe_dedup import RecipeClasses, DEDUP_THRESHOLD, training_classes, class_positions
+from training_data import make_dataset, predict_classes
+
+# Poids de la correspondance avec la requête (features communes lues dans la matrice
+# précalculée) dans l'ordre des recettes prédites : 0 = ordre du modèle (défaut),
+# 1 = correspondance seule. Score combiné = (1 - w) * score / meilleur score du modèle
+# + w * part des features de la requête présentes dans la recette.
+RERANK_WEIGHT = float(os.getenv('ML_RERANK_WEIGHT', 0))
 
 class GenerationModel:
     """Modèle de génération pour création de recettes"""
@@ -20,6 +30,19 @@ class GenerationModel:
         self.model: Optional[keras.Model] = None
         self.feature_extractor = FeatureExtractor()
         self.recipes: List[Dict[str, Any]] = []
+        # Catalogue compilé (RecipeCatalog), utilisé à la place de `recipes` après chargement
+        self.catalog = None
+        # Features précalculées des recettes du catalogue (RecipeFeatureMatrix, modèle chargé)
+        self.feature_matrix = None
+        # Métriques du dernier entraînement (enregistrées avec le modèle)
+        self.metrics: Dict[str, float] = {}
+        # Classes de sortie : les recettes quasi-identiques partagent une classe
+        self.classes: Optional[RecipeClasses] = None
+        self.dedup_threshold: Optional[float] = DEDUP_THRESHOLD
+        # Position dans le catalogue de la recette de chaque classe (modèle chargé)
+        self.class_positions: Optional[np.ndarray] = None
+        # Entrée creuse (features CSR) : la première couche Dense ne touche que les ingrédients présents
+        self.sparse_input: bool = SPARSE_FEATURES
     
     def create_model(
         self,
@@ -27,15 +50,22 @@ class GenerationModel:
         output_size: int,
         hidden_layers: List[int] = [512, 256, 128, 64],
         learning_rate: float = 0.0003,
-        dropout: float = 0.35
+        dropout: float = 0.35,
+        sparse_input: bool = False
     ) -> keras.Model:
-        """Crée un modèle de génération"""
+        """Crée un modèle de génération (sparse_input : entrée creuse, features en CSR)"""
         model = keras.Sequential()
         
         # Input layer
+        if sparse_input:
+            # Entrée creuse : la première couche Dense fait un produit creux x dense
+            model.add(keras.Input(shape=(input_size,), sparse=True, name='sparse_input'))
+            first_layer = {}
+        else:
+            first_layer = {'input_shape': (input_size,)}
         model.add(layers.Dense(
             hidden_layers[0],
-            input_shape=(input_size,),
+            **first_layer,
             activation='relu',
             kernel_initializer='he_normal',
             kernel_regularizer=keras.regularizers.l2(0.0001),
@@ -66,7 +96,7 @@ class GenerationModel:
         # Compiler
         model.compile(
             optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
-            loss='categorical_crossentropy',
+            loss='sparse_categorical_crossentropy',  # Labels entiers (pas de one-hot)
             metrics=['accuracy']
         )
         
@@ -82,13 +112,18 @@ class GenerationModel:
         self.feature_extractor.build_vocabularies(recipes)
         stats = self.feature_extractor.calculate_dataset_stats(recipes)
         
-        features = []
+        # Classes de sortie (doublons regroupés), calculées une fois par entraînement
+        if self.classes is None or len(self.classes.labels) != len(recipes):
+            self.classes = training_classes(recipes, self.dedup_threshold)
+        classes = self.classes
+        
+        requests = {'available_ingredients': [], 'recipe_types': [], 'cuisine_types': [], 'is_healthy': []}
         labels = []
         
         # Pour chaque recette, créer plusieurs exemples avec différents sous-ensembles d'ingrédients
         examples_per_recipe = max(5, 8000 // len(recipes))
         
-        for recipe in recipes:
+        for position, recipe in enumerate(recipes):
             ingredients = recipe.get('ingredients', [])
             if isinstance(ingredients, str):
                 ingredients = json.loads(ingredients)
@@ -114,37 +149,31 @@ class GenerationModel:
                         if noise_ingredient not in available_ingredients:
                             available_ingredients.append(noise_ingredient)
                 
-                # Extraire les features
-                user_features = self.feature_extractor.extract_user_request_features(
-                    available_ingredients,
-                    recipe.get('recipe_type', 'savory'),
-                    recipe.get('cuisine_type', 'Other'),
-                    recipe.get('is_healthy', False),
-                    [],
-                    stats
-                )
-                
-                features.append(user_features)
-                labels.append(recipes.index(recipe))
-        
-        # Convertir en numpy arrays
-        X = np.array(features)
-        y = np.array(labels)
-        
-        # One-hot encoding
-        y_one_hot = keras.utils.to_categorical(y, num_classes=len(recipes))
+                # Requête simulée (features extraites en une fois après la boucle)
+                requests['available_ingredients'].append(available_ingredients)
+                requests['recipe_types'].append(recipe.get('recipe_type', 'savory'))
+                requests['cuisine_types'].append(recipe.get('cuisine_type', 'Other'))
+                requests['is_healthy'].append(recipe.get('is_healthy', False))
+                labels.append(classes.labels[position])
+        
+        # Convertir en numpy arrays (CSR si le modèle a une entrée creuse)
+        X = self.feature_extractor.extract_user_request_features_batch(
+            **requests, stats=stats, sparse=self.sparse_input
+        )
+        # Labels entiers (classe de la recette de chaque exemple)
+        y = np.array(labels, dtype=np.int32)
         
         # Split train/validation/test (70/15/15)
-        n = len(X)
+        n = X.shape[0]
         train_end = int(n * 0.7)
         val_end = train_end + int(n * 0.15)
         
         X_train = X[:train_end]
-        y_train = y_one_hot[:train_end]
+        y_train = y[:train_end]
         X_val = X[train_end:val_end]
-        y_val = y_one_hot[train_end:val_end]
+        y_val = y[train_end:val_end]
         X_test = X[val_end:]
-        y_test = y_one_hot[val_end:]
+        y_test = y[val_end:]
         
         return X_train, y_train, X_val, y_val, X_test, y_test
     
@@ -154,23 +183,39 @@ class GenerationModel:
         batch_size: int = 64,
         hidden_layers: List[int] = [512, 256, 128, 64],
         learning_rate: float = 0.0003,
-        dropout: float = 0.35
+        dropout: float = 0.35,
+        dedup_threshold: Optional[float] = DEDUP_THRESHOLD,
+        sparse_input: bool = SPARSE_FEATURES,
+        hash_buckets: int = HASH_BUCKETS
     ) -> Dict[str, Any]:
-        """Entraîne le modèle de génération"""
+        """
+        Entraîne le modèle de génération (dedup_threshold=None : une classe par recette ;
+        sparse_input : features CSR et entrée creuse ; hash_buckets > 0 : ingrédients hashés
+        dans un nombre fixe de colonnes, taille d'entrée indépendante du vocabulaire)
+        """
         # Charger les recettes
         recipes = load_recipe_dataset()
         self.recipes = recipes
+        self.dedup_threshold = dedup_threshold
+        self.classes = None
+        self.sparse_input = sparse_input
+        self.feature_extractor = FeatureExtractor(hash_buckets=hash_buckets)
         
         if len(recipes) < 100:
             raise ValueError(f"Dataset trop petit ({len(recipes)} recettes). Minimum 100 requis pour la génération.")
         
         # Préparer les données
         X_train, y_train, X_val, y_val, X_test, y_test = self.prepare_training_data(recipes)
+        # Pipeline tf.data : lots lus dans les features à la demande, ordre mélangé à chaque epoch
+        train_data = make_dataset(X_train, y_train, batch_size, shuffle=True)
+        val_data = make_dataset(X_val, y_val, batch_size)
+        test_data = make_dataset(X_test, y_test, batch_size)
         
         # Créer le modèle
         input_size = X_train.shape[1]
-        output_size = len(recipes)
-        model = self.create_model(input_size, output_size, hidden_layers, learning_rate, dropout)
+        output_size = self.classes.num_classes
+        model = self.create_model(input_size, output_size, hidden_layers, learning_rate, dropout,
+                                  sparse_input=sparse_input)
         
         # Callbacks
         early_stopping = callbacks.EarlyStopping(
@@ -188,32 +233,31 @@ class GenerationModel:
         
         # Entraîner
         history = model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            train_data,
+            validation_data=val_data,
             epochs=epochs,
-            batch_size=batch_size,
             callbacks=[early_stopping, reduce_lr],
             verbose=1
         )
         
         # Évaluer
-        test_loss, test_accuracy = model.evaluate(X_test, y_test, verbose=0)
+        test_loss, test_accuracy = model.evaluate(test_data, verbose=0)
         
         # Calculer métriques supplémentaires
-        y_pred = model.predict(X_test, verbose=0)
-        y_pred_classes = np.argmax(y_pred, axis=1)
-        y_true_classes = np.argmax(y_test, axis=1)
+        y_pred_classes = predict_classes(model, test_data)
+        y_true_classes = y_test
         
         from sklearn.metrics import f1_score
         ingredient_f1 = f1_score(y_true_classes, y_pred_classes, average='macro', zero_division=0)
         
         # Calculer MAE pour le prix (simplifié)
         price_mae = 0.0
+        canonical = self.classes.canonical
         for i, true_idx in enumerate(y_true_classes):
             pred_idx = y_pred_classes[i]
-            if true_idx < len(recipes) and pred_idx < len(recipes):
-                true_price = float(recipes[true_idx].get('estimated_price', 0))
-                pred_price = float(recipes[pred_idx].get('estimated_price', 0))
+            if true_idx < len(canonical) and pred_idx < len(canonical):
+                true_price = float(recipes[canonical[true_idx]].get('estimated_price', 0))
+                pred_price = float(recipes[canonical[pred_idx]].get('estimated_price', 0))
                 price_mae += abs(true_price - pred_price)
         price_mae /= len(y_test)
         
@@ -225,6 +269,7 @@ class GenerationModel:
         }
         
         self.model = model
+        self.metrics = metrics
         return metrics
     
     def save(self, model_version: str = None) -> int:
@@ -245,6 +290,9 @@ class GenerationModel:
             model_path = os.path.join(tmpdir, 'model')
             self.model.save(model_path)
             
+            # Vocabulaires et statistiques de l'entraînement, dans la même archive que les poids
+            self.feature_extractor.save_to_dir(model_path)
+            
             # Créer un zip
             zip_path = os.path.join(tmpdir, 'model.zip')
             with zipfile.ZipFile(zip_path, 'w') as zipf:
@@ -265,6 +313,10 @@ class GenerationModel:
             'outputSize': int(self.model.output_shape[1]),
             'hiddenLayers': [layer.units for layer in self.model.layers if isinstance(layer, layers.Dense)][:-1],
             'trainingDataSize': len(self.recipes),
+            'metrics': self.metrics,
+            'sparseInput': self.sparse_input,
+            # Recette canonique de chaque classe de sortie
+            **(self.classes or RecipeClasses.identity(self.recipes)).to_metadata(self.dedup_threshold),
         }
         
         # Sauvegarder dans le JSON
@@ -280,13 +332,13 @@ class GenerationModel:
         
         return model_id
     
-    def predict(self, user_features: List[float], top_k: int = 5) -> List[Dict[str, float]]:
+    def predict(self, user_features: Union[List[float], np.ndarray], top_k: int = 5) -> List[Dict[str, float]]:
         """Prédit les recettes recommandées pour génération"""
         if self.model is None:
             raise ValueError("Modèle non chargé")
         
-        # Prédire
-        X = np.array([user_features])
+        # Prédire (liste, ligne ndarray ou ligne CSR de features)
+        X = as_model_input(user_features, self.sparse_input)
         predictions = self.model.predict(X, verbose=0)[0]
         
         # Trier et prendre top K
@@ -294,12 +346,47 @@ class GenerationModel:
         
         results = []
         for idx in top_indices:
+            # Classe -> position de sa recette canonique dans le catalogue
+            position = self.class_positions[idx] if self.class_positions is not None else idx
+            if position < 0:
+                continue
             results.append({
-                'recipeId': int(idx),
+                'recipeId': int(position),
                 'score': float(predictions[idx])
             })
         
-        return results
+        return self.rerank(results, user_features)
+    
+    def rerank(
+        self,
+        results: List[Dict[str, float]],
+        user_features,
+        weight: Optional[float] = None
+    ) -> List[Dict[str, float]]:
+        """
+        Ajoute à chaque recette prédite sa correspondance avec la requête (`matchScore` :
+        part des features de la requête - ingrédients disponibles, type, cuisine, santé -
+        présentes dans la recette, lue dans la matrice précalculée du catalogue). L'ordre du
+        modèle est conservé, sauf si `weight` (RERANK_WEIGHT par défaut) est positif : les
+        recettes sont alors triées par score combiné (voir RERANK_WEIGHT)
+        """
+        matrix = self.feature_matrix
+        if matrix is None or not results or self.catalog is None or len(matrix) != len(self.catalog):
+            return results
+        
+        query = request_query(self.feature_extractor, user_features)
+        positions = np.array([r['recipeId'] for r in results], dtype=np.int64)
+        match = matrix.scores(query, positions) / max(np.count_nonzero(query), 1)
+        for result, value in zip(results, match):
+            result['matchScore'] = float(value)
+        
+        weight = RERANK_WEIGHT if weight is None else weight
+        if weight <= 0:
+            return results
+        best = max(max(r['score'] for r in results), 1e-12)
+        combined = [(1 - weight) * r['score'] / best + weight * m for r, m in zip(results, match)]
+        order = sorted(range(len(results)), key=lambda i: -combined[i])
+        return [results[i] for i in order]
     
     @classmethod
     def load_from_db(cls, model_version: str = 'latest') -> 'GenerationModel':
@@ -308,41 +395,40 @@ class GenerationModel:
         if result is None:
             raise ValueError("Modèle non trouvé")
         
-        # Désérialiser le modèle
+        # Désérialiser le modèle (archive lue directement depuis le stockage externe)
         import tempfile
         import os
-        import zipfile
-        import base64
-        
-        model_data_str = result['model_data']
-        
-        # Décoder depuis base64 si nécessaire
-        if isinstance(model_data_str, str):
-            try:
-                model_data = base64.b64decode(model_data_str)
-            except:
-                # Si ce n'est pas du base64, essayer directement
-                model_data = model_data_str.encode('latin-1') if isinstance(model_data_str, str) else model_data_str
-        else:
-            model_data = model_data_str
         
         with tempfile.TemporaryDirectory() as tmpdir:
-            zip_path = os.path.join(tmpdir, 'model.zip')
-            with open(zip_path, 'wb') as f:
-                f.write(model_data)
-            
             model_path = os.path.join(tmpdir, 'model')
-            with zipfile.ZipFile(zip_path, 'r') as zipf:
-                zipf.extractall(model_path)
+            extract_model_archive(result, model_path)
             
             # Charger le modèle
             instance = cls()
             instance.model = keras.models.load_model(model_path)
             
-            # Charger les recettes
-            instance.recipes = load_recipe_dataset()
-            instance.feature_extractor.build_vocabularies(instance.recipes)
-            instance.feature_extractor.calculate_dataset_stats(instance.recipes)
+            # Vocabulaires et statistiques enregistrés avec le modèle : identiques à ceux de
+            # l'entraînement, sans parcourir le catalogue
+            instance.catalog = load_recipe_catalog()
+            feature_extractor = FeatureExtractor.load_from_dir(model_path)
+            if feature_extractor is not None:
+                instance.feature_extractor = feature_extractor
+            else:
+                # Ancien modèle : vocabulaires reconstruits depuis le catalogue compilé
+                instance.feature_extractor.build_vocabularies_from_catalog(instance.catalog)
+                instance.feature_extractor.calculate_dataset_stats_from_catalog(instance.catalog)
+                input_shape = getattr(instance.model, 'input_shape', None)
+                if input_shape is not None and input_shape[1] != instance.feature_extractor.request_feature_size():
+                    raise ValueError("Le catalogue a changé depuis l'entraînement : vocabulaire incompatible avec le modèle, réentraîner")
+            instance.class_positions = class_positions(result.get('model_metadata'), instance.catalog)
+            # Matrice des features du catalogue pour cet extracteur (calculée une fois par
+            # version du catalogue, puis ouverte en mémoire partagée par les autres workers)
+            try:
+                instance.feature_matrix = get_recipe_feature_matrix(instance.catalog, instance.feature_extractor)
+            except Exception as e:
+                # Sans matrice, les prédictions restent dans l'ordre du modèle
+                print(f"⚠️  Matrice des features indisponible: {e}")
+            instance.sparse_input = bool((result.get('model_metadata') or {}).get('sparseInput', False))
         
         return instance
 
@@ -0,0 +1,258 @@
+"""
+Canonicalisation des ingrédients
+Un texte libre ("2 cups Tomatoes", "tomato", "Tomato ") est ramené à un nom canonique :
+minuscules sans accents, sans quantité ni unité en tête, dernier mot au singulier, puis
+table de synonymes ("scallion" -> "green onion"). Chaque nom canonique reçoit un id entier
+interné : le code en aval compare des entiers et des ensembles d'entiers au lieu de
+chaînes, et la normalisation n'est faite qu'une fois par texte.
+
+Un IngredientDictionary contient les noms canoniques, leurs ids et un trie pour la
+recherche par préfixe. Le dictionnaire d'un catalogue (RecipeCatalog.canonical_ingredients())
+attribue les ids dans l'ordre alphabétique : ils sont stables pour une version du catalogue.
+
+Variables d'environnement:
+    ML_CANONICAL_INGREDIENTS=1      vocabulaires des modèles sur les noms canoniques
+    ML_INGREDIENT_SYNONYMS=fichier  synonymes supplémentaires (JSON {"variante": "nom canonique"})
+"""
+
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Vocabulaires des modèles construits sur les noms canoniques (désactivé par défaut : change
+# les features, donc ne s'applique qu'aux modèles entraînés après activation)
+CANONICAL_INGREDIENTS = os.getenv('ML_CANONICAL_INGREDIENTS', '0').lower() in ('1', 'true', 'yes')
+SYNONYMS_FILE = os.getenv('ML_INGREDIENT_SYNONYMS')
+
+# Noms qui commencent par un nombre (jamais retiré) : "5 spice powder", "00 flour"
+_NUMBERED_NAME = r'(?:5\s*spice|7\s*up|00\s+flour|\d+\s*grain)\b'
+# Quantités et unités en tête : "2 cups of flour", "200g sugar", "1/2 tsp salt", "3 eggs".
+# Un nombre n'est retiré que suivi d'une unité ou d'un autre mot ("5-spice" reste intact)
+_QUANTITY = re.compile(
+    r'^(?:(?!' + _NUMBERED_NAME + r')\d+(?:[.,/]\d+)?'
+    r'(?:\s*(?:g|kg|mg|ml|cl|l|oz|lbs?|cups?|tbsp|tsp|tablespoons?|teaspoons?'
+    r'|pinch(?:es)?|cloves?|slices?|cans?)\b|\s+(?=[a-z0-9]))\s*(?:of\s+)?)+'
+)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Pluriels irréguliers (ou que les règles ci-dessous traiteraient mal)
+_IRREGULAR = {
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf',
+    'cookies': 'cookie', 'brownies': 'brownie', 'pies': 'pie', 'smoothies': 'smoothie',
+    'chilies': 'chili', 'chillies': 'chilli', 'quiches': 'quiche', 'brioches': 'brioche',
+}
+# Mots terminés par "s" qui ne sont pas des pluriels (en plus de -ss, -us, -is)
+_INVARIANT = frozenset(['molasses', 'grits'])
+
+# Variantes -> nom canonique (appliqué après normalisation et singulier)
+SYNONYMS: Dict[str, str] = {
+    'scallion': 'green onion',
+    'spring onion': 'green onion',
+    'garbanzo bean': 'chickpea',
+    'garbanzo': 'chickpea',
+    'chick pea': 'chickpea',
+    'cilantro': 'coriander',
+    'courgette': 'zucchini',
+    'aubergine': 'eggplant',
+    'capsicum': 'bell pepper',
+    'prawn': 'shrimp',
+    'maize': 'corn',
+    'icing sugar': 'powdered sugar',
+    'confectioners sugar': 'powdered sugar',
+    'rocket': 'arugula',
+    'plain flour': 'all purpose flour',
+    'bicarbonate of soda': 'baking soda',
+    'corn starch': 'cornstarch',
+    'cornflour': 'cornstarch',
+    'extra virgin olive oil': 'olive oil',
+}
+
+def _load_synonyms_file(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            extra = json.load(f)
+        for variant, canonical in extra.items():
+            SYNONYMS[normalize_text(variant)] = normalize_text(canonical)
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️  Synonymes d'ingrédients non chargés ({path}): {e}")
+
+def normalize_text(text: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces réduits (sans singulier ni synonymes)"""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+def singularize(word: str) -> str:
+    """Singulier d'un mot anglais courant dans les ingrédients (règles simples + exceptions)"""
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if len(word) <= 3 or word in _INVARIANT or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+@lru_cache(maxsize=1 << 16)
+def canonical_name(text: str) -> str:
+    """Nom canonique d'un ingrédient (texte libre)"""
+    text = str(text).lower().strip()
+    text = _QUANTITY.sub('', text)
+    words = normalize_text(text).split()
+    if not words:
+        return ''
+    words[-1] = singularize(words[-1])
+    name = ' '.join(words)
+    return SYNONYMS.get(name, name)
+
+class IngredientDictionary:
+    """Noms canoniques internés : nom <-> id entier, et trie pour la recherche par préfixe"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._trie: Dict[str, Any] = {}
+        for name in names:
+            self._intern_canonical(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _intern_canonical(self, name: str) -> int:
+        idx = self.ids.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.names.append(name)
+            self.ids[name] = idx
+            node = self._trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node[''] = idx
+        return idx
+
+    def intern(self, text: str) -> int:
+        """Id du nom canonique de `text` (ajouté au dictionnaire s'il est nouveau)"""
+        return self._intern_canonical(canonical_name(text))
+
+    def lookup(self, text: str) -> Optional[int]:
+        """Id du nom canonique de `text`, None s'il n'est pas dans le dictionnaire"""
+        return self.ids.get(canonical_name(text))
+
+    def id_set(self, texts: Iterable[str]) -> Set[int]:
+        """Ids des textes connus (les inconnus sont ignorés)"""
+        ids = (self.lookup(text) for text in texts)
+        return {idx for idx in ids if idx is not None}
+
+    def id_array(self, texts: Iterable[str]) -> np.ndarray:
+        """Ids des textes connus, triés et sans doublons (int32)"""
+        return np.array(sorted(self.id_set(texts)), dtype=np.int32)
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """Ids des noms canoniques qui commencent par `prefix` (ordre alphabétique)"""
+        node = self._trie
+        for char in normalize_text(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+
+        ids: List[int] = []
+        stack = [node]
+        while stack and (limit is None or len(ids) < limit):
+            node = stack.pop()
+            if '' in node:
+                ids.append(node[''])
+            stack.extend(node[char] for char in sorted((c for c in node if c), reverse=True))
+        return ids
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'names': self.names}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'IngredientDictionary':
+        return cls(state.get('names', []))
+
+class CatalogIngredients:
+    """
+    Ingrédients canoniques d'un catalogue : dictionnaire (ids dans l'ordre alphabétique)
+    et matrice CSR recette -> ids canoniques (triés, sans doublons)
+    """
+
+    def __init__(self, catalog):
+        raw_vocabulary = catalog.ingredient_vocabulary
+        canonical = [canonical_name(ing) for ing in raw_vocabulary]
+        self.dictionary = IngredientDictionary(sorted(set(canonical)))
+        # Id du vocabulaire brut du catalogue -> id canonique
+        self.raw_to_canonical = np.array([self.dictionary.ids[name] for name in canonical] or [0], dtype=np.int32)
+
+        indptr = np.asarray(catalog.ingredient_indptr, dtype=np.int64)
+        rows = np.repeat(np.arange(len(catalog)), np.diff(indptr))
+        ids = self.raw_to_canonical[np.asarray(catalog.ingredient_indices, dtype=np.int64)]
+        # Plusieurs variantes d'une recette peuvent avoir le même nom canonique
+        width = max(len(self.dictionary), 1)
+        keys = np.unique(rows * width + ids)
+        unique_rows = keys // width
+        self.indices = (keys % width).astype(np.int32)
+        self.indptr = np.zeros(len(catalog) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(unique_rows, minlength=len(catalog)), out=self.indptr[1:])
+        self._suffixes = None
+
+    def recipe_ids(self, i: int) -> np.ndarray:
+        """Ids canoniques des ingrédients de la recette `i`"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def _word_suffixes(self):
+        """
+        Fins de noms à partir d'un début de mot ("cherry tomato" -> "cherry tomato", "tomato")
+        et id des noms de chaque fin : construit une fois par catalogue
+        """
+        if self._suffixes is None:
+            owners: Dict[str, List[int]] = {}
+            for idx, name in enumerate(self.dictionary.names):
+                words = name.split()
+                for start in range(len(words)):
+                    owners.setdefault(' '.join(words[start:]), []).append(idx)
+            suffixes = IngredientDictionary(sorted(owners))
+            self._suffixes = (suffixes, [owners[name] for name in suffixes.names])
+        return self._suffixes
+
+    def matching_ids(self, texts: Iterable[str]) -> Set[int]:
+        """
+        Ids des ingrédients du catalogue couverts par `texts` : même nom canonique, nom qui
+        contient le texte à partir d'un début de mot ("tomato" -> "cherry tomato", recherche
+        par préfixe dans le trie des fins de noms), ou nom contenu dans le texte
+        ("chicken breast" -> "chicken")
+        """
+        suffixes, owners = self._word_suffixes()
+        ids: Set[int] = set()
+        for text in texts:
+            name = canonical_name(text)
+            if not name:
+                continue
+            for suffix in suffixes.prefix(name):
+                ids.update(owners[suffix])
+            words = name.split()
+            for start in range(len(words)):
+                for end in range(start + 1, len(words) + 1):
+                    idx = self.dictionary.ids.get(' '.join(words[start:end]))
+                    if idx is not None:
+                        ids.add(idx)
+        return ids
+
+    def missing(self, ingredients: Iterable[str], available: Iterable[str]) -> List[str]:
+        """Ingrédients de `ingredients` non couverts par `available` (voir matching_ids)"""
+        covered = self.matching_ids(available)
+        return [ing for ing in ingredients if self.dictionary.lookup(ing) not in covered]
+
+_load_synonyms_file(SYNONYMS_FILE)
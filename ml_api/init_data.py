@@ -1,76 +1,223 @@
 """
 Script pour initialiser le fichier data.json avec les recettes du dataset
+
+Ingestion en flux : le dataset (tableau JSON, objet {"recipes": [...]} ou NDJSON, une
+recette par ligne) est lu recette par recette, sans être chargé en entier en mémoire.
+Chaque recette est fusionnée par id avec le catalogue existant en comparant un hash de
+son contenu : seules les recettes nouvelles ou modifiées sont sérialisées, les autres
+(et les profils, interactions et modèles) sont recopiées octet pour octet dans data.json.
+Comme l'ancien script (qui remplaçait toute la liste), les recettes absentes du dataset
+sont supprimées, sauf avec --keep-missing. Un id présent plusieurs fois dans data.json
+n'y est gardé qu'une fois (première occurrence). Si rien n'a changé, data.json n'est
+pas réécrit.
+
+Usage:
+    python init_data.py                                # data/recipes_dataset.json
+    python init_data.py recettes.ndjson                # autre fichier
+    python init_data.py recettes.json --keep-missing   # garder les recettes absentes du fichier
 """
 
+import hashlib
 import json
+import mmap
+import re
+import sys
+import tempfile
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+from database import DATA_FILE, ensure_data_file, write_lock, rewrite_section, catalog_version
+from json_sections import JsonSections, iter_decoded
+
+DEFAULT_DATASET = Path(__file__).parent.parent / 'data' / 'recipes_dataset.json'
 
-def init_data_from_dataset():
-    """Initialise data.json avec les recettes du dataset"""
-    # Chemin vers le dataset
-    dataset_path = Path(__file__).parent.parent / 'data' / 'recipes_dataset.json'
-    data_path = Path(__file__).parent / 'data.json'
+# Formats reconnus sans parcourir le fichier : {"recipes": [...]} et tableau JSON
+_RECIPES_WRAPPER = re.compile(rb'\s*\{\s*"recipes"\s*:\s*\[')
+_ARRAY_START = re.compile(rb'\s*\[')
+_CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+def normalize_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise les noms de champs pour correspondre à la structure attendue"""
+    return {
+        'id': recipe.get('id'),
+        'name': recipe.get('name'),
+        'description': recipe.get('description', ''),
+        'ingredients': recipe.get('ingredients', []),
+        'steps': recipe.get('steps', []),
+        'prep_time': recipe.get('prepTime', recipe.get('prep_time', 15)),
+        'cook_time': recipe.get('cookTime', recipe.get('cook_time', 30)),
+        'servings': recipe.get('servings', 4),
+        'calories': recipe.get('calories', 300),
+        'estimated_price': recipe.get('estimatedPrice', recipe.get('estimated_price', 10.0)),
+        'cuisine_type': recipe.get('cuisine', recipe.get('cuisine_type', 'Other')),
+        'recipe_type': recipe.get('recipeType', recipe.get('recipe_type', 'savory')),
+        'is_healthy': recipe.get('isHealthy', recipe.get('is_healthy', False)),
+        'difficulty_level': recipe.get('difficulty', recipe.get('difficulty_level', 'medium')),
+        'tags': recipe.get('tags', [])
+    }
+
+def recipe_hash(recipe: Dict[str, Any]) -> bytes:
+    """Hash du contenu d'une recette (indépendant de l'ordre des clés et de la mise en forme)"""
+    return hashlib.sha1(_CANONICAL_ENCODER.encode(recipe).encode('utf-8')).digest()
+
+def iter_dataset_recipes(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Recettes brutes du dataset, une par une (mémoire bornée : le fichier est projeté
+    en mémoire et décodé par fenêtres, voir json_sections.iter_decoded).
+    Formats acceptés : tableau JSON, objet {"recipes": [...]}, NDJSON / suite d'objets.
+    """
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
     
-    if not dataset_path.exists():
-        print(f"⚠️  Dataset non trouvé: {dataset_path}")
-        return
+    try:
+        wrapper = _RECIPES_WRAPPER.match(buf)
+        if wrapper is not None:
+            values = iter_decoded(buf, wrapper.end() - 1, array=True)
+        elif _ARRAY_START.match(buf):
+            values = iter_decoded(buf, 0, array=True)
+        else:
+            values = iter_decoded(buf)
+            first = next(values, None)
+            second = next(values, None)
+            if first is None:
+                return
+            if second is None:
+                # Un seul objet : conteneur dont 'recipes' n'est pas la première clé, ou recette isolée
+                recipes = first[2].get('recipes') if isinstance(first[2], dict) else None
+                yield from (recipes if isinstance(recipes, list) else [first[2]])
+                return
+            # NDJSON : une recette par valeur
+            yield first[2]
+            yield second[2]
+        
+        for _, _, recipe in values:
+            yield recipe
+    finally:
+        buf.close()
+
+def _render_recipe(recipe: Dict[str, Any]) -> bytes:
+    """Sérialise une recette avec la mise en forme de save_data() (indent=2, profondeur 2)"""
+    return json.dumps(recipe, indent=2, ensure_ascii=False).replace('\n', '\n    ').encode('utf-8')
+
+def ingest_recipes(dataset_path: Path, prune: bool = True) -> Optional[Dict[str, int]]:
+    """
+    Fusionne les recettes du dataset dans data.json (upsert par id, en flux)
     
-    # Charger le dataset
-    with open(dataset_path, 'r', encoding='utf-8') as f:
-        dataset = json.load(f)
+    Args:
+        dataset_path: Fichier JSON ou NDJSON des recettes
+        prune: Supprimer les recettes de data.json absentes du dataset (remplacement
+            complet, comme l'ancien script) ; False pour les garder
     
-    # Créer la structure de données
-    recipes = dataset.get('recipes', [])
+    Returns:
+        {'inserted', 'updated', 'unchanged', 'deleted', 'skipped', 'duplicates'} ou None si
+        le dataset est absent ('duplicates' : doublons d'id retirés de data.json)
+    """
+    if not dataset_path.exists():
+        print(f"⚠️  Dataset non trouvé: {dataset_path}")
+        return None
     
-    # Normaliser les noms de champs pour correspondre à la structure attendue
-    normalized_recipes = []
-    for recipe in recipes:
-        normalized = {
-            'id': recipe.get('id'),
-            'name': recipe.get('name'),
-            'description': recipe.get('description', ''),
-            'ingredients': recipe.get('ingredients', []),
-            'steps': recipe.get('steps', []),
-            'prep_time': recipe.get('prepTime', recipe.get('prep_time', 15)),
-            'cook_time': recipe.get('cookTime', recipe.get('cook_time', 30)),
-            'servings': recipe.get('servings', 4),
-            'calories': recipe.get('calories', 300),
-            'estimated_price': recipe.get('estimatedPrice', recipe.get('estimated_price', 10.0)),
-            'cuisine_type': recipe.get('cuisine', recipe.get('cuisine_type', 'Other')),
-            'recipe_type': recipe.get('recipeType', recipe.get('recipe_type', 'savory')),
-            'is_healthy': recipe.get('isHealthy', recipe.get('is_healthy', False)),
-            'difficulty_level': recipe.get('difficulty', recipe.get('difficulty_level', 'medium')),
-            'tags': recipe.get('tags', [])
-        }
-        normalized_recipes.append(normalized)
+    ensure_data_file()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'skipped': 0, 'duplicates': 0}
     
-    # Charger les données existantes pour préserver les utilisateurs et modèles
-    if data_path.exists():
-        with open(data_path, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
-    else:
-        existing_data = {
-            'user_profiles': [],
-            'interactions': [],
-            'ml_models': []
-        }
+    # Recettes à écrire, sérialisées dans un fichier temporaire : id -> (position, taille)
+    with write_lock(), tempfile.TemporaryFile() as spool:
+        # 1. Index du catalogue existant : id -> hash du contenu, et bornes de chaque recette
+        view = JsonSections(DATA_FILE)
+        try:
+            existing: Dict[Any, bytes] = {}
+            existing_spans = []
+            for item_start, item_end, recipe in view.iter_decoded('recipes'):
+                recipe_id = recipe.get('id')
+                if recipe_id in existing:
+                    # Doublon d'id : seule la première occurrence est gardée (et comparée)
+                    counts['duplicates'] += 1
+                    continue
+                existing[recipe_id] = recipe_hash(recipe)
+                existing_spans.append((recipe_id, item_start, item_end))
+            
+            # 2. Lecture du dataset en flux : seules les recettes nouvelles ou modifiées sont gardées
+            updates: Dict[Any, tuple] = {}
+            inserts: Dict[Any, tuple] = {}
+            seen = set()
+            for raw in iter_dataset_recipes(dataset_path):
+                recipe = normalize_recipe(raw)
+                recipe_id = recipe['id']
+                if recipe_id is None:
+                    counts['skipped'] += 1
+                    continue
+                seen.add(recipe_id)
+                
+                current = existing.get(recipe_id)
+                if current is not None and current == recipe_hash(recipe):
+                    # Une version modifiée vue plus tôt dans le dataset est annulée
+                    updates.pop(recipe_id, None)
+                    continue
+                
+                payload = _render_recipe(recipe)
+                position = spool.seek(0, 2)
+                spool.write(payload)
+                (updates if recipe_id in existing else inserts)[recipe_id] = (position, len(payload))
+            
+            deleted = {recipe_id for recipe_id in existing if recipe_id not in seen} if prune else set()
+            counts['inserted'] = len(inserts)
+            counts['updated'] = len(updates)
+            counts['deleted'] = len(deleted)
+            counts['unchanged'] = len(seen) - len(inserts) - len(updates)
+            
+            # 3. Réécriture de la seule section 'recipes' (rien à faire si aucun changement)
+            if inserts or updates or deleted or counts['duplicates']:
+                def read_spooled(entry):
+                    spool.seek(entry[0])
+                    return spool.read(entry[1])
+                
+                def write_recipes(current_view: JsonSections, f) -> None:
+                    f.write(b'[')
+                    first = True
+                    for recipe_id, item_start, item_end in existing_spans:
+                        if recipe_id in deleted:
+                            continue
+                        f.write(b'\n    ' if first else b',\n    ')
+                        first = False
+                        if recipe_id in updates:
+                            f.write(read_spooled(updates[recipe_id]))
+                        else:
+                            f.write(current_view.slice(item_start, item_end))
+                    for entry in inserts.values():
+                        f.write(b'\n    ' if first else b',\n    ')
+                        first = False
+                        f.write(read_spooled(entry))
+                    f.write(b']' if first else b'\n  ]')
+                
+                # La vue a été ouverte sous le verrou : les bornes relevées sont toujours valides
+                rewrite_section('recipes', write_recipes, view=view)
+        finally:
+            view.close()
     
-    # Créer la structure complète en préservant les données existantes
-    data = {
-        'recipes': normalized_recipes,
-        'user_profiles': existing_data.get('user_profiles', []),
-        'interactions': existing_data.get('interactions', []),
-        'ml_models': existing_data.get('ml_models', [])
-    }
+    return counts
+
+def init_data_from_dataset(dataset_path: Path = DEFAULT_DATASET, prune: bool = True):
+    """Initialise (ou met à jour) data.json avec les recettes du dataset"""
+    counts = ingest_recipes(Path(dataset_path), prune=prune)
+    if counts is None:
+        return None
     
-    # Sauvegarder
-    with open(data_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"✅ Recettes fusionnées dans {DATA_FILE}: {counts['inserted']} ajoutées, "
+          f"{counts['updated']} modifiées, {counts['unchanged']} inchangées, {counts['deleted']} supprimées")
+    if counts['skipped']:
+        print(f"⚠️  {counts['skipped']} recettes sans id ignorées")
+    if counts['duplicates']:
+        print(f"⚠️  {counts['duplicates']} doublons d'id retirés de data.json")
     
-    print(f"✅ {len(normalized_recipes)} recettes chargées dans {data_path}")
-    print(f"✅ {len(data['user_profiles'])} utilisateurs préservés")
-    print(f"✅ {len(data['ml_models'])} modèles préservés")
+    # La version du catalogue est le hash des recettes : elle ne change que si une recette a
+    # changé, et les caches dérivés (catalogue compilé, vocabulaires, index) sont alors
+    # reconstruits au prochain accès
+    if counts['inserted'] or counts['updated'] or counts['deleted'] or counts['duplicates']:
+        print(f"✅ Nouvelle version du catalogue: {catalog_version()[:12]}")
+    else:
+        print("✅ Catalogue inchangé, data.json n'a pas été réécrit")
+    return counts
 
 if __name__ == '__main__':
-    init_data_from_dataset()
-
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    init_data_from_dataset(Path(args[0]) if args else DEFAULT_DATASET, prune='--keep-missing' not in sys.argv)
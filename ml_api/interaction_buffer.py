@@ -0,0 +1,224 @@
+"""
+Tampon en mémoire des interactions utilisateur (view, like, dislike, save, generate)
+Les événements reçus par /api/ml/interactions sont mis en file, puis un thread
+d'arrière-plan les écrit par groupes (toutes les ML_INTERACTIONS_FLUSH_MS ms ou dès
+ML_INTERACTIONS_FLUSH_EVENTS événements) : une seule écriture par lot au lieu d'une par clic.
+
+La file est bornée (ML_INTERACTIONS_MAX_PENDING) : quand elle est pleine, submit()
+lève BufferFullError et l'API répond 429 (le client doit réessayer plus tard).
+Un lot dont l'écriture échoue est remis en tête de file et réessayé.
+Les événements en attente sont écrits à l'arrêt du processus (atexit), avec de nouvelles
+tentatives jusqu'au délai de close() ; ceux qui restent sont comptés et signalés.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable
+
+from database import append_interactions
+
+# Délai maximal avant l'écriture d'un événement
+FLUSH_INTERVAL_MS = int(os.getenv('ML_INTERACTIONS_FLUSH_MS', 200))
+# Taille de lot qui déclenche une écriture immédiate
+FLUSH_MAX_EVENTS = int(os.getenv('ML_INTERACTIONS_FLUSH_EVENTS', 500))
+# Nombre maximal d'événements en attente d'écriture
+MAX_PENDING = int(os.getenv('ML_INTERACTIONS_MAX_PENDING', 50000))
+
+class BufferFullError(Exception):
+    """La file d'interactions est pleine : l'appelant doit réessayer plus tard"""
+
+class InteractionBuffer:
+    """File bornée d'interactions, écrite par lots par un thread d'arrière-plan"""
+
+    def __init__(
+        self,
+        writer: Callable[[List[Dict[str, Any]]], Any] = append_interactions,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        flush_max_events: int = FLUSH_MAX_EVENTS,
+        max_pending: int = MAX_PENDING
+    ):
+        self.writer = writer
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_max_events = flush_max_events
+        self.max_pending = max_pending
+
+        self._queue: deque = deque()
+        self._in_flight = 0  # Événements retirés de la file mais pas encore écrits
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._close_deadline = 0.0
+        self._flush_waiters = 0  # Appels à flush() en cours : lot partiel écrit sans attendre
+
+        self.stats = {'accepted': 0, 'rejected': 0, 'written': 0, 'batches': 0, 'errors': 0, 'dropped': 0}
+        self.last_error: Optional[str] = None
+
+    def pending(self) -> int:
+        """Nombre d'événements pas encore écrits"""
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def submit(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Met des événements en file (tout ou rien).
+        Lève BufferFullError si la file n'a pas la place pour tout le lot.
+        """
+        if not events:
+            return 0
+
+        with self._cond:
+            if self._closed:
+                raise BufferFullError("Le tampon d'interactions est fermé")
+            if len(self._queue) + self._in_flight + len(events) > self.max_pending:
+                self.stats['rejected'] += len(events)
+                raise BufferFullError(
+                    f"File d'interactions pleine ({self.max_pending} événements en attente)"
+                )
+
+            self._queue.extend(events)
+            self.stats['accepted'] += len(events)
+
+            # Thread démarré au premier événement (après un éventuel fork des workers)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='interaction-flusher', daemon=True)
+                self._thread.start()
+
+            if len(self._queue) >= self.flush_max_events:
+                self._cond.notify_all()
+
+        return len(events)
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Attend qu'un lot soit prêt (taille ou délai atteint) et le retire de la file"""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+
+            # Laisser le lot se remplir jusqu'au délai maximal du plus ancien événement
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.flush_max_events and not self._closed and not self._flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = list(self._queue)
+            self._queue.clear()
+            self._in_flight = len(batch)
+            return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """Écrit un lot retiré de la file ; en cas d'échec, le remet en tête de file"""
+        try:
+            self.writer(batch)
+        except Exception as e:
+            print(f"❌ Erreur lors de l'écriture de {len(batch)} interactions: {e}")
+            with self._cond:
+                self._queue.extendleft(reversed(batch))
+                self._in_flight = 0
+                self.stats['errors'] += 1
+                self.last_error = str(e)
+                self._cond.notify_all()
+            return False
+
+        with self._cond:
+            self._in_flight = 0
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+            self._cond.notify_all()
+        return True
+
+    def _retry_pause(self) -> Optional[float]:
+        """Pause avant de réessayer un lot, None si le délai de fermeture est dépassé"""
+        pause = min(5.0, self.flush_interval * 10)
+        if self._closed:
+            remaining = self._close_deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # À l'arrêt : tentatives rapprochées jusqu'au délai de close()
+            pause = min(pause, 0.5, remaining)
+        return pause
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._closed:
+                    return
+                continue
+
+            if not self._write(batch):
+                pause = self._retry_pause()
+                if pause is None:
+                    return
+                time.sleep(pause)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Force l'écriture des événements en attente. Retourne False si le délai expire."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                return not self._queue
+            # Un lot partiel est écrit tout de suite
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Écrit les événements restants (nouvelles tentatives pendant `timeout` secondes en
+        cas d'échec) et arrête le thread. Les événements qui n'ont pas pu être écrits sont
+        comptés dans stats['dropped'] et signalés.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._close_deadline = time.monotonic() + timeout
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        else:
+            # Thread absent (ex: après un fork) : écriture directe
+            while True:
+                with self._cond:
+                    batch = list(self._queue)
+                    self._queue.clear()
+                    self._in_flight = len(batch)
+                if not batch or self._write(batch):
+                    break
+                pause = self._retry_pause()
+                if pause is None:
+                    break
+                time.sleep(pause)
+
+        with self._cond:
+            dropped = len(self._queue) + self._in_flight
+            self.stats['dropped'] += dropped
+        if dropped:
+            print(f"❌ {dropped} interactions perdues à l'arrêt (non écrites après {timeout}s): {self.last_error}")
+
+_buffer: Optional[InteractionBuffer] = None
+_buffer_lock = threading.Lock()
+
+def get_interaction_buffer() -> InteractionBuffer:
+    """Tampon partagé du processus (créé au premier appel, vidé à l'arrêt)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = InteractionBuffer()
+                atexit.register(_buffer.close)
+    return _buffer
@@ -0,0 +1,259 @@
+"""
+Lecture partielle d'un fichier JSON par sections de premier niveau
+Le fichier est projeté en mémoire (mmap) et parcouru octet par octet pour repérer
+les bornes de chaque clé de premier niveau ('recipes', 'user_profiles', 'ml_models', ...).
+Seule la section demandée est ensuite décodée : les autres (archives de modèles
+en base64, etc.) sont sautées sans être construites en objets Python.
+"""
+
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+# Chaîne JSON complète (boucle déroulée : rapide sur les longues chaînes base64)
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+# Suite de caractères hors délimiteurs et de chaînes complètes, sautée en un seul appel :
+# parcourir un objet/tableau ne coûte qu'une itération Python par délimiteur
+_NON_STRUCTURE = re.compile(rb'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+_SCALAR_END = re.compile(rb'[,}\] \t\n\r]')
+_TEXT_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITERS = frozenset(',]} \t\n\r')
+_DECODER = json.JSONDecoder()
+# Taille (en octets) des fenêtres de texte décodées par iter_decoded()
+_WINDOW = 1 << 22
+
+_OPEN = (ord('{'), ord('['))
+_CLOSE = (ord('}'), ord(']'))
+
+def _skip_whitespace(buf, pos: int) -> int:
+    return _WHITESPACE.match(buf, pos).end()
+
+def skip_value(buf, pos: int) -> int:
+    """Retourne la position juste après la valeur JSON qui commence à `pos` (sans la décoder)"""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        match = _STRING.match(buf, pos)
+        if match is None:
+            raise ValueError(f"Chaîne JSON non terminée à l'octet {pos}")
+        return match.end()
+
+    if first in (b'{', b'['):
+        depth = 0
+        start = pos
+        size = len(buf)
+        while pos < size:
+            token = buf[pos]
+            if token in _OPEN:
+                depth += 1
+            elif token in _CLOSE:
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            else:
+                # Guillemet non suivi d'une chaîne complète
+                break
+            pos = _NON_STRUCTURE.match(buf, pos + 1).end()
+        raise ValueError(f"JSON tronqué (valeur ouverte à l'octet {start})")
+
+    # Nombre, true, false, null
+    match = _SCALAR_END.search(buf, pos)
+    return match.start() if match else len(buf)
+
+def index_sections(buf) -> Dict[str, Tuple[int, int]]:
+    """Repère les bornes (début, fin) en octets de chaque valeur de premier niveau"""
+    sections: Dict[str, Tuple[int, int]] = {}
+    if len(buf) == 0:
+        return sections
+
+    pos = _skip_whitespace(buf, 0)
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError("Le fichier JSON doit contenir un objet à la racine")
+    pos += 1
+
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b'}':
+            return sections
+
+        match = _STRING.match(buf, pos)
+        if match is None:
+            raise ValueError(f"Clé JSON attendue à l'octet {pos}")
+        key = json.loads(match.group())
+
+        pos = _skip_whitespace(buf, match.end())
+        if buf[pos:pos + 1] != b':':
+            raise ValueError(f"':' attendu à l'octet {pos}")
+        pos = _skip_whitespace(buf, pos + 1)
+
+        end = skip_value(buf, pos)
+        sections[key] = (pos, end)
+
+        pos = _skip_whitespace(buf, end)
+        separator = buf[pos:pos + 1]
+        if separator == b',':
+            pos += 1
+        elif separator == b'}':
+            return sections
+        else:
+            raise ValueError(f"',' ou '}}' attendu à l'octet {pos}")
+
+def iter_array(buf, pos: int) -> Iterator[Tuple[int, int]]:
+    """Bornes (début, fin) de chaque élément du tableau JSON qui commence à `pos`, sans les décoder"""
+    pos = _skip_whitespace(buf, pos)
+    if buf[pos:pos + 1] != b'[':
+        raise ValueError(f"Tableau JSON attendu à l'octet {pos}")
+    pos += 1
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b']':
+            return
+        if pos >= len(buf):
+            raise ValueError("JSON tronqué (tableau non terminé)")
+        end = skip_value(buf, pos)
+        yield pos, end
+        pos = _skip_whitespace(buf, end)
+        if buf[pos:pos + 1] == b',':
+            pos += 1
+
+def _text_window(buf, start: int, length: int) -> Tuple[str, int]:
+    """Décode buf[start:start+length] en texte, sans couper un caractère UTF-8 (texte, fin en octets)"""
+    end = min(len(buf), start + length)
+    while end < len(buf) and (buf[end] & 0xC0) == 0x80:
+        end += 1
+    return buf[start:end].decode('utf-8'), end
+
+def iter_decoded(buf, pos: int = 0, array: bool = False) -> Iterator[Tuple[int, int, Any]]:
+    """
+    Décode une à une les valeurs d'un tableau JSON (array=True, `pos` sur le '[') ou d'une
+    suite de valeurs séparées par des blancs (NDJSON), avec leurs bornes (début, fin) en octets.
+    Le buffer est converti en texte par fenêtres (mémoire bornée) et chaque valeur est lue
+    par le décodeur C du module json : pas de parcours octet par octet en Python.
+    """
+    size = len(buf)
+    pos = _skip_whitespace(buf, pos)
+    if array:
+        if buf[pos:pos + 1] != b'[':
+            raise ValueError(f"Tableau JSON attendu à l'octet {pos}")
+        pos += 1
+
+    window = _WINDOW
+    text, text_end = _text_window(buf, pos, window)
+    # Correspondance caractère -> octet, avancée au fil de la fenêtre
+    char_mark, byte_mark = 0, pos
+    is_ascii = text.isascii()
+    i = 0
+
+    def byte_offset(index: int) -> int:
+        nonlocal char_mark, byte_mark
+        if is_ascii:
+            return pos + index
+        byte_mark += len(text[char_mark:index].encode('utf-8'))
+        char_mark = index
+        return byte_mark
+
+    while True:
+        i = _TEXT_WHITESPACE.match(text, i).end()
+        at_eof = text_end >= size
+        if i < len(text) and array and text[i] == ',':
+            i += 1
+            continue
+        if i < len(text) and array and text[i] == ']':
+            return
+
+        complete = False
+        if i < len(text):
+            try:
+                value, end = _DECODER.raw_decode(text, i)
+                # Un nombre coupé par la fin de la fenêtre ("-25" pour "-2500.0") se décode :
+                # la valeur n'est complète que si un délimiteur la suit dans la fenêtre
+                # (ou, en NDJSON seulement, si elle termine le fichier)
+                complete = (end < len(text) and text[end] in _DELIMITERS) or (at_eof and not array and end == len(text))
+                if not complete and at_eof:
+                    raise ValueError(f"JSON invalide ou tronqué à l'octet {byte_offset(end)}")
+            except json.JSONDecodeError as e:
+                if at_eof:
+                    raise ValueError(f"JSON invalide à l'octet {byte_offset(i)}: {e.msg}") from e
+        elif at_eof:
+            if array:
+                raise ValueError("JSON tronqué (tableau non terminé)")
+            return
+
+        if not complete:
+            # Recharger une fenêtre à partir de la valeur en cours (plus grande si elle ne tient pas)
+            start = byte_offset(i)
+            if i == 0:
+                window *= 2
+            pos = start
+            text, text_end = _text_window(buf, pos, window)
+            char_mark, byte_mark = 0, pos
+            is_ascii = text.isascii()
+            i = 0
+            continue
+
+        yield byte_offset(i), byte_offset(end), value
+        i = end
+
+class JsonSections:
+    """
+    Vue en lecture seule d'un fichier JSON, décodée section par section.
+    Le fichier est ouvert une seule fois : si il est remplacé (os.replace), cette vue
+    continue de lire l'ancienne version de façon cohérente.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        st = os.fstat(self._file.fileno())
+        # Même signature que database._file_signature()
+        self.signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if st.st_size > 0:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buf = b''
+        self.sections = index_sections(self._buf)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def raw(self, name: str) -> Optional[bytes]:
+        """Octets bruts de la section `name` (None si absente)"""
+        span = self.sections.get(name)
+        if span is None:
+            return None
+        return self._buf[span[0]:span[1]]
+
+    def load(self, name: str, default: Any = None) -> Any:
+        """Décode uniquement la section `name`"""
+        raw = self.raw(name)
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def iter_items(self, name: str) -> Iterator[Tuple[int, int]]:
+        """Bornes (début, fin) de chaque élément du tableau `name`, sans les décoder"""
+        span = self.sections.get(name)
+        if span is None:
+            return
+        if self._buf[span[0]:span[0] + 1] != b'[':
+            raise ValueError(f"La section '{name}' n'est pas un tableau")
+        yield from iter_array(self._buf, span[0])
+
+    def iter_decoded(self, name: str) -> Iterator[Tuple[int, int, Any]]:
+        """(début, fin, valeur décodée) de chaque élément du tableau `name`"""
+        span = self.sections.get(name)
+        if span is None:
+            return
+        yield from iter_decoded(self._buf, span[0], array=True)
+
+    def slice(self, start: int, end: int) -> bytes:
+        """Octets bruts entre deux positions du fichier"""
+        return self._buf[start:end]
+
+    def close(self) -> None:
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._file.close()
@@ -0,0 +1,248 @@
+"""
+Politique de rétention des versions de modèles ML et nettoyage des archives
+Pour chaque model_name, on conserve :
+- la version active
+- les N versions les plus récentes (ML_MODEL_KEEP_RECENT, 3 par défaut)
+- les K meilleures versions selon une métrique d'entraînement (ML_MODEL_KEEP_BEST, 1 par défaut)
+- les versions enregistrées depuis moins de BLOB_GRACE_SECONDS (un entraînement peut être
+  entre l'enregistrement et l'activation de sa version)
+Les autres versions sont retirées du registre, puis les archives models/<sha256>.zip
+qui ne sont plus référencées sont supprimées.
+
+Usage : python model_gc.py [keep_recent] [keep_best] [--dry-run]
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Set
+
+import database
+import model_registry
+from database import MODELS_DIR
+
+KEEP_RECENT = int(os.getenv('ML_MODEL_KEEP_RECENT', 3))
+KEEP_BEST = int(os.getenv('ML_MODEL_KEEP_BEST', 1))
+# Âge minimal d'une archive non référencée, ou d'une version, avant suppression : une archive
+# est écrite avant d'être enregistrée, et une version enregistrée avant d'être activée ;
+# un entraînement en cours ne doit perdre ni l'une ni l'autre
+BLOB_GRACE_SECONDS = int(os.getenv('ML_MODEL_BLOB_GRACE_SECONDS', 600))
+
+# Métrique de référence de chaque modèle (voir les métriques retournées par train())
+DEFAULT_METRICS = {
+    'recipe_classification': 'accuracy',
+    'recipe_generation': 'recipeAccuracy',
+}
+# Métriques pour lesquelles une valeur plus faible est meilleure
+LOWER_IS_BETTER = {'loss', 'priceMAE'}
+
+def _metric_value(model: Dict[str, Any], metric: str) -> Optional[float]:
+    """Valeur d'une métrique enregistrée dans les métadonnées d'un modèle (None si absente)"""
+    metadata = model.get('model_metadata') or {}
+    value = (metadata.get('metrics') or {}).get(metric, metadata.get(metric))
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _created_timestamp(model: Dict[str, Any]) -> Optional[float]:
+    """
+    Date d'enregistrement d'une version (timestamp), ou à défaut date de son archive ;
+    None si aucune n'est connue (anciennes versions sans created_at ni archive)
+    """
+    created_at = model.get('created_at')
+    if created_at:
+        try:
+            # Format de CURRENT_TIMESTAMP (SQLite) et du registre JSON, en UTC
+            created = datetime.fromisoformat(str(created_at))
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=timezone.utc)
+            return created.timestamp()
+        except ValueError:
+            pass
+    blob_path = database.model_blob_path(model)
+    try:
+        return blob_path.stat().st_mtime if blob_path is not None else None
+    except FileNotFoundError:
+        return None
+
+def select_retained(
+    models: List[Dict[str, Any]],
+    keep_recent: int = KEEP_RECENT,
+    keep_best: int = KEEP_BEST,
+    metric: Optional[str] = None,
+    now: Optional[float] = None
+) -> Set[int]:
+    """
+    Retourne les IDs des versions à conserver selon la politique de rétention.
+    keep_recent vaut au moins 1 : la dernière version enregistrée n'est jamais supprimée.
+    """
+    keep_recent = max(keep_recent, 1)
+    now = time.time() if now is None else now
+
+    by_name: Dict[str, List[Dict[str, Any]]] = {}
+    for model in models:
+        by_name.setdefault(model.get('model_name'), []).append(model)
+
+    retained = set()
+    for model_name, versions in by_name.items():
+        # Version active
+        retained.update(v.get('id') for v in versions if v.get('is_active', False))
+
+        # Versions les plus récentes
+        recent = sorted(versions, key=lambda v: v.get('id', 0), reverse=True)
+        retained.update(v.get('id') for v in recent[:keep_recent])
+
+        # Versions trop récentes pour être supprimées (pas encore activées)
+        for v in versions:
+            created = _created_timestamp(v)
+            if created is not None and now - created < BLOB_GRACE_SECONDS:
+                retained.add(v.get('id'))
+
+        # Meilleures versions selon la métrique
+        model_metric = metric or DEFAULT_METRICS.get(model_name)
+        if model_metric and keep_best > 0:
+            scored = [(v, _metric_value(v, model_metric)) for v in versions]
+            scored = [(v, value) for v, value in scored if value is not None]
+            scored.sort(key=lambda item: item[1], reverse=model_metric not in LOWER_IS_BETTER)
+            retained.update(v.get('id') for v, _ in scored[:keep_best])
+
+    return retained
+
+def _list_models() -> List[Dict[str, Any]]:
+    backend = database._sqlite_backend()
+    if backend is not None:
+        return backend.list_models()
+    return model_registry.list_models()
+
+def _delete_models(model_ids: List[int]) -> int:
+    backend = database._sqlite_backend()
+    if backend is not None:
+        return backend.delete_models(model_ids)
+    return model_registry.delete_models(model_ids)
+
+def _referenced_blobs() -> Set[str]:
+    """Hashes des archives référencées par le registre JSON et par la base SQLite (si présente)"""
+    referenced = set()
+    if model_registry.REGISTRY_FILE.exists():
+        with open(model_registry.REGISTRY_FILE, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+        referenced.update(m.get('model_sha256') for m in registry.get('models', []))
+
+    import sqlite_backend
+    if sqlite_backend.SQLITE_FILE.exists():
+        referenced.update(m.get('model_sha256') for m in sqlite_backend.list_models())
+
+    referenced.discard(None)
+    return referenced
+
+def _metadata_stats() -> Dict[str, Any]:
+    """Taille et temps de chargement à froid des métadonnées des modèles"""
+    start = time.perf_counter()
+    backend = database._sqlite_backend()
+    if backend is not None:
+        backend.list_models()
+        size = backend.SQLITE_FILE.stat().st_size
+    else:
+        with open(model_registry.REGISTRY_FILE, 'rb') as f:
+            raw = f.read()
+        json.loads(raw)
+        size = len(raw)
+    return {'bytes': size, 'loadMs': (time.perf_counter() - start) * 1000}
+
+def _sweep_blobs(dry_run: bool = False, dropped: Set[str] = frozenset()) -> Dict[str, int]:
+    """
+    Supprime les archives (et fichiers temporaires abandonnés) qui ne sont plus référencés.
+    dropped: hashes à considérer comme déréférencés (simulation, versions pas encore supprimées)
+    """
+    if not MODELS_DIR.exists():
+        return {'blobsRemoved': 0, 'bytesReclaimed': 0}
+
+    referenced = _referenced_blobs() - set(dropped)
+    now = time.time()
+    removed = 0
+    reclaimed = 0
+    for path in MODELS_DIR.iterdir():
+        if not path.is_file():
+            continue
+        if path.suffix == '.zip':
+            if path.stem in referenced:
+                continue
+        elif not path.name.endswith('.tmp'):
+            continue
+
+        st = path.stat()
+        if now - st.st_mtime < BLOB_GRACE_SECONDS:
+            continue
+        if not dry_run:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+        removed += 1
+        reclaimed += st.st_size
+
+    return {'blobsRemoved': removed, 'bytesReclaimed': reclaimed}
+
+def gc_models(
+    keep_recent: int = KEEP_RECENT,
+    keep_best: int = KEEP_BEST,
+    metric: Optional[str] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Applique la politique de rétention et supprime les archives orphelines.
+    Retourne un rapport (versions supprimées, octets récupérés, temps de chargement avant/après).
+    """
+    # data.json peut encore contenir les anciens modèles base64 (migrés au premier accès au registre)
+    data_bytes_before = database.DATA_FILE.stat().st_size if database.DATA_FILE.exists() else 0
+    models = _list_models()
+    before = _metadata_stats()
+
+    retained = select_retained(models, keep_recent, keep_best, metric)
+    to_remove = [m for m in models if m.get('id') not in retained]
+
+    removed = 0
+    if to_remove and not dry_run:
+        removed = _delete_models([m.get('id') for m in to_remove])
+
+    dropped = set()
+    if dry_run:
+        dropped = {m.get('model_sha256') for m in to_remove}
+        dropped -= {m.get('model_sha256') for m in models if m.get('id') in retained}
+    sweep = _sweep_blobs(dry_run, dropped)
+    after = _metadata_stats()
+
+    return {
+        'dryRun': dry_run,
+        'versionsBefore': len(models),
+        'versionsRemoved': removed if not dry_run else len(to_remove),
+        'removed': [
+            {'id': m.get('id'), 'modelName': m.get('model_name'), 'modelVersion': m.get('model_version')}
+            for m in to_remove
+        ],
+        'blobsRemoved': sweep['blobsRemoved'],
+        'bytesReclaimed': sweep['bytesReclaimed'],
+        'dataFileBytesBefore': data_bytes_before,
+        'dataFileBytesAfter': database.DATA_FILE.stat().st_size if database.DATA_FILE.exists() else 0,
+        'metadataBytesBefore': before['bytes'],
+        'metadataBytesAfter': after['bytes'],
+        'loadMsBefore': round(before['loadMs'], 3),
+        'loadMsAfter': round(after['loadMs'], 3),
+    }
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    keep_recent = int(args[0]) if len(args) > 0 else KEEP_RECENT
+    keep_best = int(args[1]) if len(args) > 1 else KEEP_BEST
+    dry_run = '--dry-run' in sys.argv
+
+    report = gc_models(keep_recent, keep_best, dry_run=dry_run)
+    prefix = "🔍 (simulation) " if dry_run else "✅ "
+    print(f"{prefix}{report['versionsRemoved']}/{report['versionsBefore']} versions supprimées, "
+          f"{report['blobsRemoved']} archives supprimées")
+    print(f"   - Espace récupéré: {report['bytesReclaimed'] / 1024 / 1024:.2f} Mo")
+    print(f"   - Métadonnées: {report['metadataBytesBefore']} → {report['metadataBytesAfter']} octets")
+    print(f"   - Temps de chargement: {report['loadMsBefore']:.2f} ms → {report['loadMsAfter']:.2f} ms")
@@ -0,0 +1,270 @@
+"""
+Registre des modèles ML (métadonnées uniquement)
+Remplace la section 'ml_models' de data.json par deux fichiers légers dans models/ :
+- models/registry.json : toutes les versions (nom, version, hash de l'archive, métadonnées)
+- models/active/<model_name>.json : pointeur vers la version active de chaque modèle
+
+Activer un modèle ne réécrit qu'un pointeur (quelques octets, remplacement atomique) :
+data.json et le registre ne sont ni relus ni réécrits. Les processus de service
+détectent un changement de version active avec un simple stat() du pointeur
+(voir active_model_version()).
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from database import (
+    MODELS_DIR, write_lock, transaction, load_section, _atomic_write, _externalize_inline_models
+)
+
+# Toutes les versions enregistrées
+REGISTRY_FILE = MODELS_DIR / 'registry.json'
+# Un pointeur par modèle vers sa version active
+ACTIVE_DIR = MODELS_DIR / 'active'
+
+# Champs conservés pour chaque version (jamais l'archive elle-même)
+ENTRY_FIELDS = [
+    'id', 'model_name', 'model_type', 'model_version', 'model_sha256', 'model_size',
+    'model_metadata', 'training_data_size', 'created_at'
+]
+
+_cache_lock = threading.Lock()
+# (signature du fichier, registre, index id -> version)
+_registry_cache: Optional[Tuple[Tuple, Dict[str, Any], Dict[int, Dict[str, Any]]]] = None
+# model_name -> (signature du pointeur, contenu du pointeur)
+_active_cache: Dict[str, Tuple[Tuple, Optional[Dict[str, Any]]]] = {}
+
+def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Signature d'un fichier (mtime, taille, inode) ou None s'il n'existe pas"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _active_path(model_name: str) -> Path:
+    return ACTIVE_DIR / f'{model_name}.json'
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_json(path: Path, value: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_write(path, lambda f: json.dump(value, f, indent=2, ensure_ascii=False))
+
+# ============================================================================
+# Registre des versions
+# ============================================================================
+
+def _migrate_from_data_json() -> None:
+    """Crée le registre à partir de l'ancienne section 'ml_models' de data.json (une seule fois)"""
+    with write_lock():
+        if REGISTRY_FILE.exists():
+            return
+
+        legacy_models = load_section('ml_models', []) or []
+        if not legacy_models:
+            _write_json(REGISTRY_FILE, {'next_id': 1, 'models': []})
+            return
+
+        with transaction() as data:
+            models = data.get('ml_models', [])
+            # Les anciennes archives base64 partent dans le stockage externe
+            _externalize_inline_models(models)
+
+            registry = {
+                'next_id': max([m.get('id', 0) for m in models], default=0) + 1,
+                'models': [{field: m.get(field) for field in ENTRY_FIELDS} for m in models]
+            }
+            _write_json(REGISTRY_FILE, registry)
+
+            # Version active la plus récente de chaque modèle
+            for m in sorted(models, key=lambda x: x.get('id', 0)):
+                if m.get('is_active', False):
+                    _write_pointer(m)
+
+            # Le registre fait désormais foi : data.json ne contient plus les modèles
+            data['ml_models'] = []
+
+        print(f"✅ {len(legacy_models)} modèles migrés de data.json vers {REGISTRY_FILE}")
+
+def load_registry() -> Tuple[Dict[str, Any], Dict[int, Dict[str, Any]]]:
+    """
+    Retourne (registre, index id -> version), relu uniquement si le fichier a changé.
+    Les objets retournés sont partagés : ils ne doivent PAS être modifiés.
+    """
+    global _registry_cache
+    signature = _signature(REGISTRY_FILE)
+    cache = _registry_cache
+    if cache is not None and signature is not None and cache[0] == signature:
+        return cache[1], cache[2]
+
+    if signature is None:
+        _migrate_from_data_json()
+
+    with _cache_lock:
+        signature = _signature(REGISTRY_FILE)
+        registry = _read_json(REGISTRY_FILE) or {'next_id': 1, 'models': []}
+        index = {m.get('id'): m for m in registry.get('models', [])}
+        _registry_cache = (signature, registry, index)
+        return registry, index
+
+def register_model(
+    model_name: str,
+    model_type: str,
+    model_version: str,
+    model_sha256: Optional[str],
+    model_size: Optional[int],
+    metadata: Dict[str, Any],
+    training_data_size: int = 0,
+    is_active: bool = False
+) -> int:
+    """Enregistre une nouvelle version (l'archive doit déjà être dans models/). Retourne son ID."""
+    load_registry()  # Migration éventuelle avant la première écriture
+    with write_lock():
+        registry = _read_json(REGISTRY_FILE) or {'next_id': 1, 'models': []}
+        model_id = registry.get('next_id', 1)
+        registry['next_id'] = model_id + 1
+
+        entry = {
+            'id': model_id,
+            'model_name': model_name,
+            'model_type': model_type,
+            'model_version': model_version,
+            'model_sha256': model_sha256,
+            'model_size': model_size,
+            'model_metadata': metadata,
+            'training_data_size': training_data_size,
+            # Même format que CURRENT_TIMESTAMP dans SQLite (UTC)
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        }
+        registry.setdefault('models', []).append(entry)
+        _write_json(REGISTRY_FILE, registry)
+
+        if is_active:
+            _write_pointer(entry)
+
+    return model_id
+
+def update_model(model_id: int, fields: Dict[str, Any]) -> None:
+    """Met à jour les métadonnées d'une version existante"""
+    load_registry()
+    with write_lock():
+        registry = _read_json(REGISTRY_FILE) or {'next_id': 1, 'models': []}
+        for entry in registry.get('models', []):
+            if entry.get('id') == model_id:
+                entry.update({k: v for k, v in fields.items() if k in ENTRY_FIELDS and k != 'id'})
+                _write_json(REGISTRY_FILE, registry)
+                return
+    raise ValueError(f"Modèle {model_id} introuvable dans le registre")
+
+def delete_models(model_ids: List[int]) -> int:
+    """Supprime des versions du registre (jamais une version active). Retourne le nombre supprimé."""
+    load_registry()
+    ids = set(model_ids)
+    with write_lock():
+        registry = _read_json(REGISTRY_FILE) or {'next_id': 1, 'models': []}
+        models = registry.get('models', [])
+        # Relire les pointeurs sous verrou : une version activée entre-temps est conservée
+        for model_name in {m.get('model_name') for m in models}:
+            active = _read_json(_active_path(model_name))
+            if active is not None:
+                ids.discard(active.get('id'))
+
+        kept = [m for m in models if m.get('id') not in ids]
+        removed = len(models) - len(kept)
+        if removed:
+            registry['models'] = kept
+            _write_json(REGISTRY_FILE, registry)
+    return removed
+
+def list_models(model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Versions enregistrées (avec 'is_active'), éventuellement filtrées par nom"""
+    registry, _ = load_registry()
+    result = []
+    for entry in registry.get('models', []):
+        if model_name is not None and entry.get('model_name') != model_name:
+            continue
+        active = active_model(entry.get('model_name'))
+        result.append({**entry, 'is_active': active is not None and active.get('id') == entry.get('id')})
+    return result
+
+# ============================================================================
+# Pointeurs de version active
+# ============================================================================
+
+def _write_pointer(entry: Dict[str, Any]) -> None:
+    """Remplace atomiquement le pointeur de version active d'un modèle"""
+    _write_json(_active_path(entry['model_name']), {
+        'id': entry.get('id'),
+        'model_version': entry.get('model_version'),
+        'model_sha256': entry.get('model_sha256')
+    })
+
+def active_model_version(model_name: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Version active d'un modèle, sous forme de jeton opaque comparable (un seul stat(), aucune lecture).
+    Deux appels retournent la même valeur tant que le modèle actif n'a pas changé.
+    """
+    if _registry_cache is None:
+        load_registry()  # Migration éventuelle des anciens modèles actifs
+    return _signature(_active_path(model_name))
+
+def active_model(model_name: str) -> Optional[Dict[str, Any]]:
+    """Pointeur de version active d'un modèle ({'id', 'model_version', 'model_sha256'}) ou None"""
+    signature = active_model_version(model_name)
+    cached = _active_cache.get(model_name)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    pointer = _read_json(_active_path(model_name)) if signature is not None else None
+    _active_cache[model_name] = (signature, pointer)
+    return pointer
+
+def activate_model(model_id: int, model_name: str) -> None:
+    """
+    Active une version : seul le pointeur models/active/<model_name>.json est réécrit.
+    Sous verrou, avec le registre relu : delete_models() (GC) voit le pointeur ou
+    supprime la version avant qu'elle ne soit activée, jamais entre les deux.
+    """
+    load_registry()  # Migration éventuelle avant la première écriture
+    with write_lock():
+        registry = _read_json(REGISTRY_FILE) or {'next_id': 1, 'models': []}
+        entry = next((m for m in registry.get('models', []) if m.get('id') == model_id), None)
+        if entry is None or entry.get('model_name') != model_name:
+            # Même comportement que l'ancienne implémentation : plus aucune version active
+            deactivate_model(model_name)
+            return
+        _write_pointer(entry)
+
+def deactivate_model(model_name: str) -> None:
+    """Supprime le pointeur de version active d'un modèle"""
+    with write_lock():
+        try:
+            os.unlink(_active_path(model_name))
+        except FileNotFoundError:
+            pass
+
+def load_model(model_name: str, model_version: str = 'latest') -> Optional[Dict[str, Any]]:
+    """Retourne l'entrée du registre d'une version ('latest' = version active)"""
+    registry, index = load_registry()
+
+    if model_version == 'latest':
+        pointer = active_model(model_name)
+        if pointer is None:
+            return None
+        entry = index.get(pointer.get('id'))
+        return {**entry, 'is_active': True} if entry is not None else None
+
+    for entry in registry.get('models', []):
+        if entry.get('model_name') == model_name and entry.get('model_version') == model_version:
+            active = active_model(model_name)
+            return {**entry, 'is_active': active is not None and active.get('id') == entry.get('id')}
+    return None
@@ -0,0 +1,122 @@
+"""
+Masques d'exclusion des recettes (allergènes et régimes alimentaires) en bits
+Chaque recette du catalogue a un entier uint64 dont chaque bit indique la présence d'un
+allergène (COMMON_ALLERGENS, la liste de FeatureExtractor) ou d'une classe d'ingrédients
+incompatible avec un régime (viande pour végétarien / vegan). Les masques sont calculés une
+fois par version du catalogue (RecipeCatalog.exclusion_bitsets()) : chaque mot-clé est
+cherché dans le vocabulaire d'ingrédients, puis le résultat est propagé aux recettes par la
+matrice CSR recette -> ingrédients. Filtrer tout le catalogue pour une requête est un ET
+bit à bit vectorisé.
+
+Les allergies hors de la liste sont cherchées de la même façon (sous-chaîne dans le
+vocabulaire, pas dans chaque recette), avec un cache par mot-clé.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from feature_extractor import COMMON_ALLERGENS
+
+# Classes d'ingrédients (mots-clés cherchés dans les noms d'ingrédients)
+INGREDIENT_CLASSES: Dict[str, List[str]] = {
+    'meat': ['chicken', 'beef', 'pork', 'fish', 'meat', 'bacon', 'sausage'],
+}
+
+# Régime -> classes d'ingrédients exclues
+DIET_EXCLUSIONS: Dict[str, List[str]] = {
+    'vegetarian': ['meat'],
+    'vegan': ['meat'],
+}
+
+# Un bit par allergène puis par classe d'ingrédients (64 au maximum)
+FLAGS: List[str] = COMMON_ALLERGENS + list(INGREDIENT_CLASSES)
+
+# Nombre maximal de mots-clés hors liste gardés en cache
+_KEYWORD_CACHE_SIZE = 1024
+
+def exclusion_keywords(allergies: Iterable[str], dietary_preference: Optional[str] = None) -> List[str]:
+    """Mots-clés à exclure (allergies puis classes du régime), pour le filtrage sans catalogue"""
+    keywords = [str(allergy).lower().strip() for allergy in allergies or []]
+    for name in DIET_EXCLUSIONS.get(dietary_preference or '', []):
+        keywords.extend(INGREDIENT_CLASSES[name])
+    return [keyword for keyword in keywords if keyword]
+
+def has_excluded_ingredient(ingredients: Iterable[str], keywords: List[str]) -> bool:
+    """Un des ingrédients contient-il un des mots-clés (même règle que les masques) ?"""
+    return any(keyword in str(ing).lower().strip() for ing in ingredients for keyword in keywords)
+
+class RecipeBitsets:
+    """Masques d'exclusion (un uint64 par recette) d'un RecipeCatalog"""
+
+    def __init__(self, catalog):
+        self.vocabulary: List[str] = catalog.ingredient_vocabulary
+        self.size = len(catalog)
+        indptr = np.asarray(catalog.ingredient_indptr, dtype=np.int64)
+        # Recette de chaque entrée de la matrice recette -> ingrédients
+        self._rows = np.repeat(np.arange(self.size), np.diff(indptr))
+        self._indices = np.asarray(catalog.ingredient_indices, dtype=np.int64)
+        self._keyword_hits: Dict[str, np.ndarray] = {}
+
+        self.bits: Dict[str, np.uint64] = {name: np.uint64(1 << i) for i, name in enumerate(FLAGS)}
+        self.masks = np.zeros(self.size, dtype=np.uint64)
+        for name in FLAGS:
+            hits = self._recipes_matching(INGREDIENT_CLASSES.get(name, [name]))
+            self.masks[hits] |= self.bits[name]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _recipes_matching(self, keywords: Iterable[str]) -> np.ndarray:
+        """Recettes dont un ingrédient contient l'un des mots-clés (booléen par recette)"""
+        keywords = [keyword for keyword in keywords if keyword]
+        vocab_hits = np.array(
+            [any(keyword in ing for keyword in keywords) for ing in self.vocabulary] or [False]
+        )
+        rows = self._rows[vocab_hits[self._indices]]
+        return np.bincount(rows, minlength=self.size) > 0
+
+    def keyword_hits(self, keyword: str) -> np.ndarray:
+        """Recettes dont un ingrédient contient `keyword` (mot-clé hors liste, mis en cache)"""
+        hits = self._keyword_hits.get(keyword)
+        if hits is None:
+            if len(self._keyword_hits) >= _KEYWORD_CACHE_SIZE:
+                self._keyword_hits.clear()
+            hits = self._recipes_matching([keyword])
+            self._keyword_hits[keyword] = hits
+        return hits
+
+    def exclusion(self, allergies: Iterable[str], dietary_preference: Optional[str] = None) -> Tuple[np.uint64, List[str]]:
+        """Masque des bits à exclure, et allergies hors liste (cherchées par mot-clé)"""
+        mask = np.uint64(0)
+        keywords = []
+        for allergy in allergies or []:
+            allergy = str(allergy).lower().strip()
+            if not allergy:
+                continue
+            bit = self.bits.get(allergy)
+            if bit is not None:
+                mask |= bit
+            else:
+                keywords.append(allergy)
+        for name in DIET_EXCLUSIONS.get(dietary_preference or '', []):
+            mask |= self.bits[name]
+        return mask, keywords
+
+    def allowed(
+        self,
+        allergies: Iterable[str],
+        dietary_preference: Optional[str] = None,
+        positions: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Recettes compatibles avec les allergies et le régime (booléen par recette, ou par
+        position de `positions`)
+        """
+        mask, keywords = self.exclusion(allergies, dietary_preference)
+        masks = self.masks if positions is None else self.masks[positions]
+        keep = (masks & mask) == 0
+        for keyword in keywords:
+            hits = self.keyword_hits(keyword)
+            keep &= ~(hits if positions is None else hits[positions])
+        return keep
@@ -0,0 +1,367 @@
+"""
+Catalogue de recettes compilé en colonnes NumPy
+Les recettes sont stockées sous forme de tableaux .npy ouverts en mémoire partagée
+(np.load(mmap_mode='r')) : tous les workers partagent une seule copie physique
+et le démarrage ne nécessite aucun parsing JSON.
+
+Structure d'un catalogue (dossier catalog/<clé>/) :
+- colonnes numériques : calories, estimated_price, prep_time, cook_time, is_healthy,
+  recipe_type_ids, cuisine_ids, ids
+- matrice CSR des ingrédients : ingredient_indptr, ingredient_indices (ids du vocabulaire)
+- tables de chaînes (offsets + blob UTF-8) : name, description, ingredients, steps
+- meta.json : vocabulaires d'ingrédients, de cuisines et de types de recettes
+"""
+
+import json
+import os
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from ingredient_canonicalizer import CatalogIngredients
+
+# Dossier des catalogues compilés
+CATALOG_DIR = Path(os.getenv('ML_CATALOG_DIR', Path(__file__).parent / 'catalog'))
+
+# Colonnes numériques (nom de colonne -> (clé de la recette, dtype))
+NUMERIC_COLUMNS = {
+    'calories': ('calories', np.float64),
+    'estimated_price': ('estimated_price', np.float64),
+    'prep_time': ('prep_time', np.float64),
+    'cook_time': ('cook_time', np.float64),
+    'servings': ('servings', np.float64),
+}
+
+# Tables de chaînes : les listes (ingrédients, étapes) sont stockées en JSON
+STRING_COLUMNS = ['name', 'description', 'ingredients', 'steps']
+
+def _to_float(value: Any) -> float:
+    """Convertit une valeur numérique de recette (NaN si absente ou invalide)"""
+    if value is None or value == '':
+        return float('nan')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def _as_list(value: Any) -> List[Any]:
+    """Retourne un champ liste (les anciennes recettes stockent parfois du JSON en string)"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except:
+            return []
+    return value or []
+
+class RecipeCatalog:
+    """Catalogue de recettes en colonnes, ouvert en lecture seule"""
+
+    def __init__(self, path: Path, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.path = path
+        self.arrays = arrays
+        self.meta = meta
+        self.key: str = meta.get('key', '')
+
+        self.ids = arrays['ids']
+        self.calories = arrays['calories']
+        self.estimated_price = arrays['estimated_price']
+        self.prep_time = arrays['prep_time']
+        self.cook_time = arrays['cook_time']
+        self.servings = arrays['servings']
+        self.is_healthy = arrays['is_healthy']
+        self.recipe_type_ids = arrays['recipe_type_ids']
+        self.cuisine_ids = arrays['cuisine_ids']
+        self.ingredient_indptr = arrays['ingredient_indptr']
+        self.ingredient_indices = arrays['ingredient_indices']
+
+        self.ingredient_vocabulary: List[str] = meta['ingredient_vocabulary']
+        self.cuisine_vocabulary: List[str] = meta['cuisine_vocabulary']
+        self.recipe_type_vocabulary: List[str] = meta['recipe_type_vocabulary']
+        self.cuisine_labels: List[str] = meta['cuisine_labels']
+        self.recipe_type_labels: List[str] = meta['recipe_type_labels']
+
+        self._filter_index: Optional['RecipeFilterIndex'] = None
+        self._canonical_ingredients: Optional[CatalogIngredients] = None
+        self._exclusion_bitsets = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def compile(cls, recipes: List[Dict[str, Any]], path: Path, key: str = '') -> 'RecipeCatalog':
+        """Compile une liste de recettes en catalogue colonnaire dans `path` (écriture atomique)"""
+        n = len(recipes)
+
+        # Vocabulaires (mêmes règles de normalisation que FeatureExtractor.build_vocabularies)
+        ingredient_lists = [_as_list(r.get('ingredients', [])) for r in recipes]
+        ingredient_vocabulary = sorted({ing.lower().strip() for ings in ingredient_lists for ing in ings})
+        ingredient_index = {ing: idx for idx, ing in enumerate(ingredient_vocabulary)}
+
+        cuisine_raw = [r.get('cuisine_type') or 'Other' for r in recipes]
+        cuisine_vocabulary = sorted({c.lower() for c in cuisine_raw})
+        cuisine_index = {c: idx for idx, c in enumerate(cuisine_vocabulary)}
+        # Libellé d'origine de chaque cuisine (première occurrence)
+        cuisine_labels = list(cuisine_vocabulary)
+        for c in reversed(cuisine_raw):
+            cuisine_labels[cuisine_index[c.lower()]] = c
+
+        type_raw = [r.get('recipe_type') or 'savory' for r in recipes]
+        recipe_type_vocabulary = sorted({t.lower() for t in type_raw})
+        type_index = {t: idx for idx, t in enumerate(recipe_type_vocabulary)}
+        recipe_type_labels = list(recipe_type_vocabulary)
+        for t in reversed(type_raw):
+            recipe_type_labels[type_index[t.lower()]] = t
+
+        arrays: Dict[str, np.ndarray] = {
+            'ids': np.array([r.get('id') if r.get('id') is not None else -1 for r in recipes], dtype=np.int64),
+            'is_healthy': np.array([bool(r.get('is_healthy', False)) for r in recipes], dtype=np.uint8),
+            'recipe_type_ids': np.array([type_index[t.lower()] for t in type_raw], dtype=np.int32),
+            'cuisine_ids': np.array([cuisine_index[c.lower()] for c in cuisine_raw], dtype=np.int32),
+        }
+        for column, (field, dtype) in NUMERIC_COLUMNS.items():
+            arrays[column] = np.array([_to_float(r.get(field)) for r in recipes], dtype=dtype)
+
+        # Matrice CSR recette -> ingrédients (ids du vocabulaire, sans doublons, triés)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices: List[int] = []
+        for i, ings in enumerate(ingredient_lists):
+            row = sorted({ingredient_index[ing.lower().strip()] for ing in ings})
+            indices.extend(row)
+            indptr[i + 1] = len(indices)
+        arrays['ingredient_indptr'] = indptr
+        arrays['ingredient_indices'] = np.array(indices, dtype=np.int32)
+
+        # Tables de chaînes
+        for column in STRING_COLUMNS:
+            if column in ('ingredients', 'steps'):
+                values = [json.dumps(_as_list(r.get(column, [])), ensure_ascii=False) for r in recipes]
+            else:
+                values = [r.get(column) or '' for r in recipes]
+            parts = [v.encode('utf-8') for v in values]
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum([len(p) for p in parts], out=offsets[1:])
+            arrays[f'{column}_offsets'] = offsets
+            arrays[f'{column}_blob'] = np.frombuffer(b''.join(parts), dtype=np.uint8)
+
+        meta = {
+            'key': key,
+            'size': n,
+            'ingredient_vocabulary': ingredient_vocabulary,
+            'cuisine_vocabulary': cuisine_vocabulary,
+            'cuisine_labels': cuisine_labels,
+            'recipe_type_vocabulary': recipe_type_vocabulary,
+            'recipe_type_labels': recipe_type_labels,
+        }
+
+        # Écrire dans un dossier temporaire puis le renommer (les lecteurs ne voient jamais un catalogue partiel)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir()
+        for name, array in arrays.items():
+            np.save(tmp_path / f'{name}.npy', array)
+        with open(tmp_path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Un autre processus a compilé le même catalogue entre-temps
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: Path) -> 'RecipeCatalog':
+        """Ouvre un catalogue compilé en mémoire partagée (lecture seule)"""
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        arrays = {}
+        for file in path.glob('*.npy'):
+            try:
+                arrays[file.stem] = np.load(file, mmap_mode='r')
+            except ValueError:
+                # Tableau vide : mmap impossible, chargement direct
+                arrays[file.stem] = np.load(file)
+
+        return cls(path, arrays, meta)
+
+    # ------------------------------------------------------------------
+    # Accès aux recettes
+    # ------------------------------------------------------------------
+
+    def _string(self, column: str, i: int) -> str:
+        """Lit la chaîne `i` d'une table de chaînes"""
+        offsets = self.arrays[f'{column}_offsets']
+        blob = self.arrays[f'{column}_blob']
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def name(self, i: int) -> str:
+        return self._string('name', i)
+
+    def ingredients(self, i: int) -> List[str]:
+        """Ingrédients d'origine (casse conservée) de la recette `i`"""
+        return json.loads(self._string('ingredients', i))
+
+    def steps(self, i: int) -> List[str]:
+        return json.loads(self._string('steps', i))
+
+    def ingredient_ids(self, i: int) -> np.ndarray:
+        """Ids (vocabulaire) des ingrédients de la recette `i`"""
+        return self.ingredient_indices[self.ingredient_indptr[i]:self.ingredient_indptr[i + 1]]
+
+    def recipe(self, i: int) -> Dict[str, Any]:
+        """Reconstruit la recette `i` au format dictionnaire de dataset_loader"""
+        recipe_id = int(self.ids[i])
+        recipe = {
+            'id': recipe_id if recipe_id >= 0 else None,
+            'name': self.name(i),
+            'description': self._string('description', i),
+            'ingredients': self.ingredients(i),
+            'steps': self.steps(i),
+            'cuisine_type': self.cuisine_labels[self.cuisine_ids[i]],
+            'recipe_type': self.recipe_type_labels[self.recipe_type_ids[i]],
+            'is_healthy': bool(self.is_healthy[i]),
+        }
+        # Les valeurs absentes (NaN) sont omises : les valeurs par défaut de l'API s'appliquent
+        for column in NUMERIC_COLUMNS:
+            value = float(self.arrays[column][i])
+            if not np.isnan(value):
+                recipe[column] = int(value) if value.is_integer() else value
+        return recipe
+
+    def numeric_values(self, column: str) -> np.ndarray:
+        """Valeurs renseignées (non nulles, non NaN) d'une colonne numérique"""
+        values = np.asarray(self.arrays[column])
+        return values[np.isfinite(values) & (values != 0)]
+
+    def filter_index(self) -> 'RecipeFilterIndex':
+        """Index (recipe_type, cuisine_type, is_healthy), construit au premier appel pour ce catalogue"""
+        if self._filter_index is None:
+            self._filter_index = RecipeFilterIndex(self)
+        return self._filter_index
+
+    def canonical_ingredients(self) -> CatalogIngredients:
+        """Ingrédients canoniques (ids internés) des recettes, construits au premier appel pour ce catalogue"""
+        if self._canonical_ingredients is None:
+            self._canonical_ingredients = CatalogIngredients(self)
+        return self._canonical_ingredients
+
+    def exclusion_bitsets(self) -> 'RecipeBitsets':
+        """Masques allergènes / régimes des recettes, construits au premier appel pour ce catalogue"""
+        if self._exclusion_bitsets is None:
+            from recipe_bitsets import RecipeBitsets
+            self._exclusion_bitsets = RecipeBitsets(self)
+        return self._exclusion_bitsets
+
+class RecipeFilterIndex:
+    """
+    Index composite (recipe_type, cuisine_type, is_healthy) -> positions des recettes.
+    Les positions sont triées par clé composite puis par position : chaque combinaison
+    de filtres correspond à une tranche contiguë. Un filtre absent est l'union des
+    tranches de toutes ses valeurs, le coût est donc proportionnel au résultat.
+    """
+
+    def __init__(self, catalog: RecipeCatalog):
+        self.recipe_type_index = {t: i for i, t in enumerate(catalog.recipe_type_vocabulary)}
+        self.cuisine_index = {c: i for i, c in enumerate(catalog.cuisine_vocabulary)}
+        self.n_cuisines = max(len(catalog.cuisine_vocabulary), 1)
+
+        keys = self._key(
+            np.asarray(catalog.recipe_type_ids, dtype=np.int64),
+            np.asarray(catalog.cuisine_ids, dtype=np.int64),
+            np.asarray(catalog.is_healthy, dtype=np.int64)
+        )
+        # Tri stable : les positions restent dans l'ordre du dataset à l'intérieur d'une tranche
+        self.order = np.argsort(keys, kind='stable').astype(np.int64)
+        sorted_keys = keys[self.order]
+        unique_keys, starts = np.unique(sorted_keys, return_index=True)
+        ends = np.append(starts[1:], len(sorted_keys))
+        self.slices: Dict[int, tuple] = {
+            int(k): (int(start), int(end)) for k, start, end in zip(unique_keys, starts, ends)
+        }
+
+    def _key(self, recipe_type_id, cuisine_id, healthy):
+        return (recipe_type_id * self.n_cuisines + cuisine_id) * 2 + healthy
+
+    def positions(
+        self,
+        recipe_type: Optional[str] = None,
+        cuisine_type: Optional[str] = None,
+        is_healthy: Optional[bool] = None
+    ) -> np.ndarray:
+        """Positions (ordre du dataset) des recettes qui correspondent aux filtres donnés"""
+        if recipe_type:
+            type_id = self.recipe_type_index.get(recipe_type.lower())
+            type_ids = [type_id] if type_id is not None else []
+        else:
+            type_ids = range(len(self.recipe_type_index))
+
+        if cuisine_type:
+            cuisine_id = self.cuisine_index.get(cuisine_type.lower())
+            cuisine_ids = [cuisine_id] if cuisine_id is not None else []
+        else:
+            cuisine_ids = range(len(self.cuisine_index))
+
+        healthy_values = [int(bool(is_healthy))] if is_healthy is not None else [0, 1]
+
+        parts = []
+        for type_id in type_ids:
+            for cuisine_id in cuisine_ids:
+                for healthy in healthy_values:
+                    bounds = self.slices.get(self._key(type_id, cuisine_id, healthy))
+                    if bounds is not None:
+                        parts.append(self.order[bounds[0]:bounds[1]])
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+_catalog_lock = threading.Lock()
+_catalog: Optional[RecipeCatalog] = None
+
+def catalog_key(source_version: Any) -> str:
+    """Clé (dossier) d'un catalogue compilé à partir d'une version du catalogue de recettes"""
+    return hashlib.sha1(repr(source_version).encode('utf-8')).hexdigest()[:16]
+
+def get_recipe_catalog(source_version: Any, load_recipes) -> RecipeCatalog:
+    """
+    Retourne le catalogue correspondant à `source_version` (voir database.catalog_version()).
+    Ordre de recherche : cache du processus, catalogue déjà compilé sur disque
+    (par un autre worker), puis compilation à partir de `load_recipes()`.
+    """
+    global _catalog
+    key = catalog_key(source_version)
+    if _catalog is not None and _catalog.key == key:
+        return _catalog
+
+    with _catalog_lock:
+        if _catalog is not None and _catalog.key == key:
+            return _catalog
+
+        path = CATALOG_DIR / key
+        if (path / 'meta.json').exists():
+            catalog = RecipeCatalog.open(path)
+        else:
+            catalog = RecipeCatalog.compile(load_recipes(), path, key=key)
+            # Supprimer les anciens catalogues (les fichiers déjà mappés restent lisibles)
+            for old in CATALOG_DIR.iterdir():
+                if old.is_dir() and old.name != key and not old.name.endswith('.tmp'):
+                    shutil.rmtree(old, ignore_errors=True)
+
+        _catalog = catalog
+        return catalog
@@ -0,0 +1,309 @@
+"""
+Détection des recettes quasi-identiques (MinHash + LSH)
+Chaque recette est représentée par l'ensemble de ses ingrédients canoniques et des mots
+de son nom. Une signature MinHash estime la similarité de Jaccard entre deux ensembles,
+et le découpage de la signature en bandes (LSH) ne compare que les recettes qui
+partagent au moins une bande : pas de comparaison de toutes les paires.
+
+Approximations :
+- la similarité de deux recettes est l'estimation MinHash (proportion de valeurs égales des
+  signatures, écart type d'environ sqrt(J(1-J)/(BANDS x ROWS))) ;
+- deux recettes qui ne partagent aucune bande ne sont jamais comparées (rappel du LSH), et
+  dans un seau de plus de DEDUP_WINDOW + 1 recettes, chaque recette n'est comparée qu'à
+  ses DEDUP_WINDOW suivantes (les recettes de signature identique ne comptent qu'une fois) ;
+- les groupes sont formés par lien complet : deux groupes ne sont fusionnés que si toutes
+  leurs paires de recettes atteignent le seuil (diamètre du groupe borné), en traitant les
+  paires de la plus similaire à la moins similaire. Une chaîne A ~ B ~ C dont A et C sont
+  trop différentes ne forme donc pas un seul groupe.
+
+Les modèles de classification et de génération utilisent les groupes obtenus pour
+associer les doublons à une seule classe (la recette canonique, la première du groupe) :
+la couche de sortie a une unité par groupe au lieu d'une par recette.
+
+Usage:
+    python recipe_dedup.py          # rapport des doublons du catalogue courant
+"""
+
+import json
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ingredient_canonicalizer import canonical_name
+
+# Seuil de similarité (Jaccard estimée) à partir duquel deux recettes sont des doublons
+DEDUP_THRESHOLD = float(os.getenv('ML_DEDUP_THRESHOLD', 0.8))
+# Taille de la signature = BANDS x ROWS permutations
+DEDUP_BANDS = int(os.getenv('ML_DEDUP_BANDS', 16))
+DEDUP_ROWS = int(os.getenv('ML_DEDUP_ROWS', 4))
+# Nombre de voisins comparés à chaque recette dans un seau LSH (borne le coût des grands seaux)
+DEDUP_WINDOW = int(os.getenv('ML_DEDUP_WINDOW', 64))
+
+# Premier de Mersenne 2^31 - 1 : (a * x + b) reste dans un uint64
+_PRIME = (1 << 31) - 1
+_SEED = 20240601
+_WORD = re.compile(r'[a-z0-9]+')
+# Mots sans valeur pour comparer des noms de recettes
+_STOP_WORDS = frozenset(['a', 'and', 'au', 'aux', 'de', 'des', 'du', 'et', 'la', 'le', 'les',
+                         'of', 'the', 'with', 'en', 'in', 'style'])
+# Nombre maximal de valeurs (permutations x éléments) calculées à la fois
+_CHUNK = 1 << 22
+
+def recipe_tokens(recipe: Dict[str, Any]) -> List[str]:
+    """Ensemble normalisé d'une recette : ingrédients (noms canoniques) et mots du nom"""
+    ingredients = recipe.get('ingredients', [])
+    if isinstance(ingredients, str):
+        try:
+            ingredients = json.loads(ingredients)
+        except:
+            ingredients = []
+
+    tokens = {f'i:{canonical_name(str(ing))}' for ing in ingredients}
+    name = str(recipe.get('name') or '').lower()
+    tokens.update(f'n:{word}' for word in _WORD.findall(name) if word not in _STOP_WORDS)
+    return sorted(tokens)
+
+def minhash_signatures(token_sets: List[List[str]], num_perm: int) -> np.ndarray:
+    """
+    Signatures MinHash (une ligne de `num_perm` valeurs par ensemble).
+    Les ensembles vides ont une signature à _PRIME (jamais regroupés).
+    """
+    rng = np.random.RandomState(_SEED)
+    a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+    # Tous les éléments à plat (CSR) : hash stable (crc32, indépendant de PYTHONHASHSEED)
+    lengths = np.array([len(tokens) for tokens in token_sets], dtype=np.int64)
+    values = np.fromiter(
+        (zlib.crc32(token.encode('utf-8')) for tokens in token_sets for token in tokens),
+        dtype=np.uint64, count=int(lengths.sum())
+    ) % np.uint64(_PRIME)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+
+    signatures = np.full((len(token_sets), num_perm), _PRIME, dtype=np.uint64)
+    step = max(1, _CHUNK // num_perm)
+    start = 0
+    while start < len(token_sets):
+        # Groupe d'ensembles consécutifs dont les éléments tiennent dans un bloc
+        end = int(np.searchsorted(indptr, indptr[start] + step, side='right')) - 1
+        end = min(len(token_sets), max(end, start + 1))
+        lo, hi = indptr[start], indptr[end]
+        if hi > lo:
+            hashed = (a[:, None] * values[None, lo:hi] + b[:, None]) % np.uint64(_PRIME)
+            rows = np.nonzero(lengths[start:end])[0]
+            offsets = (indptr[start:end] - lo)[rows]
+            signatures[start + rows] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = end
+
+    return signatures
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+def _required_matches(threshold: float, num_perm: int) -> int:
+    """Nombre minimal de valeurs égales de deux signatures pour atteindre le seuil"""
+    return int(np.ceil(threshold * num_perm - 1e-9))
+
+def _all_similar(signatures: np.ndarray, group: List[int], other: List[int], threshold: float) -> bool:
+    """Toutes les paires (élément de `group`, élément de `other`) atteignent-elles le seuil ?"""
+    required = _required_matches(threshold, signatures.shape[1])
+    other_signatures = signatures[other][None, :, :]
+    step = max(1, _CHUNK // (len(other) * signatures.shape[1]))
+    for start in range(0, len(group), step):
+        block = signatures[group[start:start + step]][:, None, :]
+        if np.count_nonzero(block == other_signatures, axis=2).min() < required:
+            return False
+    return True
+
+def candidate_pairs(
+    signatures: np.ndarray,
+    threshold: float,
+    bands: int,
+    rows: int,
+    window: int = DEDUP_WINDOW
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Paires (i, j), i < j, qui partagent au moins une bande et dont la similarité estimée
+    sur toute la signature atteint le seuil. Dans chaque seau, chaque signature est comparée
+    aux `window` suivantes (toutes les paires du seau s'il est assez petit).
+    Retourne (i, j, similarité), de la paire la plus similaire à la moins similaire.
+    """
+    n = len(signatures)
+    required = _required_matches(threshold, signatures.shape[1])
+    found_i, found_j, found_sim = [], [], []
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        # Débuts des seaux de signatures qui partagent cette bande
+        starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+        sizes = np.diff(np.concatenate([starts, [n]]))
+
+        for bucket_start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = np.sort(order[bucket_start:bucket_start + size])
+            if size - 1 <= window:
+                # Toutes les paires du seau en une comparaison
+                left, right = np.triu_indices(size, 1)
+                pairs = [(members[left], members[right])]
+            else:
+                pairs = [(members[:-offset], members[offset:]) for offset in range(1, window + 1)]
+            for first, second in pairs:
+                agreement = np.count_nonzero(signatures[first] == signatures[second], axis=1)
+                keep = agreement >= required
+                found_i.append(first[keep])
+                found_j.append(second[keep])
+                found_sim.append(agreement[keep])
+
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    pair_i, pair_j, similarity = np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_sim)
+    # Une paire peut partager plusieurs bandes : une seule occurrence
+    _, first_seen = np.unique(pair_i * n + pair_j, return_index=True)
+    pair_i, pair_j, similarity = pair_i[first_seen], pair_j[first_seen], similarity[first_seen]
+    order = np.lexsort((pair_j, pair_i, -similarity))
+    return pair_i[order], pair_j[order], similarity[order] / signatures.shape[1]
+
+def duplicate_clusters(
+    recipes: List[Dict[str, Any]],
+    threshold: float = DEDUP_THRESHOLD,
+    bands: int = DEDUP_BANDS,
+    rows: int = DEDUP_ROWS
+) -> np.ndarray:
+    """
+    Groupe les recettes quasi-identiques (voir les approximations en tête de module).
+    Retourne, pour chaque recette, la position de la recette canonique de son groupe
+    (la plus petite position du groupe ; elle-même si la recette n'a pas de doublon).
+    Toutes les paires d'un groupe ont une similarité estimée d'au moins `threshold`.
+    """
+    n = len(recipes)
+    roots = np.arange(n)
+    if n < 2:
+        return roots
+
+    token_sets = [recipe_tokens(recipe) for recipe in recipes]
+    signatures = minhash_signatures(token_sets, bands * rows)
+    valid = np.flatnonzero(signatures[:, 0] != _PRIME)
+    if len(valid) < 2:
+        return roots
+
+    # Signatures identiques (similarité estimée 1) : un seul élément à comparer
+    unique, unit_of = np.unique(signatures[valid], axis=0, return_inverse=True)
+    unit_of = unit_of.ravel()
+    parent = np.arange(len(unique))
+    # Éléments de chaque groupe, indexés par sa racine
+    groups: Dict[int, List[int]] = {}
+    # Groupes déjà refusés : un groupe qui grandit ne peut pas devenir acceptable
+    refused = set()
+    for i, j in zip(*candidate_pairs(unique, threshold, bands, rows)[:2]):
+        root, other = _find(parent, int(i)), _find(parent, int(j))
+        if root == other or (root, other) in refused:
+            continue
+        group, other_group = groups.get(root, [root]), groups.get(other, [other])
+        # Lien complet : chaque recette doit rester un doublon de tout le groupe fusionné
+        # (déjà vérifié par la paire elle-même entre deux recettes isolées)
+        if len(group) + len(other_group) > 2 and not _all_similar(unique, group, other_group, threshold):
+            refused.add((root, other))
+            continue
+        parent[other] = root
+        groups[root] = group + other_group
+        groups.pop(other, None)
+
+    # Recette canonique de chaque groupe : la plus petite position
+    group_of = np.array([_find(parent, u) for u in range(len(unique))])[unit_of]
+    canonical = np.full(len(unique), n)
+    np.minimum.at(canonical, group_of, valid)
+    roots[valid] = canonical[group_of]
+    return roots
+
+class RecipeClasses:
+    """Correspondance recettes -> classes de sortie d'un modèle (doublons regroupés)"""
+
+    def __init__(self, labels: np.ndarray, canonical: np.ndarray, recipe_ids: List[Any]):
+        # Classe de chaque recette (dans l'ordre des recettes d'entraînement)
+        self.labels = labels
+        # Position de la recette canonique de chaque classe
+        self.canonical = canonical
+        # Id de la recette canonique de chaque classe (enregistré avec le modèle)
+        self.recipe_ids = recipe_ids
+
+    @property
+    def num_classes(self) -> int:
+        return len(self.canonical)
+
+    @classmethod
+    def identity(cls, recipes: List[Dict[str, Any]]) -> 'RecipeClasses':
+        """Une classe par recette (sans déduplication)"""
+        positions = np.arange(len(recipes))
+        return cls(positions, positions, [recipe.get('id') for recipe in recipes])
+
+    @classmethod
+    def from_recipes(cls, recipes: List[Dict[str, Any]], threshold: float = DEDUP_THRESHOLD) -> 'RecipeClasses':
+        """Regroupe les doublons de `recipes` en une classe par recette canonique"""
+        roots = duplicate_clusters(recipes, threshold)
+        canonical, labels = np.unique(roots, return_inverse=True)
+        return cls(labels.astype(np.int64), canonical, [recipes[i].get('id') for i in canonical])
+
+    def to_metadata(self, threshold: float = DEDUP_THRESHOLD) -> Dict[str, Any]:
+        """Carte des classes à enregistrer dans les métadonnées du modèle"""
+        return {
+            'classRecipeIds': [int(i) if i is not None else None for i in self.recipe_ids],
+            'dedup': {
+                'threshold': threshold,
+                'numRecipes': int(len(self.labels)),
+                'numClasses': self.num_classes,
+            },
+        }
+
+def training_classes(recipes: List[Dict[str, Any]], threshold: Optional[float] = DEDUP_THRESHOLD) -> RecipeClasses:
+    """Classes de sortie pour l'entraînement (threshold=None : une classe par recette)"""
+    if threshold is None:
+        return RecipeClasses.identity(recipes)
+    classes = RecipeClasses.from_recipes(recipes, threshold)
+    if classes.num_classes < len(recipes):
+        print(f"✅ Doublons regroupés: {len(recipes)} recettes -> {classes.num_classes} classes", flush=True)
+    return classes
+
+def class_positions(metadata: Optional[Dict[str, Any]], catalog) -> Optional[np.ndarray]:
+    """
+    Position dans le catalogue de la recette de chaque classe d'un modèle enregistré
+    (-1 si elle n'y est plus). None pour les anciens modèles (classe = position).
+    """
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    recipe_ids = (metadata or {}).get('classRecipeIds')
+    if recipe_ids is None:
+        return None
+    index = {int(recipe_id): position for position, recipe_id in enumerate(catalog.ids)}
+    return np.array([index.get(recipe_id, -1) if recipe_id is not None else -1 for recipe_id in recipe_ids])
+
+def dedup_report(recipes: List[Dict[str, Any]], threshold: float = DEDUP_THRESHOLD) -> Dict[str, Any]:
+    """Nombre de recettes, de classes et exemples de groupes de doublons"""
+    classes = RecipeClasses.from_recipes(recipes, threshold)
+    groups: Dict[int, List[Any]] = {}
+    for position, label in enumerate(classes.labels):
+        groups.setdefault(int(label), []).append(recipes[position].get('id'))
+    duplicates = [ids for ids in groups.values() if len(ids) > 1]
+    return {
+        'recipes': len(recipes),
+        'classes': classes.num_classes,
+        'duplicateGroups': len(duplicates),
+        'examples': duplicates[:10],
+    }
+
+if __name__ == '__main__':
+    from dataset_loader import load_recipe_dataset
+    report = dedup_report(load_recipe_dataset())
+    print(f"✅ {report['recipes']} recettes -> {report['classes']} classes "
+          f"({report['duplicateGroups']} groupes de doublons, seuil {DEDUP_THRESHOLD})")
+    for ids in report['examples']:
+        print(f"   - {ids}")
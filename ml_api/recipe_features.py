@@ -0,0 +1,215 @@
+"""
+Matrice des features de recettes précalculée et ouverte en mémoire partagée
+La matrice (disposition de FeatureExtractor.extract_recipe_features, une ligne par
+recette du catalogue) est calculée une fois par version du catalogue et par état
+d'extracteur (vocabulaires et statistiques), puis enregistrée en .npy. Les workers
+l'ouvrent avec np.load(mmap_mode='r') : scorer tout le catalogue contre une requête
+est un seul produit matriciel, sans construire de features à chaque requête.
+
+Structure (dossier feature_matrices/<clé>/) :
+- data.npy, indices.npy, indptr.npy : matrice CSR (float32), le bloc ingrédients étant
+  presque entièrement nul
+- ids.npy : id de la recette de chaque ligne
+- meta.json : clé, clé du catalogue, dimensions
+
+Usage:
+    python recipe_features.py     # précalcule la matrice pour le modèle de génération actif
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from feature_extractor import FeatureExtractor
+
+# Dossier des matrices précalculées
+FEATURE_MATRIX_DIR = Path(os.getenv('ML_FEATURE_MATRIX_DIR', Path(__file__).parent / 'feature_matrices'))
+
+_ARRAYS = ['data', 'indices', 'indptr', 'ids']
+
+def _load_array(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Tableau vide : mmap impossible, chargement direct
+        return np.load(path)
+
+def feature_matrix_key(catalog, extractor: FeatureExtractor) -> str:
+    """Clé d'une matrice : version du catalogue + vocabulaires et statistiques de l'extracteur"""
+    state = json.dumps(extractor.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(f'{catalog.key}\n{state}'.encode('utf-8')).hexdigest()[:16]
+
+class RecipeFeatureMatrix:
+    """Features de toutes les recettes du catalogue (CSR en lecture seule, mémoire partagée)"""
+
+    def __init__(self, path: Path, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+        self.key: str = meta['key']
+        self.catalog_key: str = meta['catalogKey']
+        # Id de la recette de chaque ligne
+        self.ids = arrays['ids']
+        # copy=False : les tableaux restent ceux du mmap
+        self.matrix = sp.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=tuple(meta['shape']), copy=False
+        )
+        self._norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @classmethod
+    def compile(cls, catalog, extractor: FeatureExtractor, path: Path, key: str) -> 'RecipeFeatureMatrix':
+        """Calcule la matrice depuis les colonnes du catalogue et l'écrit dans `path` (écriture atomique)"""
+        matrix = extractor.extract_recipe_features_from_catalog(catalog, sparse=True)
+        # Index dans un seul dtype (sinon scipy les convertit, et la copie perd le mmap)
+        index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+        arrays = {
+            'data': matrix.data.astype(np.float32),
+            'indices': matrix.indices.astype(index_dtype),
+            'indptr': matrix.indptr.astype(index_dtype),
+            'ids': np.asarray(catalog.ids, dtype=np.int64),
+        }
+        meta = {
+            'key': key,
+            'catalogKey': catalog.key,
+            'shape': list(matrix.shape),
+            'nnz': int(matrix.nnz),
+        }
+
+        # Dossier temporaire puis renommage (les lecteurs ne voient jamais une matrice partielle)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir()
+        for name, array in arrays.items():
+            np.save(tmp_path / f'{name}.npy', array)
+        with open(tmp_path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Un autre processus a calculé la même matrice entre-temps
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: Path) -> 'RecipeFeatureMatrix':
+        """Ouvre une matrice précalculée en mémoire partagée (lecture seule)"""
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: _load_array(path / f'{name}.npy') for name in _ARRAYS}
+        return cls(path, arrays, meta)
+
+    def scores(self, query, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Produit de toutes les recettes (ou des lignes `positions`) avec `query`, dans la
+        disposition de extract_recipe_features : vecteur -> un score par recette ; matrice
+        (une requête par ligne, dense ou CSR) -> matrice recettes x requêtes
+        """
+        matrix = self.matrix if positions is None else self.matrix[np.asarray(positions, dtype=np.int64)]
+        if sp.issparse(query):
+            return (matrix @ query.T).toarray()
+        query = np.asarray(query, dtype=np.float32)
+        return matrix @ (query.T if query.ndim == 2 else query)
+
+    def norms(self) -> np.ndarray:
+        """Norme de chaque ligne (calculée au premier appel)"""
+        if self._norms is None:
+            squared = self.matrix.multiply(self.matrix).sum(axis=1)
+            self._norms = np.sqrt(np.asarray(squared, dtype=np.float64).ravel())
+        return self._norms
+
+    def similar(self, position: int, top_k: int = 10) -> np.ndarray:
+        """Positions des `top_k` recettes les plus proches de la recette `position` (cosinus)"""
+        norms = self.norms()
+        scores = self.scores(self.matrix[position]).ravel() / np.maximum(norms * norms[position], 1e-12)
+        scores[position] = -np.inf
+        top_k = min(top_k, len(scores) - 1)
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+def request_query(extractor: FeatureExtractor, request_features) -> np.ndarray:
+    """
+    Requête utilisateur (une ligne de extract_user_request_features_batch, liste, ndarray ou
+    CSR) dans la disposition des recettes, pour scores() : ingrédients, type, cuisine et santé
+    (les features numériques des recettes n'ont pas d'équivalent dans la requête).
+    Score d'une recette = ingrédients communs + type, cuisine et santé identiques.
+    """
+    row = request_features.toarray() if sp.issparse(request_features) else np.asarray(request_features)
+    row = np.asarray(row, dtype=np.float32).reshape(-1)
+    # Colonnes communes : ingrédients, type (1), cuisines ; puis santé (après 4 numériques)
+    shared = extractor.ingredient_width() + 1 + (len(extractor.cuisine_types) or 10)
+    query = np.zeros(shared + 5, dtype=np.float32)
+    query[:shared] = row[:shared]
+    query[-1] = row[shared]
+    return query
+
+_matrices_lock = threading.Lock()
+_matrices: Dict[str, RecipeFeatureMatrix] = {}
+
+def get_recipe_feature_matrix(catalog, extractor: FeatureExtractor) -> RecipeFeatureMatrix:
+    """
+    Matrice des features du catalogue pour un extracteur (celui d'un modèle chargé).
+    Ordre de recherche : cache du processus, matrice déjà calculée sur disque (par un
+    autre worker), puis calcul depuis les colonnes du catalogue.
+    """
+    key = feature_matrix_key(catalog, extractor)
+    matrix = _matrices.get(key)
+    if matrix is not None:
+        return matrix
+
+    with _matrices_lock:
+        matrix = _matrices.get(key)
+        if matrix is not None:
+            return matrix
+
+        path = FEATURE_MATRIX_DIR / key
+        if (path / 'meta.json').exists():
+            matrix = RecipeFeatureMatrix.open(path)
+        else:
+            matrix = RecipeFeatureMatrix.compile(catalog, extractor, path, key)
+            _remove_stale(catalog.key)
+
+        # Seules les matrices du catalogue courant restent en cache
+        for other in [k for k, m in _matrices.items() if m.catalog_key != catalog.key]:
+            del _matrices[other]
+        _matrices[key] = matrix
+        return matrix
+
+def _remove_stale(catalog_key: str) -> None:
+    """Supprime les matrices d'anciennes versions du catalogue (les fichiers déjà mappés restent lisibles)"""
+    for old in FEATURE_MATRIX_DIR.iterdir():
+        if not old.is_dir() or old.name.endswith('.tmp'):
+            continue
+        try:
+            with open(old / 'meta.json', 'r', encoding='utf-8') as f:
+                stale = json.load(f).get('catalogKey') != catalog_key
+        except (OSError, ValueError):
+            stale = True
+        if stale:
+            shutil.rmtree(old, ignore_errors=True)
+
+if __name__ == '__main__':
+    from dataset_loader import load_recipe_catalog
+    from generation_model import GenerationModel
+
+    model = GenerationModel.load_from_db()
+    matrix = get_recipe_feature_matrix(load_recipe_catalog(), model.feature_extractor)
+    print(f"✅ Matrice des features: {matrix.matrix.shape[0]} recettes x {matrix.matrix.shape[1]} features "
+          f"({matrix.matrix.nnz} valeurs non nulles) -> {matrix.path}")
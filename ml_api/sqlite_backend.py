@@ -0,0 +1,443 @@
+"""
+Backend SQLite pour la base de données ML
+Implémente la même API que database.py (recettes, profils, interactions, modèles)
+sur une base SQLite en mode WAL, avec les index définis dans database/ml_schema.sql.
+
+Activation : ML_DB_BACKEND=sqlite (chemin configurable avec ML_SQLITE_PATH)
+Migration depuis data.json : python sqlite_backend.py
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+# Chemin vers la base SQLite
+SQLITE_FILE = Path(os.getenv('ML_SQLITE_PATH', Path(__file__).parent / 'data.sqlite3'))
+
+# Traduction SQLite de database/ml_schema.sql (tables utilisées par l'API ML)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipe_templates (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  description TEXT,
+  ingredients TEXT NOT NULL, -- JSON array
+  steps TEXT NOT NULL, -- JSON array
+  prep_time INTEGER,
+  cook_time INTEGER,
+  servings INTEGER,
+  calories INTEGER,
+  estimated_price REAL,
+  cuisine_type TEXT,
+  recipe_type TEXT NOT NULL,
+  is_healthy INTEGER DEFAULT 0,
+  tags TEXT, -- JSON array
+  difficulty TEXT DEFAULT 'medium',
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_recipe_type ON recipe_templates (recipe_type);
+CREATE INDEX IF NOT EXISTS idx_cuisine_type ON recipe_templates (cuisine_type);
+CREATE INDEX IF NOT EXISTS idx_is_healthy ON recipe_templates (is_healthy);
+
+-- Version du catalogue : incrémentée par des triggers dans la transaction de chaque
+-- écriture des recettes (y compris par un autre outil que l'API) ; l'époque, tirée à la
+-- création de la base, distingue deux bases recréées dont les compteurs coïncident
+CREATE TABLE IF NOT EXISTS catalog_version (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  epoch TEXT NOT NULL,
+  version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, epoch, version) VALUES (1, lower(hex(randomblob(8))), 0);
+CREATE TRIGGER IF NOT EXISTS recipe_templates_version_insert AFTER INSERT ON recipe_templates
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS recipe_templates_version_update AFTER UPDATE ON recipe_templates
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS recipe_templates_version_delete AFTER DELETE ON recipe_templates
+BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END;
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+  user_id INTEGER PRIMARY KEY,
+  email TEXT,
+  age INTEGER,
+  gender TEXT,
+  activity_level TEXT,
+  dietary_preference TEXT,
+  allergies TEXT, -- JSON array
+  health_conditions TEXT, -- JSON array
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_interactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  recipe_template_id INTEGER,
+  interaction_type TEXT NOT NULL,
+  generated_recipe_id INTEGER,
+  feedback_score INTEGER,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_user_id ON user_interactions (user_id);
+CREATE INDEX IF NOT EXISTS idx_interaction_type ON user_interactions (interaction_type);
+CREATE INDEX IF NOT EXISTS idx_created_at ON user_interactions (created_at);
+
+CREATE TABLE IF NOT EXISTS ml_models (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  model_name TEXT NOT NULL,
+  model_type TEXT NOT NULL,
+  model_version TEXT NOT NULL,
+  model_sha256 TEXT, -- Archive dans models/<sha256>.zip
+  model_size INTEGER,
+  model_metadata TEXT, -- JSON
+  training_data_size INTEGER,
+  is_active INTEGER DEFAULT 0,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (model_name, model_version)
+);
+CREATE INDEX IF NOT EXISTS idx_model_active ON ml_models (model_name, is_active);
+"""
+
+_local = threading.local()
+# Recettes décodées (version de la table, liste partagée) pour load_recipe_templates()
+_recipes_cache = None
+
+def get_connection() -> sqlite3.Connection:
+    """Connexion SQLite propre au thread courant (mode WAL : les lecteurs ne bloquent pas)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        SQLITE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(SQLITE_FILE), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+def _json_list(value: Any) -> List[Any]:
+    """Décode une colonne JSON array"""
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return []
+
+def _recipe_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convertit une ligne recipe_templates au format des recettes JSON"""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'] or '',
+        'ingredients': _json_list(row['ingredients']),
+        'steps': _json_list(row['steps']),
+        'prep_time': row['prep_time'],
+        'cook_time': row['cook_time'],
+        'servings': row['servings'],
+        'calories': row['calories'],
+        'estimated_price': row['estimated_price'],
+        'cuisine_type': row['cuisine_type'],
+        'recipe_type': row['recipe_type'],
+        'is_healthy': bool(row['is_healthy']),
+        'difficulty_level': row['difficulty'],
+        'tags': _json_list(row['tags'])
+    }
+
+def _profile_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convertit une ligne user_profiles au format des profils JSON"""
+    return {
+        'user_id': row['user_id'],
+        'email': row['email'],
+        'age': row['age'],
+        'gender': row['gender'],
+        'activity_level': row['activity_level'],
+        'dietary_preference': row['dietary_preference'],
+        'allergies': _json_list(row['allergies']),
+        'health_conditions': _json_list(row['health_conditions'])
+    }
+
+def _model_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convertit une ligne ml_models au format des modèles JSON"""
+    return {
+        'id': row['id'],
+        'model_name': row['model_name'],
+        'model_type': row['model_type'],
+        'model_version': row['model_version'],
+        'model_sha256': row['model_sha256'],
+        'model_size': row['model_size'],
+        'model_metadata': json.loads(row['model_metadata']) if row['model_metadata'] else {},
+        'training_data_size': row['training_data_size'],
+        'is_active': bool(row['is_active']),
+        'created_at': row['created_at']
+    }
+
+# ============================================================================
+# API identique à database.py
+# ============================================================================
+
+def load_recipe_templates() -> List[Dict[str, Any]]:
+    """
+    Charge toutes les recettes, décodées une seule fois par version de la table (comme
+    l'instantané du backend JSON). La liste retournée est partagée : ne PAS la modifier.
+    """
+    global _recipes_cache
+    # Version lue avant les lignes : une écriture concurrente ne peut qu'invalider le cache
+    version = recipes_version()
+    cache = _recipes_cache
+    if cache is not None and cache[0] == version:
+        return cache[1]
+    rows = get_connection().execute('SELECT * FROM recipe_templates ORDER BY id').fetchall()
+    recipes = [_recipe_from_row(row) for row in rows]
+    _recipes_cache = (version, recipes)
+    return recipes
+
+def recipes_version() -> tuple:
+    """
+    Version de la table des recettes (époque de la base, compteur d'écritures) : change à
+    chaque insertion, modification ou suppression, même sans changement de nombre de
+    lignes, d'id max ou de seconde (voir les triggers de SCHEMA)
+    """
+    row = get_connection().execute(
+        'SELECT epoch, version FROM catalog_version WHERE id = 1'
+    ).fetchone()
+    return tuple(row)
+
+def load_user_profile(user_id: int) -> Optional[Dict[str, Any]]:
+    """Charge le profil d'un utilisateur (recherche par clé primaire)"""
+    row = get_connection().execute(
+        'SELECT * FROM user_profiles WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    return _profile_from_row(row) if row else None
+
+def load_user_interactions(user_id: int, limit: int = 10000) -> List[Dict[str, Any]]:
+    """Charge les interactions d'un utilisateur (via idx_user_id)"""
+    rows = get_connection().execute(
+        'SELECT * FROM user_interactions '
+        'WHERE user_id = ? AND recipe_template_id IS NOT NULL '
+        'ORDER BY id LIMIT ?',
+        (user_id, limit)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def existing_user_ids(user_ids: List[int]) -> set:
+    """IDs parmi `user_ids` qui ont déjà un profil (clé primaire, par lots)"""
+    conn = get_connection()
+    ids = list(user_ids)
+    existing = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT user_id FROM user_profiles WHERE user_id IN ({', '.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        existing.update(row['user_id'] for row in rows)
+    return existing
+
+def upsert_user_profiles(profiles: List[Dict[str, Any]]) -> None:
+    """Crée ou met à jour des profils utilisateurs en une seule transaction"""
+    # Regrouper les profils par ensemble de champs fournis : une requête préparée par groupe
+    groups: Dict[tuple, List[list]] = {}
+    for profile in profiles:
+        # Ne mettre à jour que les champs fournis (même sémantique que le journal JSON)
+        columns = ('user_id',) + tuple(k for k in (
+            'email', 'age', 'gender', 'activity_level',
+            'dietary_preference', 'allergies', 'health_conditions'
+        ) if k in profile)
+        groups.setdefault(columns, []).append([
+            json.dumps(profile[c], ensure_ascii=False) if c in ('allergies', 'health_conditions') else profile[c]
+            for c in columns
+        ])
+
+    conn = get_connection()
+    with conn:
+        for columns, rows in groups.items():
+            updates = ', '.join(f'{c} = excluded.{c}' for c in columns[1:]) or 'user_id = excluded.user_id'
+            conn.executemany(
+                f"INSERT INTO user_profiles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(user_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP",
+                rows
+            )
+
+def append_interactions(interactions: List[Dict[str, Any]]) -> int:
+    """Ajoute des interactions utilisateur en une seule transaction"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT INTO user_interactions '
+            '(user_id, recipe_template_id, interaction_type, generated_recipe_id, feedback_score, created_at) '
+            'VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))',
+            [
+                (
+                    i.get('user_id'),
+                    i.get('recipe_template_id'),
+                    i.get('interaction_type', 'view'),
+                    i.get('generated_recipe_id'),
+                    i.get('feedback_score'),
+                    i.get('created_at')
+                )
+                for i in interactions
+            ]
+        )
+    return len(interactions)
+
+def save_model_to_db(
+    model_name: str,
+    model_type: str,
+    model_version: str,
+    model_sha256: Optional[str],
+    model_size: Optional[int],
+    metadata: Dict[str, Any],
+    training_data_size: int = 0,
+    is_active: bool = False
+) -> int:
+    """Enregistre un modèle (l'archive est déjà dans le stockage externe)"""
+    conn = get_connection()
+    with conn:
+        if is_active:
+            conn.execute('UPDATE ml_models SET is_active = 0 WHERE model_name = ?', (model_name,))
+        cursor = conn.execute(
+            'INSERT INTO ml_models '
+            '(model_name, model_type, model_version, model_sha256, model_size, model_metadata, training_data_size, is_active) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (model_name, model_type, model_version, model_sha256, model_size,
+             json.dumps(metadata, ensure_ascii=False), training_data_size, int(is_active))
+        )
+    return cursor.lastrowid
+
+def load_model_from_db(model_name: str, model_version: str = 'latest') -> Optional[Dict[str, Any]]:
+    """Charge l'entrée d'un modèle (via idx_model_active ou la clé unique nom/version)"""
+    conn = get_connection()
+    if model_version == 'latest':
+        row = conn.execute(
+            'SELECT * FROM ml_models WHERE model_name = ? AND is_active = 1 ORDER BY id DESC LIMIT 1',
+            (model_name,)
+        ).fetchone()
+    else:
+        row = conn.execute(
+            'SELECT * FROM ml_models WHERE model_name = ? AND model_version = ?',
+            (model_name, model_version)
+        ).fetchone()
+    return _model_from_row(row) if row else None
+
+def activate_model(model_id: int, model_name: str) -> None:
+    """Active un modèle et désactive les autres du même type (une transaction)"""
+    conn = get_connection()
+    with conn:
+        conn.execute('UPDATE ml_models SET is_active = 0 WHERE model_name = ? AND is_active = 1', (model_name,))
+        conn.execute('UPDATE ml_models SET is_active = 1 WHERE id = ?', (model_id,))
+
+def active_model_version(model_name: str) -> Optional[int]:
+    """ID de la version active d'un modèle (lecture de l'index idx_model_active uniquement)"""
+    row = get_connection().execute(
+        'SELECT id FROM ml_models WHERE model_name = ? AND is_active = 1 ORDER BY id DESC LIMIT 1',
+        (model_name,)
+    ).fetchone()
+    return row['id'] if row else None
+
+def list_models(model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Versions enregistrées, éventuellement filtrées par nom"""
+    conn = get_connection()
+    if model_name is None:
+        rows = conn.execute('SELECT * FROM ml_models ORDER BY id').fetchall()
+    else:
+        rows = conn.execute('SELECT * FROM ml_models WHERE model_name = ? ORDER BY id', (model_name,)).fetchall()
+    return [_model_from_row(row) for row in rows]
+
+def delete_models(model_ids: List[int]) -> int:
+    """Supprime des versions (jamais une version active). Retourne le nombre supprimé."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany(
+            'DELETE FROM ml_models WHERE id = ? AND is_active = 0',
+            [(model_id,) for model_id in model_ids]
+        )
+    return cursor.rowcount
+
+# ============================================================================
+# Migration depuis data.json
+# ============================================================================
+
+def migrate_from_json() -> Dict[str, int]:
+    """Copie le contenu de data.json (journal inclus) dans la base SQLite"""
+    import database
+    import model_registry
+
+    # Les archives base64 sont d'abord sorties du JSON vers models/
+    database.externalize_model_blobs()
+    data = database.load_data()
+
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO recipe_templates '
+            '(id, name, description, ingredients, steps, prep_time, cook_time, servings, calories, '
+            'estimated_price, cuisine_type, recipe_type, is_healthy, tags, difficulty) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    r.get('id'),
+                    r.get('name') or '',
+                    r.get('description', ''),
+                    r['ingredients'] if isinstance(r.get('ingredients'), str) else json.dumps(r.get('ingredients', []), ensure_ascii=False),
+                    r['steps'] if isinstance(r.get('steps'), str) else json.dumps(r.get('steps', []), ensure_ascii=False),
+                    r.get('prep_time'),
+                    r.get('cook_time'),
+                    r.get('servings'),
+                    r.get('calories'),
+                    r.get('estimated_price'),
+                    r.get('cuisine_type'),
+                    r.get('recipe_type', 'savory'),
+                    int(bool(r.get('is_healthy', False))),
+                    json.dumps(r.get('tags', []), ensure_ascii=False),
+                    r.get('difficulty_level', r.get('difficulty', 'medium'))
+                )
+                for r in data.get('recipes', [])
+            ]
+        )
+
+    profiles = data.get('user_profiles', [])
+    upsert_user_profiles(profiles)
+
+    # Migration en une fois : les interactions sont remplacées (pas de doublons si relancée)
+    interactions = data.get('interactions', [])
+    with conn:
+        conn.execute('DELETE FROM user_interactions')
+    append_interactions(interactions)
+
+    # Les modèles sont dans le registre JSON (models/registry.json)
+    models = model_registry.list_models()
+    with conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO ml_models '
+            '(id, model_name, model_type, model_version, model_sha256, model_size, model_metadata, training_data_size, is_active) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    m.get('id'),
+                    m.get('model_name'),
+                    m.get('model_type', ''),
+                    m.get('model_version') or f"v{m.get('id')}",
+                    m.get('model_sha256'),
+                    m.get('model_size'),
+                    json.dumps(m.get('model_metadata') or {}, ensure_ascii=False),
+                    m.get('training_data_size', 0),
+                    int(bool(m.get('is_active', False)))
+                )
+                for m in models
+            ]
+        )
+
+    return {
+        'recipes': len(data.get('recipes', [])),
+        'user_profiles': len(profiles),
+        'interactions': len(interactions),
+        'ml_models': len(models)
+    }
+
+if __name__ == '__main__':
+    counts = migrate_from_json()
+    print(f"✅ Migration de data.json vers {SQLITE_FILE} terminée")
+    for table, count in counts.items():
+        print(f"   - {table}: {count}")
@@ -1,108 +1,226 @@
 """
 Script pour synchroniser les utilisateurs existants de MySQL vers le fichier JSON
 Utile pour migrer les utilisateurs déjà créés
+
+Synchronisation incrémentale : seuls les utilisateurs modifiés depuis le dernier passage
+sont relus, par deux recherches sur les colonnes indexées users.updated_at et
+user_profiles.updated_at (idx_updated_at). Le filigrane (date de modification la plus
+récente appliquée) est conservé dans sync_state.json ; chaque passage relit aussi les
+ML_SYNC_OVERLAP_SECONDS qui le précèdent (horodatages à la seconde, transactions validées
+en retard) : les upserts sont idempotents, un utilisateur relu est simplement réappliqué.
+Les lignes sont lues avec un curseur non bufferisé, par lots de ML_SYNC_BATCH_SIZE,
+et chaque lot est appliqué en une seule écriture (upsert_user_profiles).
+
+Bases MySQL créées avant l'ajout des index (database/schema.sql) :
+    ALTER TABLE users ADD INDEX idx_updated_at (updated_at);
+    ALTER TABLE user_profiles ADD INDEX idx_updated_at (updated_at);
+
+Usage:
+    python sync_existing_users.py          # incrémental
+    python sync_existing_users.py --full   # tout resynchroniser (ignore le filigrane)
+
+Les utilisateurs supprimés dans MySQL ne sont pas supprimés du store ML.
 """
 
-import mysql.connector
 import json
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 import os
+from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
+from database import DATA_FILE, upsert_user_profiles, _atomic_write
+
+try:
+    import mysql.connector
+except ImportError:
+    # Synchronisation possible avec une autre connexion DB-API (ex: SQLite)
+    mysql = None
 
 load_dotenv()
 
-def sync_users_from_mysql():
-    """Synchronise les utilisateurs depuis MySQL vers le fichier JSON"""
+# Filigrane de la dernière synchronisation
+SYNC_STATE_FILE = Path(__file__).parent / 'sync_state.json'
+# Nombre de lignes lues (et appliquées) par lot
+SYNC_BATCH_SIZE = int(os.getenv('ML_SYNC_BATCH_SIZE', 1000))
+# Fenêtre relue avant le filigrane à chaque passage incrémental
+SYNC_OVERLAP_SECONDS = int(os.getenv('ML_SYNC_OVERLAP_SECONDS', 60))
+
+USER_COLUMNS = """
+            u.id as user_id,
+            u.email,
+            up.age,
+            up.gender,
+            up.activity_level,
+            up.dietary_preference,
+            up.allergies,
+            up.health_conditions,
+            u.updated_at as user_updated_at,
+            up.updated_at as profile_updated_at
+"""
+
+# Tous les utilisateurs
+USERS_QUERY = f"""
+    SELECT {USER_COLUMNS}
+    FROM users u
+    LEFT JOIN user_profiles up ON u.id = up.user_id
+    ORDER BY user_id
+"""
+
+# Utilisateurs dont le compte ou le profil a changé depuis {since} : une recherche par
+# index (idx_updated_at) sur chaque table, plutôt qu'un filtre sur une date calculée
+CHANGED_USERS_QUERY = f"""
+    SELECT {USER_COLUMNS}
+    FROM users u
+    LEFT JOIN user_profiles up ON u.id = up.user_id
+    WHERE u.updated_at >= {{since}}
+    UNION
+    SELECT {USER_COLUMNS}
+    FROM user_profiles up
+    JOIN users u ON u.id = up.user_id
+    WHERE up.updated_at >= {{since}}
+    ORDER BY user_id
+"""
+
+def _connect_mysql():
+    """Connexion MySQL à partir des variables d'environnement"""
+    if mysql is None:
+        raise ImportError("mysql-connector-python n'est pas installé")
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'nutriwise'),
+        password=os.getenv('DB_PASSWORD', 'nutriwise123'),
+        database=os.getenv('DB_NAME', 'nutriwise'),
+        port=int(os.getenv('DB_PORT', 3306))
+    )
+
+def load_sync_state() -> Dict[str, Any]:
+    """Filigrane de la dernière synchronisation ({} si aucune)"""
     try:
-        # Connexion MySQL
-        mysql_conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'nutriwise'),
-            password=os.getenv('DB_PASSWORD', 'nutriwise123'),
-            database=os.getenv('DB_NAME', 'nutriwise'),
-            port=int(os.getenv('DB_PORT', 3306))
-        )
-        
-        cursor = mysql_conn.cursor(dictionary=True)
-        
-        # Charger les utilisateurs et leurs profils
-        cursor.execute("""
-            SELECT 
-                u.id as user_id,
-                u.email,
-                up.age,
-                up.gender,
-                up.activity_level,
-                up.dietary_preference,
-                up.allergies,
-                up.health_conditions
-            FROM users u
-            LEFT JOIN user_profiles up ON u.id = up.user_id
-            ORDER BY u.id
-        """)
-        
-        mysql_users = cursor.fetchall()
-        cursor.close()
-        mysql_conn.close()
-        
-        # Charger le fichier JSON actuel
-        data_path = Path(__file__).parent / 'data.json'
-        if data_path.exists():
-            with open(data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_sync_state(state: Dict[str, Any]) -> None:
+    _atomic_write(SYNC_STATE_FILE, lambda f: json.dump(state, f, indent=2))
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Horodatage MySQL (datetime) ou SQLite (texte) en datetime, None si absent ou illisible"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+def _changed_at(user: Dict[str, Any]) -> Optional[datetime]:
+    """Date de modification d'un utilisateur : la plus récente entre le compte et le profil"""
+    dates = [d for d in (_timestamp(user.get('user_updated_at')), _timestamp(user.get('profile_updated_at'))) if d]
+    return max(dates) if dates else None
+
+def _json_list(value: Any) -> List[Any]:
+    """Parse les allergies et health_conditions si ce sont des strings JSON"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except:
+            return []
+    return value or []
+
+def _profile_from_row(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertit un utilisateur MySQL au format JSON"""
+    return {
+        'user_id': user['user_id'],
+        'email': user['email'],
+        'age': user.get('age'),
+        'gender': user.get('gender'),
+        'activity_level': user.get('activity_level'),
+        'dietary_preference': user.get('dietary_preference'),
+        'allergies': _json_list(user.get('allergies')),
+        'health_conditions': _json_list(user.get('health_conditions'))
+    }
+
+def sync_users_from_mysql(
+    full: bool = False,
+    conn=None,
+    paramstyle: str = 'format',
+    batch_size: int = SYNC_BATCH_SIZE
+) -> Optional[Dict[str, int]]:
+    """
+    Synchronise les utilisateurs modifiés depuis MySQL vers le fichier JSON
+
+    Args:
+        full: Ignorer le filigrane et tout resynchroniser
+        conn: Connexion DB-API à utiliser (par défaut : MySQL depuis les variables d'environnement)
+        paramstyle: Style des paramètres de `conn` ('format' pour MySQL, 'qmark' pour SQLite)
+        batch_size: Nombre de lignes lues et appliquées par lot
+
+    Returns:
+        {'users', 'created', 'updated', 'batches'} ou None en cas d'erreur
+    """
+    own_connection = conn is None
+    try:
+        if own_connection:
+            conn = _connect_mysql()
+
+        state = {} if full else load_sync_state()
+        placeholder = '?' if paramstyle == 'qmark' else '%s'
+
+        watermark = _timestamp(state.get('changed_at'))
+        if watermark is not None:
+            since = (watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+            query = CHANGED_USERS_QUERY.format(since=placeholder)
+            params = (since, since)
         else:
-            data = {
-                "recipes": [],
-                "user_profiles": [],
-                "interactions": [],
-                "ml_models": []
-            }
-        
-        # Convertir les utilisateurs MySQL au format JSON
-        user_profiles = []
-        for user in mysql_users:
-            # Parser les allergies et health_conditions si ce sont des strings JSON
-            allergies = user.get('allergies', [])
-            if isinstance(allergies, str):
-                try:
-                    allergies = json.loads(allergies)
-                except:
-                    allergies = []
-            
-            health_conditions = user.get('health_conditions', [])
-            if isinstance(health_conditions, str):
-                try:
-                    health_conditions = json.loads(health_conditions)
-                except:
-                    health_conditions = []
-            
-            profile = {
-                'user_id': user['user_id'],
-                'email': user['email'],
-                'age': user.get('age'),
-                'gender': user.get('gender'),
-                'activity_level': user.get('activity_level'),
-                'dietary_preference': user.get('dietary_preference'),
-                'allergies': allergies,
-                'health_conditions': health_conditions
-            }
-            user_profiles.append(profile)
-        
-        # Mettre à jour le fichier JSON
-        data['user_profiles'] = user_profiles
-        
-        # Sauvegarder
-        with open(data_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        print(f"✅ {len(user_profiles)} utilisateurs synchronisés depuis MySQL vers {data_path}")
-        
-    except mysql.connector.Error as e:
-        print(f"❌ Erreur MySQL: {e}")
-    except Exception as e:
-        print(f"❌ Erreur: {e}")
+            query = USERS_QUERY
+            params = ()
 
-if __name__ == '__main__':
-    sync_users_from_mysql()
+        # Curseur non bufferisé (mysql-connector) : les lignes arrivent par lots,
+        # la mémoire utilisée ne dépend pas du nombre total d'utilisateurs
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        columns = [c[0] for c in cursor.description]
+
+        counts = {'users': 0, 'created': 0, 'updated': 0, 'batches': 0}
+        newest = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            users = [dict(zip(columns, row)) for row in rows]
+            results = upsert_user_profiles([_profile_from_row(u) for u in users])
 
+            counts['users'] += len(users)
+            counts['batches'] += 1
+            counts['created'] += sum(1 for r in results if r['status'] == 'created')
+            counts['updated'] += sum(1 for r in results if r['status'] == 'updated')
 
+            changed = [d for d in map(_changed_at, users) if d is not None]
+            if changed and (newest is None or max(changed) > newest):
+                newest = max(changed)
+
+        cursor.close()
+
+        # Lignes lues par user_id : le filigrane n'avance qu'une fois tout appliqué
+        # (une interruption reprend au filigrane précédent, sans rien perdre)
+        if newest is not None and (watermark is None or newest > watermark):
+            save_sync_state({'changed_at': newest.strftime('%Y-%m-%d %H:%M:%S')})
+
+        print(f"✅ {counts['users']} utilisateurs synchronisés depuis MySQL vers {DATA_FILE}")
+        print(f"   - {counts['created']} créés, {counts['updated']} mis à jour ({counts['batches']} lots)")
+        return counts
+
+    except Exception as e:
+        if mysql is not None and isinstance(e, mysql.connector.Error):
+            print(f"❌ Erreur MySQL: {e}")
+        else:
+            print(f"❌ Erreur: {e}")
+        return None
+    finally:
+        if own_connection and conn is not None:
+            conn.close()
+
+if __name__ == '__main__':
+    sync_users_from_mysql(full='--full' in sys.argv)
@@ -0,0 +1,97 @@
+"""
+Fixtures communes : chaque test travaille sur un dossier de données temporaire
+(data.json, journal, models/, catalogue compilé, matrices de features, base SQLite)
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ML_API_DIR = Path(__file__).resolve().parent.parent
+if str(ML_API_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_API_DIR))
+
+import catalog_cache
+import database
+import model_gc
+import model_registry
+import recipe_catalog
+import recipe_features
+import sqlite_backend
+
+def make_recipes(n: int = 60):
+    """Recettes synthétiques déterministes (ingrédients, cuisines, types et santé variés)"""
+    pool = ['olive oil', 'garlic', 'tomato', 'pasta', 'rice', 'chicken', 'beef', 'peanuts',
+            'milk', 'eggs', 'flour', 'sugar', 'basil', 'soy sauce', 'sesame oil', 'carrot',
+            'fish', 'butter', 'honey', 'potato']
+    cuisines = ['Italian', 'French', 'Asian', 'Indian', 'Mexican']
+    recipes = []
+    for i in range(n):
+        ingredients = [pool[(i * 7 + k * 3) % len(pool)] for k in range(3 + i % 4)]
+        recipes.append({
+            'id': i + 1,
+            'name': f'Recipe {i + 1}',
+            'description': 'd',
+            'ingredients': list(dict.fromkeys(ingredients)),
+            'steps': ['mix', 'cook'],
+            'prep_time': 5 + i % 20,
+            'cook_time': 10 + i % 40,
+            'servings': 2 + i % 4,
+            'calories': 200 + 13 * i,
+            'estimated_price': 3.0 + (i % 9),
+            'cuisine_type': cuisines[i % len(cuisines)],
+            'recipe_type': 'sweet' if i % 3 == 0 else 'savory',
+            'is_healthy': i % 2 == 0,
+        })
+    return recipes
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Redirige tous les fichiers de données vers un dossier temporaire (backend JSON)"""
+    models_dir = tmp_path / 'models'
+    monkeypatch.setattr(database, 'DB_BACKEND', 'json')
+    monkeypatch.setattr(database, 'DATA_FILE', tmp_path / 'data.json')
+    monkeypatch.setattr(database, 'JOURNAL_FILE', tmp_path / 'data.journal.ndjson')
+    monkeypatch.setattr(database, 'LOCK_FILE', tmp_path / 'data.json.lock')
+    monkeypatch.setattr(database, 'MODELS_DIR', models_dir)
+    monkeypatch.setattr(model_gc, 'MODELS_DIR', models_dir)
+    monkeypatch.setattr(model_registry, 'REGISTRY_FILE', models_dir / 'registry.json')
+    monkeypatch.setattr(model_registry, 'ACTIVE_DIR', models_dir / 'active')
+    monkeypatch.setattr(model_registry, '_registry_cache', None)
+    monkeypatch.setattr(model_registry, '_active_cache', {})
+    monkeypatch.setattr(recipe_catalog, 'CATALOG_DIR', tmp_path / 'catalog')
+    monkeypatch.setattr(recipe_catalog, '_catalog', None)
+    monkeypatch.setattr(recipe_features, 'FEATURE_MATRIX_DIR', tmp_path / 'feature_matrices')
+    monkeypatch.setattr(recipe_features, '_matrices', {})
+    monkeypatch.setattr(sqlite_backend, 'SQLITE_FILE', tmp_path / 'data.sqlite3')
+    database.invalidate_snapshot()
+    catalog_cache.invalidate_all()
+    yield tmp_path
+    database.invalidate_snapshot()
+    catalog_cache.invalidate_all()
+
+@pytest.fixture
+def sqlite_dir(data_dir, monkeypatch):
+    """Backend SQLite sur une base temporaire (connexion propre au test)"""
+    monkeypatch.setattr(database, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(sqlite_backend, '_local', threading.local())
+    yield data_dir
+    conn = getattr(sqlite_backend._local, 'conn', None)
+    if conn is not None:
+        conn.close()
+
+def write_data(path: Path, recipes=None, profiles=None, interactions=None):
+    """Écrit un data.json de départ"""
+    data = {
+        'recipes': recipes or [],
+        'user_profiles': profiles or [],
+        'interactions': interactions or [],
+        'ml_models': [],
+    }
+    with open(path / 'data.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    database.invalidate_snapshot()
+    return data
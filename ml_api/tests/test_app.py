@@ -0,0 +1,58 @@
+"""Routes Flask de l'API ML (sans modèle entraîné : chemins de repli)"""
+
+import pytest
+
+from conftest import make_recipes, write_data
+
+import database
+
+@pytest.fixture
+def client(data_dir):
+    import app
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
+
+def test_predict_profile_recommends_from_interactions(data_dir, client):
+    recipes = make_recipes(30)
+    write_data(data_dir, recipes=recipes)
+    # Trois interactions sur des recettes italiennes salées
+    liked = [r for r in recipes if r['cuisine_type'] == 'Italian' and r['recipe_type'] == 'savory'][:3]
+    database.append_interactions([
+        {'user_id': 7, 'recipe_template_id': r['id'], 'interaction_type': 'like'} for r in liked
+    ])
+
+    response = client.post('/api/ml/predict-profile', json={'userId': 7})
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['predictedPreferences']['preferredCuisines'] == ['Italian']
+    assert body['predictedPreferences']['preferredTypes'] == ['savory']
+    recommended = body['recommendedRecipes']
+    assert 0 < len(recommended) <= 5
+    assert all(r['cuisineType'] == 'Italian' and r['recipeType'] == 'savory' for r in recommended)
+
+def test_predict_profile_without_interactions(data_dir, client):
+    write_data(data_dir, recipes=make_recipes(10))
+
+    response = client.post('/api/ml/predict-profile', json={'userId': 99})
+
+    assert response.status_code == 200
+    assert response.get_json()['recommendedRecipes'] == []
+
+def test_generate_meal_fallback_missing_ingredients(data_dir, client):
+    recipes = make_recipes(10)
+    # Une seule recette salée (le fallback tire au sort parmi les meilleures)
+    for recipe in recipes:
+        recipe['recipe_type'] = 'sweet'
+    recipes[3]['recipe_type'] = 'savory'
+    recipes[3]['ingredients'] = ['2 cups cherry tomatoes', 'basil', 'pasta', 'olive oil']
+    write_data(data_dir, recipes=recipes)
+
+    response = client.post('/api/ml/generate-meal', json={
+        'recipeType': 'savory', 'availableIngredients': ['Tomatoes', 'Pasta', 'Basil leaves'],
+    })
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['name'] == 'Recipe 4'
+    assert body['missingIngredients'] == ['olive oil']
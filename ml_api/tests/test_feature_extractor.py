@@ -0,0 +1,80 @@
+"""Extraction groupée des features : mêmes lignes que l'extraction une par une"""
+
+import json
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from conftest import make_recipes, write_data
+from dataset_loader import load_recipe_catalog
+from feature_extractor import FeatureExtractor
+
+MODES = {
+    'vocabulary': {},
+    'canonical': {'canonicalize': True},
+    'hashing': {'hash_buckets': 32},
+}
+
+def _recipes():
+    recipes = make_recipes(25)
+    recipes[3]['ingredients'] = ['2 cups Tomatoes', 'tomato', 'Basil leaves']
+    recipes[4]['ingredients'] = json.dumps(['milk', 'Eggs'])  # Ancien format (JSON en texte)
+    del recipes[5]['calories']
+    return recipes
+
+@pytest.fixture(params=list(MODES))
+def extractor(request):
+    extractor = FeatureExtractor(**MODES[request.param])
+    recipes = _recipes()
+    extractor.build_vocabularies(recipes)
+    extractor.calculate_dataset_stats(recipes)
+    return extractor
+
+REQUESTS = [
+    (['chicken', 'garlic', 'unknown spice'], 'savory', 'Italian', True, ['peanuts', 'milk']),
+    ([], 'sweet', 'Martian', False, []),
+    (['Tomatoes', '2 cups tomato', 'eggs'], 'savory', 'asian', False, ['Eggs']),
+]
+
+def _dense(X):
+    return X.toarray() if sp.issparse(X) else np.asarray(X)
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_request_batch_equals_single(extractor, sparse):
+    expected = np.array([extractor.extract_user_request_features(*request) for request in REQUESTS])
+
+    batch = extractor.extract_user_request_features_batch(*map(list, zip(*REQUESTS)), sparse=sparse)
+
+    assert sp.issparse(batch) == sparse
+    assert batch.shape == (len(REQUESTS), extractor.request_feature_size())
+    np.testing.assert_allclose(_dense(batch), expected, rtol=1e-6)
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_recipe_batch_equals_single(extractor, sparse):
+    recipes = _recipes()
+    expected = np.array([extractor.extract_recipe_features(recipe) for recipe in recipes])
+
+    batch = extractor.extract_recipe_features_batch(recipes, sparse=sparse)
+
+    assert sp.issparse(batch) == sparse
+    np.testing.assert_allclose(_dense(batch), expected, rtol=1e-6, atol=1e-7)
+
+def test_catalog_features_equal_single(data_dir, extractor):
+    write_data(data_dir, recipes=_recipes())
+    catalog = load_recipe_catalog()
+    expected = np.array([extractor.extract_recipe_features(catalog.recipe(i)) for i in range(len(catalog))])
+
+    np.testing.assert_allclose(
+        _dense(extractor.extract_recipe_features_from_catalog(catalog, sparse=True)), expected, rtol=1e-6, atol=1e-7
+    )
+    np.testing.assert_allclose(extractor.extract_recipe_features_from_catalog(catalog), expected, rtol=1e-6, atol=1e-7)
+
+def test_saved_state_gives_same_features(extractor):
+    restored = FeatureExtractor.from_dict(json.loads(json.dumps(extractor.to_dict())))
+
+    for request in REQUESTS:
+        assert restored.extract_user_request_features(*request) == extractor.extract_user_request_features(*request)
+    np.testing.assert_array_equal(
+        restored.extract_recipe_features_batch(_recipes()), extractor.extract_recipe_features_batch(_recipes())
+    )
@@ -0,0 +1,113 @@
+"""Mode hashing : colonnes signées stables d'un processus à l'autre et conservées à l'enregistrement"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from conftest import ML_API_DIR, make_recipes
+from feature_extractor import FeatureExtractor, hashed_column
+
+KEYS = ['tomato', 'olive oil', 'crème fraîche', 'soy sauce', '', 'ingrédient 日本']
+
+# Valeurs de référence : un changement de hash rendrait les modèles enregistrés inutilisables
+PINNED = {('tomato', 1024): (313, -1.0), ('olive oil', 1024): (532, -1.0), ('crème fraîche', 7): (4, -1.0)}
+
+REQUESTS = [
+    (['chicken', 'garlic', 'unknown spice'], 'savory', 'Italian', True, ['peanuts', 'milk']),
+    ([], 'sweet', 'Martian', False, []),
+    (['Tomatoes', 'tomato', 'eggs', 'saffron', 'yuzu'], 'savory', 'asian', False, ['Eggs']),
+]
+
+def _run(code, **env):
+    """Exécute `code` dans un nouvel interpréteur et renvoie sa sortie JSON"""
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=ML_API_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, **env},
+    )
+    return json.loads(result.stdout)
+
+def _extractor(buckets):
+    extractor = FeatureExtractor(hash_buckets=buckets)
+    recipes = make_recipes(30)
+    extractor.build_vocabularies(recipes)
+    extractor.calculate_dataset_stats(recipes)
+    return extractor
+
+def test_hashed_column_pinned_values():
+    for (key, buckets), expected in PINNED.items():
+        assert hashed_column(key, buckets) == expected
+
+def test_hashed_column_signed_and_in_range():
+    columns = [hashed_column(f'ingredient {i}', 16) for i in range(500)]
+
+    assert {column for column, _ in columns} == set(range(16))
+    signs = [sign for _, sign in columns]
+    assert set(signs) == {-1.0, 1.0}
+    assert abs(sum(signs)) < 100
+
+@pytest.mark.parametrize('seed', ['0', '1', 'random'])
+def test_hashed_column_stable_across_processes(seed):
+    code = (
+        'import json; from feature_extractor import hashed_column; '
+        f'print(json.dumps([hashed_column(k, b) for k in {KEYS!r} for b in (7, 1024, 2 ** 20)]))'
+    )
+
+    columns = _run(code, PYTHONHASHSEED=seed)
+
+    assert [tuple(c) for c in columns] == [hashed_column(k, b) for k in KEYS for b in (7, 1024, 2 ** 20)]
+
+def test_env_hash_buckets_features_match_across_processes():
+    code = (
+        'import json; from conftest import make_recipes; from feature_extractor import FeatureExtractor; '
+        'e = FeatureExtractor(); r = make_recipes(30); e.build_vocabularies(r); e.calculate_dataset_stats(r); '
+        f'print(json.dumps([e.hash_buckets, [e.extract_user_request_features(*q) for q in {REQUESTS!r}]]))'
+    )
+
+    buckets, rows = _run(code, ML_FEATURE_HASH_BUCKETS='8', PYTHONHASHSEED='123', PYTHONPATH=str(ML_API_DIR / 'tests'))
+
+    assert buckets == 8
+    extractor = _extractor(8)
+    np.testing.assert_array_equal(rows, [extractor.extract_user_request_features(*q) for q in REQUESTS])
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_batch_equals_single_with_collisions(sparse):
+    # 4 colonnes pour une vingtaine d'ingrédients : les collisions s'additionnent de la même façon
+    extractor = _extractor(4)
+    recipes = make_recipes(30)
+    assert extractor.ingredient_width() == 4
+
+    requests = extractor.extract_user_request_features_batch(*map(list, zip(*REQUESTS)), sparse=sparse)
+    features = extractor.extract_recipe_features_batch(recipes, sparse=sparse)
+
+    assert sp.issparse(requests) == sparse and requests.shape[1] == extractor.request_feature_size()
+    np.testing.assert_array_equal(
+        requests.toarray() if sparse else requests,
+        [extractor.extract_user_request_features(*q) for q in REQUESTS],
+    )
+    np.testing.assert_allclose(
+        features.toarray() if sparse else features,
+        [extractor.extract_recipe_features(r) for r in recipes], rtol=1e-6, atol=1e-7,
+    )
+
+def test_saved_extractor_keeps_buckets_and_features(tmp_path):
+    extractor = _extractor(64)
+    extractor.save_to_dir(str(tmp_path))
+
+    restored = FeatureExtractor.load_from_dir(str(tmp_path))
+
+    assert restored.hash_buckets == 64
+    assert restored.ingredient_vocabulary == {}
+    assert json.loads((tmp_path / 'features.json').read_text(encoding='utf-8'))['ingredients'] == []
+    assert restored.request_feature_size() == extractor.request_feature_size()
+    # Ingrédients inconnus à l'entraînement compris : même colonne après rechargement
+    for request in REQUESTS:
+        assert restored.extract_user_request_features(*request) == extractor.extract_user_request_features(*request)
+    np.testing.assert_array_equal(
+        restored.extract_recipe_features_batch(make_recipes(30), sparse=True).toarray(),
+        extractor.extract_recipe_features_batch(make_recipes(30), sparse=True).toarray(),
+    )
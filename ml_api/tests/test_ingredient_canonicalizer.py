@@ -0,0 +1,48 @@
+"""Canonicalisation des ingrédients et ingrédients manquants"""
+
+import pytest
+
+from conftest import write_data
+from dataset_loader import load_recipe_catalog
+from ingredient_canonicalizer import canonical_name
+
+@pytest.mark.parametrize('text, expected', [
+    ('2 cups Tomatoes', 'tomato'),
+    ('200g sugar', 'sugar'),
+    ('1/2 tsp salt', 'salt'),
+    ('2 1/2 cups of flour', 'flour'),
+    ('3 eggs', 'egg'),
+    ('Scallions', 'green onion'),
+    # Nombres qui font partie du nom
+    ('5 spice powder', '5 spice powder'),
+    ('5-spice powder', '5 spice powder'),
+    ('00 flour', '00 flour'),
+    ('12', '12'),
+])
+def test_canonical_name(text, expected):
+    assert canonical_name(text) == expected
+
+@pytest.fixture
+def canonical(data_dir):
+    recipes = [
+        {'id': 1, 'name': 'Salad', 'ingredients': ['cherry tomatoes', 'chicken', 'olive oil', '5 spice powder'],
+         'recipe_type': 'savory', 'cuisine_type': 'Asian'},
+        {'id': 2, 'name': 'Pasta', 'ingredients': ['pasta', 'tomato', 'basil', 'garlic'],
+         'recipe_type': 'savory', 'cuisine_type': 'Italian'},
+    ]
+    write_data(data_dir, recipes=recipes)
+    return load_recipe_catalog().canonical_ingredients()
+
+def test_missing_ingredients_by_canonical_containment(canonical):
+    ingredients = ['cherry tomatoes', 'chicken', 'olive oil', '5 spice powder']
+
+    # "Tomatoes" couvre "cherry tomatoes", "chicken breast" couvre "chicken"
+    missing = canonical.missing(ingredients, ['Tomatoes', 'chicken breast', 'salt'])
+
+    assert missing == ['olive oil', '5 spice powder']
+
+def test_matching_ids_are_word_prefixes(canonical):
+    names = {canonical.dictionary.names[i] for i in canonical.matching_ids(['tom', 'oil', ''])}
+
+    assert names == {'cherry tomato', 'tomato', 'olive oil'}
+    assert canonical.matching_ids([]) == set()
@@ -0,0 +1,142 @@
+"""Ingestion incrémentale du dataset (init_data.py) : upsert par id, idempotent"""
+
+import json
+
+import pytest
+
+import database
+import init_data
+from conftest import make_recipes, write_data
+
+def _raw(recipes):
+    """Recettes au format du dataset (noms de champs camelCase)"""
+    return [{
+        'id': r['id'], 'name': r['name'], 'ingredients': r['ingredients'], 'steps': r['steps'],
+        'prepTime': r['prep_time'], 'cookTime': r['cook_time'], 'calories': r['calories'],
+        'cuisine': r['cuisine_type'], 'recipeType': r['recipe_type'], 'isHealthy': r['is_healthy'],
+    } for r in recipes]
+
+def _write_dataset(path, recipes, fmt='array'):
+    with open(path, 'w', encoding='utf-8') as f:
+        if fmt == 'ndjson':
+            f.write('\n'.join(json.dumps(r) for r in recipes) + '\n')
+        elif fmt == 'wrapper':
+            json.dump({'recipes': recipes}, f, indent=2)
+        else:
+            json.dump(recipes, f)
+    return path
+
+@pytest.fixture
+def dataset(data_dir, monkeypatch):
+    monkeypatch.setattr(init_data, 'DATA_FILE', database.DATA_FILE)
+    write_data(
+        data_dir,
+        profiles=[{'user_id': 1, 'email': 'a@x'}],
+        interactions=[{'user_id': 1, 'recipe_template_id': 2, 'interaction_type': 'like'}],
+    )
+    return _write_dataset(data_dir / 'dataset.json', _raw(make_recipes(8)))
+
+def test_second_ingestion_changes_nothing(data_dir, dataset):
+    first = init_data.ingest_recipes(dataset)
+    content = database.DATA_FILE.read_bytes()
+    mtime = database.DATA_FILE.stat().st_mtime_ns
+    database.invalidate_snapshot()
+    version = database.catalog_version()
+
+    second = init_data.ingest_recipes(dataset)
+
+    assert first == {'inserted': 8, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'skipped': 0, 'duplicates': 0}
+    assert second == {'inserted': 0, 'updated': 0, 'unchanged': 8, 'deleted': 0, 'skipped': 0, 'duplicates': 0}
+    assert database.DATA_FILE.read_bytes() == content
+    assert database.DATA_FILE.stat().st_mtime_ns == mtime
+    assert database.catalog_version() == version
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'wrapper'])
+def test_dataset_formats_are_equivalent(data_dir, dataset, fmt):
+    init_data.ingest_recipes(dataset)
+    other = _write_dataset(data_dir / f'dataset.{fmt}', _raw(make_recipes(8)), fmt)
+
+    assert init_data.ingest_recipes(other)['unchanged'] == 8
+
+def test_update_insert_and_prune_keep_other_sections(data_dir, dataset):
+    init_data.ingest_recipes(dataset)
+    raw = _raw(make_recipes(8))
+    raw[2]['name'] = 'Renamed'
+    raw.pop(5)
+    raw.append({'id': 100, 'name': 'New'})
+    raw.append({'name': 'No id'})
+    changed = _write_dataset(data_dir / 'changed.ndjson', raw, 'ndjson')
+
+    counts = init_data.ingest_recipes(changed)
+
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 6, 'deleted': 1, 'skipped': 1, 'duplicates': 0}
+    database.invalidate_snapshot()
+    data = database.load_data()
+    recipes = {r['id']: r for r in data['recipes']}
+    assert sorted(recipes) == [1, 2, 3, 4, 5, 7, 8, 100]
+    assert recipes[3]['name'] == 'Renamed'
+    assert recipes[100]['cuisine_type'] == 'Other'
+    assert data['user_profiles'] == [{'user_id': 1, 'email': 'a@x'}]
+    assert len(data['interactions']) == 1
+
+    # Même fichier une seconde fois : plus rien à faire
+    assert init_data.ingest_recipes(changed)['unchanged'] == 8
+
+def test_later_duplicate_restoring_original_cancels_update(data_dir, dataset):
+    init_data.ingest_recipes(dataset)
+    raw = _raw(make_recipes(8))
+    modified = dict(raw[0], name='Temporary')
+    _write_dataset(data_dir / 'dup.ndjson', [modified] + raw, 'ndjson')
+    content = database.DATA_FILE.read_bytes()
+
+    counts = init_data.ingest_recipes(data_dir / 'dup.ndjson')
+
+    assert counts['updated'] == 0
+    assert database.DATA_FILE.read_bytes() == content
+
+def test_keep_missing_keeps_recipes_absent_from_dataset(data_dir, dataset):
+    init_data.ingest_recipes(dataset)
+    raw = _raw(make_recipes(8))[:3]
+    partial = _write_dataset(data_dir / 'partial.json', raw)
+    content = database.DATA_FILE.read_bytes()
+
+    counts = init_data.ingest_recipes(partial, prune=False)
+
+    assert counts['deleted'] == 0 and counts['unchanged'] == 3
+    assert database.DATA_FILE.read_bytes() == content
+
+    # Par défaut, le catalogue est remplacé par le dataset (comme l'ancien script)
+    assert init_data.ingest_recipes(partial)['deleted'] == 5
+    database.invalidate_snapshot()
+    assert [r['id'] for r in database.load_data()['recipes']] == [1, 2, 3]
+
+def test_duplicate_ids_in_data_json_are_collapsed(data_dir, dataset):
+    recipes = [init_data.normalize_recipe(r) for r in _raw(make_recipes(4))]
+    stale = dict(recipes[1], name='Stale copy')
+    write_data(data_dir, recipes=recipes[:2] + [stale] + recipes[2:] + [dict(recipes[3])])
+    unchanged = _write_dataset(data_dir / 'same.json', _raw(make_recipes(4)))
+
+    counts = init_data.ingest_recipes(unchanged)
+
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 4, 'deleted': 0, 'skipped': 0, 'duplicates': 2}
+    database.invalidate_snapshot()
+    stored = database.load_data()['recipes']
+    assert stored == recipes
+    # Plus de doublon : la seconde ingestion ne réécrit rien
+    content = database.DATA_FILE.read_bytes()
+    assert init_data.ingest_recipes(unchanged)['duplicates'] == 0
+    assert database.DATA_FILE.read_bytes() == content
+
+def test_update_of_duplicated_id_written_once(data_dir, dataset):
+    recipes = [init_data.normalize_recipe(r) for r in _raw(make_recipes(3))]
+    write_data(data_dir, recipes=recipes + [dict(recipes[0])])
+    raw = _raw(make_recipes(3))
+    raw[0]['name'] = 'Renamed'
+
+    counts = init_data.ingest_recipes(_write_dataset(data_dir / 'renamed.json', raw))
+
+    assert (counts['updated'], counts['duplicates']) == (1, 1)
+    database.invalidate_snapshot()
+    stored = database.load_data()['recipes']
+    assert [r['id'] for r in stored] == [1, 2, 3]
+    assert stored[0]['name'] == 'Renamed'
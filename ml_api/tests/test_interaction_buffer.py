@@ -0,0 +1,160 @@
+"""Tampon des interactions : écriture groupée, file bornée, nouvelles tentatives"""
+
+import threading
+import time
+
+import pytest
+
+import database
+import interaction_buffer
+from conftest import write_data
+from interaction_buffer import BufferFullError, InteractionBuffer
+
+def _events(n, user_id=1):
+    return [{'user_id': user_id, 'recipe_template_id': i, 'interaction_type': 'view'} for i in range(n)]
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "délai dépassé"
+        time.sleep(0.01)
+
+class FlakyWriter:
+    """Écrit les lots dans une liste après `failures` échecs"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('disque plein')
+        self.batches.append(list(batch))
+
+@pytest.fixture
+def journal_appends(data_dir, monkeypatch):
+    """Nombre d'ajouts au journal (un par écriture de lot)"""
+    write_data(data_dir)
+    appends = []
+    append_journal = database._append_journal
+
+    def counting_append(entries):
+        appends.append(len(entries))
+        return append_journal(entries)
+
+    monkeypatch.setattr(database, '_append_journal', counting_append)
+    return appends
+
+def test_events_grouped_in_one_journal_append(journal_appends):
+    buffer = InteractionBuffer(writer=database.append_interactions, flush_interval_ms=10000, flush_max_events=1000)
+    for event in _events(20):
+        buffer.submit([event])
+
+    assert buffer.flush()
+
+    assert journal_appends == [20]
+    assert buffer.stats['batches'] == 1 and buffer.stats['written'] == 20
+    assert buffer.flush_max_events == 1000
+    database.invalidate_snapshot()
+    assert [i['recipe_template_id'] for i in database.load_data()['interactions']] == list(range(20))
+    buffer.close()
+
+def test_batch_size_triggers_write_without_waiting(journal_appends):
+    buffer = InteractionBuffer(writer=database.append_interactions, flush_interval_ms=10000, flush_max_events=5)
+
+    buffer.submit(_events(5))
+
+    _wait(lambda: buffer.stats['written'] == 5)
+    assert journal_appends == [5]
+    buffer.close()
+
+def test_full_queue_rejects_whole_batch():
+    release = threading.Event()
+    buffer = InteractionBuffer(writer=lambda batch: release.wait(5), flush_interval_ms=1, max_pending=3)
+    buffer.submit(_events(2))
+
+    with pytest.raises(BufferFullError):
+        buffer.submit(_events(2))
+    assert buffer.stats['rejected'] == 2
+    buffer.submit(_events(1))
+
+    release.set()
+    assert buffer.flush()
+    assert buffer.stats['written'] == 3
+    buffer.close()
+
+def test_failed_write_retried_in_order():
+    writer = FlakyWriter(failures=2)
+    buffer = InteractionBuffer(writer=writer, flush_interval_ms=5)
+    buffer.submit(_events(3))
+    buffer.submit(_events(2, user_id=2))
+
+    assert buffer.flush()
+
+    assert [(e['user_id'], e['recipe_template_id']) for batch in writer.batches for e in batch] == \
+        [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1)]
+    assert buffer.stats['errors'] == 2
+    buffer.close()
+
+def test_close_writes_pending_events():
+    writer = FlakyWriter()
+    buffer = InteractionBuffer(writer=writer, flush_interval_ms=10000, flush_max_events=1000)
+    buffer.submit(_events(7))
+
+    buffer.close()
+
+    assert sum(len(batch) for batch in writer.batches) == 7
+    assert buffer.pending() == 0 and buffer.stats['dropped'] == 0
+    with pytest.raises(BufferFullError):
+        buffer.submit(_events(1))
+
+def test_close_retries_failed_final_write():
+    writer = FlakyWriter(failures=1)
+    buffer = InteractionBuffer(writer=writer, flush_interval_ms=10000, flush_max_events=1000)
+    buffer.submit(_events(4))
+
+    buffer.close(timeout=5)
+
+    assert sum(len(batch) for batch in writer.batches) == 4
+    assert buffer.stats['dropped'] == 0
+
+def test_close_reports_dropped_events(capsys):
+    buffer = InteractionBuffer(writer=FlakyWriter(failures=10 ** 6), flush_interval_ms=5)
+    buffer.submit(_events(4))
+
+    buffer.close(timeout=0.3)
+
+    assert buffer.stats['dropped'] == 4
+    assert '4 interactions perdues' in capsys.readouterr().out
+
+@pytest.fixture
+def client(data_dir, monkeypatch):
+    import app
+    app.app.config['TESTING'] = True
+    release = threading.Event()
+    buffer = InteractionBuffer(writer=lambda batch: release.wait(5), flush_interval_ms=1, max_pending=3)
+    monkeypatch.setattr(interaction_buffer, '_buffer', buffer)
+    yield app.app.test_client(), buffer
+    release.set()
+    buffer.close()
+
+def test_endpoint_answers_429_when_queue_full(client):
+    client, buffer = client
+    event = {'userId': 1, 'recipeTemplateId': 3, 'interactionType': 'like'}
+
+    accepted = client.post('/api/ml/interactions', json={'events': [event, event, event]})
+    rejected = client.post('/api/ml/interactions', json=event)
+
+    assert accepted.status_code == 202 and accepted.get_json()['accepted'] == 3
+    assert rejected.status_code == 429
+    assert rejected.headers['Retry-After'] == '1'
+    assert buffer.stats['rejected'] == 1
+
+def test_endpoint_rejects_invalid_events(client):
+    client, buffer = client
+
+    response = client.post('/api/ml/interactions', json={'events': []})
+
+    assert response.status_code == 400
+    assert buffer.stats['accepted'] == 0
@@ -0,0 +1,83 @@
+"""Journal des profils et interactions : relecture, compaction, upserts (JSON et SQLite)"""
+
+import json
+
+import database
+
+from conftest import write_data
+
+def _profile(user_id, email=None, **fields):
+    profile = {'user_id': user_id, 'email': email, 'age': None, 'gender': None,
+               'activity_level': None, 'dietary_preference': 'normal',
+               'allergies': [], 'health_conditions': []}
+    profile.update(fields)
+    return profile
+
+def test_journal_replay_matches_compacted_file(data_dir):
+    write_data(data_dir, profiles=[_profile(1, 'a@x')])
+    database.upsert_user_profile(_profile(2, 'b@x', age=30))
+    database.upsert_user_profile(_profile(1, 'a@x', dietary_preference='vegan'))
+    database.append_interactions([
+        {'user_id': 1, 'recipe_template_id': 5, 'interaction_type': 'like'},
+        {'user_id': 2, 'recipe_template_id': 6, 'interaction_type': 'view'},
+    ])
+    replayed = database.load_data()
+
+    folded = database.compact_journal()
+
+    assert folded == 4
+    with open(data_dir / 'data.json', 'r', encoding='utf-8') as f:
+        compacted = json.load(f)
+    assert compacted['user_profiles'] == replayed['user_profiles']
+    assert compacted['interactions'] == replayed['interactions']
+    # Le journal ne contient plus qu'un point de reprise, la séquence continue après
+    lines = (data_dir / 'data.journal.ndjson').read_text().splitlines()
+    assert [json.loads(line)['op'] for line in lines] == ['checkpoint']
+    assert database._append_journal([('add_interaction', {'user_id': 3})]) == compacted['_journal_seq'] + 1
+    assert database.load_user_profile(1)['dietary_preference'] == 'vegan'
+    assert len(database.load_user_interactions(1)) == 1
+
+def test_incomplete_last_journal_line_is_ignored(data_dir):
+    write_data(data_dir)
+    database.upsert_user_profile(_profile(1, 'a@x'))
+    with open(data_dir / 'data.journal.ndjson', 'ab') as f:
+        f.write(b'{"seq": 2, "op": "upsert_profile", "record": {"user_id": 2')
+    database.invalidate_snapshot()
+
+    assert database.load_user_profile(2) is None
+    # L'écriture suivante ne se colle pas à la ligne incomplète
+    database.upsert_user_profile(_profile(3, 'c@x'))
+    assert database.load_user_profile(3)['email'] == 'c@x'
+    assert database.load_user_profile(1)['email'] == 'a@x'
+
+def test_resync_without_email_keeps_stored_email(data_dir):
+    write_data(data_dir, profiles=[_profile(1, 'a@x')])
+
+    database.upsert_user_profile(_profile(1, None, age=41))
+    results = database.upsert_user_profiles([_profile(1, None, gender='female'), _profile(2, None)])
+
+    profile = database.load_user_profile(1)
+    assert profile['email'] == 'a@x'
+    assert profile['age'] is None  # Champs du profil remplacés, comme la synchronisation d'origine
+    assert profile['gender'] == 'female'
+    assert [r['status'] for r in results] == ['updated', 'created']
+    database.compact_journal()
+    assert database.load_user_profile(1)['email'] == 'a@x'
+
+def test_legacy_journal_entry_with_null_email_keeps_email(data_dir):
+    write_data(data_dir, profiles=[_profile(1, 'a@x')])
+    record = {'seq': 1, 'op': 'upsert_profile', 'record': _profile(1, None, age=20)}
+    (data_dir / 'data.journal.ndjson').write_text(json.dumps(record) + '\n')
+    database.invalidate_snapshot()
+
+    assert database.load_user_profile(1)['email'] == 'a@x'
+    assert database.load_user_profile(1)['age'] == 20
+
+def test_sqlite_resync_without_email_keeps_stored_email(sqlite_dir):
+    database.upsert_user_profiles([_profile(1, 'a@x', age=30)])
+
+    database.upsert_user_profile(_profile(1, None, age=31))
+
+    profile = database.load_user_profile(1)
+    assert profile['email'] == 'a@x'
+    assert profile['age'] == 31
@@ -0,0 +1,139 @@
+"""Lecture par sections de data.json : mêmes valeurs que json.load, erreurs nettes sinon"""
+
+import json
+
+import pytest
+
+import json_sections
+from json_sections import JsonSections, index_sections, iter_array, iter_decoded
+
+TRICKY = [
+    {'id': 1, 'name': 'Guillemet \" et barre \\', 'steps': ['a\\', '\\\\', '\\"]}', '"']},
+    {'id': 2, 'name': 'Crochets [ ] { } et virgules , : dans une chaîne', 'nested': [[1, [2, [3, []]]], {}]},
+    {'id': 3, 'name': 'Crème brûlée 🍮 – 日本語 – é́', 'price': -2500.0, 'flags': [True, False, None]},
+    {'id': 4, 'text': 'é' * 50 + '€' * 50 + '🍮' * 50, 'values': [1e-7, 12345678901234567890, -0.0]},
+    {'id': 5, 'empty': '', 'deep': {'a': {'b': {'c': ['}', ']', '{', '[']}}}},
+]
+
+DATA = {
+    'recipes': TRICKY,
+    'user_profiles': [{'user_id': 1, 'email': 'a"b@c.d', 'allergies': ['peanuts']}],
+    'interactions': [],
+    'ml_models': [{'id': 1, 'model_data': 'QUJD' * 500}],
+    'scalar': 42,
+    'flag': False,
+    'label': 'fin }]',
+}
+
+def _write(path, data, **dump_kwargs):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_kwargs)
+    return path
+
+@pytest.mark.parametrize('dump_kwargs', [
+    {'ensure_ascii': False},
+    {'ensure_ascii': True},
+    {'ensure_ascii': False, 'indent': 2},
+    {'ensure_ascii': False, 'separators': (',', ':')},
+])
+def test_sections_equal_json_load(tmp_path, dump_kwargs):
+    path = _write(tmp_path / 'data.json', DATA, **dump_kwargs)
+    with open(path, encoding='utf-8') as f:
+        expected = json.load(f)
+
+    sections = JsonSections(path)
+    try:
+        assert set(sections.sections) == set(expected)
+        for name, value in expected.items():
+            assert sections.load(name) == value
+        # Éléments repérés sans décodage, puis décodés un à un
+        assert [json.loads(sections.slice(s, e)) for s, e in sections.iter_items('recipes')] == expected['recipes']
+        decoded = list(sections.iter_decoded('recipes'))
+        assert [value for _, _, value in decoded] == expected['recipes']
+        assert [json.loads(sections.slice(s, e)) for s, e, _ in decoded] == expected['recipes']
+    finally:
+        sections.close()
+
+def test_missing_section_and_empty_file(tmp_path):
+    sections = JsonSections(_write(tmp_path / 'data.json', {'recipes': []}))
+    assert 'user_profiles' not in sections
+    assert sections.load('user_profiles', []) == []
+    assert sections.raw('user_profiles') is None
+    assert list(sections.iter_items('user_profiles')) == []
+    assert list(sections.iter_decoded('user_profiles')) == []
+    sections.close()
+
+    (tmp_path / 'empty.json').write_bytes(b'')
+    empty = JsonSections(tmp_path / 'empty.json')
+    assert empty.load('recipes', []) == []
+    empty.close()
+
+@pytest.mark.parametrize('window', [1, 2, 3, 5, 7, 16, 64])
+def test_multibyte_characters_split_across_windows(monkeypatch, window):
+    monkeypatch.setattr(json_sections, '_WINDOW', window)
+    buf = json.dumps(TRICKY, ensure_ascii=False).encode('utf-8')
+
+    decoded = list(iter_decoded(buf, 0, array=True))
+
+    assert [value for _, _, value in decoded] == TRICKY
+    assert [json.loads(buf[s:e]) for s, e, _ in decoded] == TRICKY
+
+@pytest.mark.parametrize('window', [3, 64])
+def test_ndjson_values(monkeypatch, window):
+    monkeypatch.setattr(json_sections, '_WINDOW', window)
+    buf = '\n'.join(json.dumps(r, ensure_ascii=False) for r in TRICKY).encode('utf-8') + b'\n7'
+
+    assert [value for _, _, value in iter_decoded(buf)] == TRICKY + [7]
+
+def test_nested_arrays_skipped_whole():
+    buf = json.dumps([[[1, [2]], '[', ']'], [], [[[]]], '"]', {'a': [1, {'b': '}'}]}]).encode('utf-8')
+
+    assert [json.loads(buf[s:e]) for s, e in iter_array(buf, 0)] == json.loads(buf)
+
+@pytest.mark.parametrize('window', [4, 1 << 22])
+def test_truncated_input_raises_instead_of_wrong_value(monkeypatch, window):
+    monkeypatch.setattr(json_sections, '_WINDOW', window)
+    buf = json.dumps(DATA, ensure_ascii=False).encode('utf-8')
+    array = json.dumps([1, -25, 'x"]', [2, [3]], {'a': 1}, 2500.0, 'é🍮', None], ensure_ascii=False).encode('utf-8')
+    expected = json.loads(array)
+
+    for cut in range(len(buf)):
+        with pytest.raises(ValueError):
+            index_sections(buf[:cut] or b' ')
+
+    for cut in range(1, len(array)):
+        # Les valeurs déjà lues sont exactes ; la suite se termine par une erreur
+        values = []
+        with pytest.raises(ValueError):
+            for _, _, value in iter_decoded(array[:cut], 0, array=True):
+                values.append(value)
+        assert values == expected[:len(values)]
+
+@pytest.mark.parametrize('corrupt', [
+    b'{"recipes": [1, 2}',
+    b'{"recipes": "abc}',
+    b'{"recipes" [1]}',
+    b'{"recipes": [1] "x": 2}',
+    b'{recipes: []}',
+    b'["recipes"]',
+])
+def test_corrupt_input_raises(tmp_path, corrupt):
+    (tmp_path / 'data.json').write_bytes(corrupt)
+
+    with pytest.raises(ValueError):
+        JsonSections(tmp_path / 'data.json')
+
+def test_corrupt_element_raises_on_decode(tmp_path):
+    (tmp_path / 'data.json').write_bytes(b'{"recipes": [{"id": 1}, {"id": tru}], "scalar": nul}')
+    sections = JsonSections(tmp_path / 'data.json')
+
+    with pytest.raises(ValueError):
+        sections.load('recipes')
+    with pytest.raises(ValueError):
+        sections.load('scalar')
+    values = []
+    with pytest.raises(ValueError):
+        for _, _, value in sections.iter_decoded('recipes'):
+            values.append(value)
+    assert values == [{'id': 1}]
+    sections.close()
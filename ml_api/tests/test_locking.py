@@ -0,0 +1,61 @@
+"""Écritures concurrentes entre processus (verrou fcntl + remplacement atomique)"""
+
+import multiprocessing
+
+import pytest
+
+import database
+from conftest import write_data
+
+fcntl = pytest.importorskip('fcntl')
+
+WORKERS = 4
+ROUNDS = 25
+
+def _increment(rounds):
+    # Lecture-modification-écriture : sans verrou, des incréments seraient perdus
+    for _ in range(rounds):
+        with database.transaction() as data:
+            data['counter'] = data.get('counter', 0) + 1
+
+def _append(worker, rounds):
+    for i in range(rounds):
+        database.append_interactions([
+            {'user_id': worker, 'recipe_template_id': i, 'interaction_type': 'view'}
+        ])
+
+def _run(target, args_list):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=target, args=args) for args in args_list]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert all(process.exitcode == 0 for process in processes)
+
+def test_transactions_from_several_processes_lose_no_update(data_dir):
+    write_data(data_dir)
+
+    _run(_increment, [(ROUNDS,)] * WORKERS)
+
+    database.invalidate_snapshot()
+    assert database.load_data()['counter'] == WORKERS * ROUNDS
+    # Aucun fichier temporaire abandonné
+    assert not list(data_dir.glob('*.tmp'))
+
+def test_journal_appends_and_compaction_from_several_processes(data_dir):
+    write_data(data_dir)
+
+    # Un processus replie le journal pendant que les autres y ajoutent des entrées
+    context = multiprocessing.get_context('fork')
+    compactor = context.Process(target=lambda: [database.compact_journal() for _ in range(10)])
+    compactor.start()
+    _run(_append, [(worker, ROUNDS) for worker in range(WORKERS)])
+    compactor.join(60)
+    assert compactor.exitcode == 0
+
+    database.invalidate_snapshot()
+    interactions = database.load_data()['interactions']
+    assert len(interactions) == WORKERS * ROUNDS
+    for worker in range(WORKERS):
+        assert [i['recipe_template_id'] for i in interactions if i['user_id'] == worker] == list(range(ROUNDS))
@@ -0,0 +1,116 @@
+"""Archives de modèles adressées par contenu (models/<sha256>.zip), backends JSON et SQLite"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+import database
+from conftest import write_data
+
+FILES = {
+    'saved_model.pb': bytes(range(256)) * 40,
+    'variables/variables.data-00000-of-00001': os.urandom(4096),
+    'variables/variables.index': b'\x00\x01index',
+    'features.json': json.dumps({'ingredients': ['crème', 'tomato'], 'hashBuckets': 0}).encode('utf-8'),
+}
+
+def _archive(files=FILES) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for name, content in files.items():
+            zipf.writestr(name, content)
+    return buffer.getvalue()
+
+def _extracted(directory):
+    return {
+        os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/'):
+            open(os.path.join(root, name), 'rb').read()
+        for root, _, names in os.walk(directory) for name in names
+    }
+
+def _blobs():
+    return sorted(p.name for p in database.MODELS_DIR.iterdir() if p.is_file() and p.name != 'registry.json')
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request, data_dir):
+    if request.param == 'sqlite':
+        request.getfixturevalue('sqlite_dir')
+    else:
+        write_data(data_dir)
+    return request.param
+
+def test_same_bytes_stored_once(data_dir):
+    archive = _archive()
+    expected = hashlib.sha256(archive).hexdigest()
+
+    first = database.store_model_blob(archive)
+    blob = database.MODELS_DIR / f'{expected}.zip'
+    os.utime(blob, (1, 1))
+    second = database.store_model_blob(archive)
+
+    assert first == second == (expected, len(archive))
+    assert _blobs() == [f'{expected}.zip']
+    assert blob.read_bytes() == archive
+    # Archive rajeunie : pas supprimée comme orpheline avant son enregistrement
+    assert blob.stat().st_mtime > 1
+
+def test_different_bytes_stored_apart(data_dir):
+    first, _ = database.store_model_blob(_archive())
+    second, _ = database.store_model_blob(_archive({'saved_model.pb': b'autre'}))
+
+    assert first != second
+    assert _blobs() == sorted([f'{first}.zip', f'{second}.zip'])
+
+def test_versions_with_same_archive_share_one_blob(backend):
+    archive = _archive()
+
+    first_id = database.save_model_to_db('recipe_classification', 'classification', 'v1', archive, {})
+    second_id = database.save_model_to_db('recipe_classification', 'classification', 'v2', archive, {})
+
+    first = database.load_model_from_db('recipe_classification', 'v1')
+    second = database.load_model_from_db('recipe_classification', 'v2')
+    assert first_id != second_id
+    assert first['model_sha256'] == second['model_sha256'] == hashlib.sha256(archive).hexdigest()
+    assert first['model_size'] == len(archive)
+    assert _blobs() == [f"{first['model_sha256']}.zip"]
+
+def test_stored_archive_round_trip(backend, tmp_path):
+    archive = _archive()
+    database.save_model_to_db('recipe_classification', 'classification', 'v1', archive, {'accuracy': 0.5})
+
+    entry = database.load_model_from_db('recipe_classification', 'v1')
+    database.extract_model_archive(entry, str(tmp_path / 'model'))
+
+    assert _extracted(tmp_path / 'model') == FILES
+    blob = database.model_blob_path(entry).read_bytes()
+    assert hashlib.sha256(blob).hexdigest() == entry['model_sha256']
+    assert blob == archive
+
+def test_legacy_base64_archive_moved_to_blob_store(data_dir, tmp_path):
+    archive = _archive()
+    write_data(data_dir)
+    data = database.load_data()
+    data['ml_models'] = [{'id': 1, 'model_name': 'recipe_classification', 'model_data': base64.b64encode(archive).decode()}]
+    database.save_data(data)
+    database.extract_model_archive(database.load_data()['ml_models'][0], str(tmp_path / 'inline'))
+
+    assert database.externalize_model_blobs() == 1
+    assert database.externalize_model_blobs() == 0
+
+    entry = database.load_data()['ml_models'][0]
+    assert 'model_data' not in entry
+    assert entry['model_sha256'] == hashlib.sha256(archive).hexdigest()
+    database.extract_model_archive(entry, str(tmp_path / 'blob'))
+    assert _extracted(tmp_path / 'inline') == _extracted(tmp_path / 'blob') == FILES
+
+def test_missing_blob_raises(data_dir, tmp_path):
+    model_sha256, _ = database.store_model_blob(_archive())
+    (database.MODELS_DIR / f'{model_sha256}.zip').unlink()
+
+    with pytest.raises(FileNotFoundError):
+        database.extract_model_archive({'model_sha256': model_sha256}, str(tmp_path / 'model'))
@@ -0,0 +1,115 @@
+"""Rétention des versions de modèles (model_gc)"""
+
+import os
+import time
+
+import database
+import model_gc
+import model_registry
+import sqlite_backend
+
+OLD = '2000-01-01 00:00:00'
+
+def _register(content: bytes, created_at=None, accuracy=None, active=False) -> int:
+    model_sha256, size = database.store_model_blob(content)
+    metadata = {'metrics': {'accuracy': accuracy}} if accuracy is not None else {}
+    model_id = model_registry.register_model(
+        'recipe_classification', 'classification', f'v{content.decode()}',
+        model_sha256, size, metadata, is_active=active
+    )
+    if created_at is not None:
+        model_registry.update_model(model_id, {'created_at': created_at})
+        # Archive aussi ancienne que la version
+        old = time.time() - 10 * model_gc.BLOB_GRACE_SECONDS
+        os.utime(database.MODELS_DIR / f'{model_sha256}.zip', (old, old))
+    return model_id
+
+def _ids():
+    return {m['id'] for m in model_registry.list_models()}
+
+def test_gc_keeps_just_registered_inactive_version(data_dir):
+    old_id = _register(b'1', created_at=OLD)
+    new_id = _register(b'2')  # Enregistrée, pas encore activée
+
+    report = model_gc.gc_models(keep_recent=0, keep_best=0)
+
+    assert _ids() == {new_id}
+    assert [m['id'] for m in report['removed']] == [old_id]
+    assert model_registry.load_model('recipe_classification', 'v2') is not None
+    assert database.model_blob_path(model_registry.load_model('recipe_classification', 'v2')).exists()
+
+def test_gc_keep_recent_below_one_keeps_latest_version(data_dir):
+    ids = [_register(str(i).encode(), created_at=OLD) for i in range(3)]
+
+    model_gc.gc_models(keep_recent=0, keep_best=0)
+
+    assert _ids() == {ids[-1]}
+
+def test_gc_retention_policy(data_dir):
+    best = _register(b'1', created_at=OLD, accuracy=0.9)
+    active = _register(b'2', created_at=OLD, accuracy=0.1)
+    dropped = [_register(str(i).encode(), created_at=OLD, accuracy=0.2) for i in range(3, 6)]
+    recent = _register(b'6', created_at=OLD, accuracy=0.3)
+    model_registry.activate_model(active, 'recipe_classification')
+
+    simulated = model_gc.gc_models(keep_recent=1, keep_best=1, dry_run=True)
+    assert len(_ids()) == 6
+    report = model_gc.gc_models(keep_recent=1, keep_best=1)
+
+    assert _ids() == {best, active, recent}
+    assert sorted(m['id'] for m in report['removed']) == dropped
+    assert simulated['versionsRemoved'] == report['versionsRemoved'] == 3
+    assert simulated['blobsRemoved'] == report['blobsRemoved'] == 3
+    assert len(list(database.MODELS_DIR.glob('*.zip'))) == 3
+
+def test_gc_keeps_young_orphan_blob(data_dir):
+    database.store_model_blob(b'orphan')  # Archive écrite, version pas encore enregistrée
+
+    report = model_gc.gc_models()
+
+    assert report['blobsRemoved'] == 0
+    assert len(list(database.MODELS_DIR.glob('*.zip'))) == 1
+
+def test_select_retained_legacy_versions_without_dates(data_dir):
+    models = [{'id': i, 'model_name': 'recipe_generation', 'created_at': None} for i in range(1, 5)]
+
+    assert model_gc.select_retained(models, keep_recent=2, keep_best=0) == {3, 4}
+
+def test_gc_keeps_version_activated_after_selection(data_dir, monkeypatch):
+    ids = [_register(str(i).encode(), created_at=OLD) for i in range(3)]
+    select_retained = model_gc.select_retained
+
+    def select_then_activate(*args, **kwargs):
+        retained = select_retained(*args, **kwargs)
+        # Activation concurrente d'une version que le GC va supprimer
+        model_registry.activate_model(ids[0], 'recipe_classification')
+        return retained
+
+    monkeypatch.setattr(model_gc, 'select_retained', select_then_activate)
+    monkeypatch.setattr(model_gc, 'BLOB_GRACE_SECONDS', 0)
+    report = model_gc.gc_models(keep_recent=1, keep_best=0)
+
+    assert _ids() == {ids[0], ids[2]}
+    assert report['versionsRemoved'] == 1
+    active = model_registry.load_model('recipe_classification')
+    assert active['id'] == ids[0]
+    assert database.model_blob_path(active).exists()
+
+def test_sqlite_gc_grace_period_follows_created_at(sqlite_dir):
+    def save(content: bytes) -> int:
+        return database.save_model_to_db('recipe_classification', 'classification', f'v{content.decode()}', content, {})
+
+    old_id, young_id, latest_id = save(b'1'), save(b'2'), save(b'3')
+    conn = sqlite_backend.get_connection()
+    with conn:
+        conn.execute('UPDATE ml_models SET created_at = ? WHERE id IN (?, ?)', (OLD, old_id, latest_id))
+    # Archive de la jeune version recopiée avec une ancienne date : seule created_at compte
+    young = model_gc._list_models()[1]
+    old = time.time() - 10 * model_gc.BLOB_GRACE_SECONDS
+    os.utime(database.model_blob_path(young), (old, old))
+
+    assert [m['created_at'] for m in model_gc._list_models()][0] == OLD
+    model_gc.gc_models(keep_recent=1, keep_best=0)
+
+    # L'ancienne version part malgré son archive fraîche, la jeune reste malgré la sienne
+    assert {m['id'] for m in model_gc._list_models()} == {young_id, latest_id}
@@ -0,0 +1,113 @@
+"""Registre des modèles : pointeurs de version active remplacés atomiquement"""
+
+import base64
+import json
+import threading
+
+import database
+import model_registry
+from conftest import write_data
+
+def _register(version: str, active: bool = False) -> int:
+    model_sha256, size = database.store_model_blob(version.encode())
+    return model_registry.register_model(
+        'recipe_generation', 'generation', version, model_sha256, size, {}, is_active=active
+    )
+
+def test_activate_rewrites_only_the_pointer(data_dir):
+    first = _register('v1', active=True)
+    second = _register('v2')
+    registry_before = model_registry.REGISTRY_FILE.read_bytes()
+    version_before = model_registry.active_model_version('recipe_generation')
+
+    model_registry.activate_model(second, 'recipe_generation')
+
+    assert model_registry.REGISTRY_FILE.read_bytes() == registry_before
+    assert model_registry.active_model_version('recipe_generation') != version_before
+    assert model_registry.load_model('recipe_generation')['id'] == second
+    assert json.loads((model_registry.ACTIVE_DIR / 'recipe_generation.json').read_text())['id'] == second
+    assert {m['id']: m['is_active'] for m in model_registry.list_models()} == {first: False, second: True}
+
+def test_pointer_always_readable_during_concurrent_activations(data_dir):
+    ids = [_register(f'v{i}') for i in range(4)]
+    model_registry.activate_model(ids[0], 'recipe_generation')
+    pointer_path = model_registry.ACTIVE_DIR / 'recipe_generation.json'
+    stop = threading.Event()
+    seen = set()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                # Jamais de pointeur absent ou partiel : remplacement par os.replace
+                seen.add(json.loads(pointer_path.read_text())['id'])
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for round_ in range(200):
+        model_registry.activate_model(ids[round_ % len(ids)], 'recipe_generation')
+    stop.set()
+    thread.join()
+
+    assert errors == []
+    assert seen <= set(ids)
+    assert not list(model_registry.ACTIVE_DIR.glob('*.tmp'))
+
+def test_activate_unknown_version_deactivates(data_dir):
+    _register('v1', active=True)
+
+    model_registry.activate_model(999, 'recipe_generation')
+
+    assert model_registry.active_model('recipe_generation') is None
+    assert model_registry.load_model('recipe_generation') is None
+
+def test_delete_never_removes_active_version(data_dir):
+    first = _register('v1', active=True)
+    second = _register('v2')
+
+    assert model_registry.delete_models([first, second]) == 1
+    assert [m['id'] for m in model_registry.list_models()] == [first]
+
+def test_migration_from_data_json(data_dir):
+    write_data(data_dir)
+    with database.transaction() as data:
+        data['ml_models'] = [
+            {'id': 3, 'model_name': 'recipe_generation', 'model_version': 'old', 'is_active': False,
+             'model_data': base64.b64encode(b'old archive').decode()},
+            {'id': 5, 'model_name': 'recipe_generation', 'model_version': 'new', 'is_active': True,
+             'model_data': base64.b64encode(b'new archive').decode()},
+        ]
+
+    active = model_registry.load_model('recipe_generation')
+
+    assert active['id'] == 5 and active['model_version'] == 'new'
+    assert database.model_blob_path(active).read_bytes() == b'new archive'
+    assert database.load_data()['ml_models'] == []
+    # Les versions suivantes continuent la numérotation
+    assert _register('v6') == 6
+
+def test_activation_during_delete_keeps_version(data_dir, monkeypatch):
+    first = _register('v1', active=True)
+    second = _register('v2')
+    write_pointer = model_registry._write_pointer
+    deleted = []
+
+    def racing_write_pointer(entry):
+        # Le GC supprime les versions inactives pendant l'activation (autre thread)
+        gc = threading.Thread(target=lambda: deleted.append(model_registry.delete_models([first, second])))
+        gc.start()
+        gc.join(0.5)
+        write_pointer(entry)
+        return gc
+
+    gcs = []
+    monkeypatch.setattr(model_registry, '_write_pointer', lambda entry: gcs.append(racing_write_pointer(entry)))
+    model_registry.activate_model(second, 'recipe_generation')
+    gcs[0].join(10)
+
+    # Le GC attend la fin de l'activation, relit le pointeur et garde la version activée
+    assert deleted == [1]
+    assert [m['id'] for m in model_registry.list_models()] == [second]
+    assert model_registry.load_model('recipe_generation')['id'] == second
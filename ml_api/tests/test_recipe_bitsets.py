@@ -0,0 +1,46 @@
+"""Masques d'exclusion (allergènes, régimes) : même résultat que le filtrage par chaînes"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import make_recipes, write_data
+from dataset_loader import _filter_recipes, load_recipe_catalog, load_recipe_dataset, load_recipe_dataset_filtered
+from recipe_bitsets import exclusion_keywords, has_excluded_ingredient
+
+ALLERGIES = [[], ['peanuts'], ['Milk ', 'eggs'], ['fish'], ['almond'], ['sauce', 'shellfish'], ['']]
+DIETS = [None, 'normal', 'vegetarian', 'vegan']
+
+@pytest.fixture
+def catalog(data_dir):
+    recipes = make_recipes(40)
+    extra = ['Peanut butter', 'fish sauce', 'Chicken breast', 'almond milk', 'shrimp', 'BACON bits']
+    for i, ingredient in enumerate(extra):
+        recipes[5 * i + 1]['ingredients'] = recipes[5 * i + 1]['ingredients'] + [ingredient]
+    write_data(data_dir, recipes=recipes)
+    return load_recipe_catalog()
+
+@pytest.mark.parametrize('allergies, diet', list(itertools.product(ALLERGIES, DIETS)))
+def test_bitsets_match_string_filter(catalog, allergies, diet):
+    keywords = exclusion_keywords(allergies, diet)
+    expected = np.array([
+        not has_excluded_ingredient(catalog.ingredients(i), keywords) for i in range(len(catalog))
+    ])
+
+    allowed = catalog.exclusion_bitsets().allowed(allergies, diet)
+
+    np.testing.assert_array_equal(allowed, expected)
+    positions = np.arange(0, len(catalog), 3)
+    np.testing.assert_array_equal(catalog.exclusion_bitsets().allowed(allergies, diet, positions), expected[positions])
+
+@pytest.mark.parametrize('recipe_type, cuisine, healthy', [
+    (None, None, None), ('savory', None, None), ('sweet', 'Italian', None), (None, 'Asian', True),
+])
+@pytest.mark.parametrize('allergies, diet', [([], None), (['peanuts', 'milk'], 'vegetarian'), (['almond'], 'vegan')])
+def test_filtered_dataset_matches_full_scan(catalog, recipe_type, cuisine, healthy, allergies, diet):
+    expected = _filter_recipes(load_recipe_dataset(), recipe_type, cuisine, healthy, allergies, diet)
+
+    filtered = load_recipe_dataset_filtered(recipe_type, cuisine, healthy, allergies, diet)
+
+    assert [r['id'] for r in filtered] == [r['id'] for r in expected]
@@ -0,0 +1,65 @@
+"""Regroupement des recettes quasi-identiques (MinHash + LSH)"""
+
+import numpy as np
+
+import recipe_dedup
+
+def _recipe(recipe_id, words):
+    return {'id': recipe_id, 'name': ' '.join(f'w{w}' for w in words), 'ingredients': []}
+
+def _jaccard(a, b):
+    a, b = set(recipe_dedup.recipe_tokens(a)), set(recipe_dedup.recipe_tokens(b))
+    return len(a & b) / len(a | b)
+
+def test_exact_duplicates_share_one_class():
+    recipes = [_recipe(1, range(10)), _recipe(2, range(50, 60)), _recipe(3, range(10))]
+
+    roots = recipe_dedup.duplicate_clusters(recipes)
+
+    assert roots.tolist() == [0, 1, 0]
+
+def test_chain_of_similar_recipes_is_not_merged():
+    # A ~ B et B ~ C (Jaccard 0.82), mais A et C trop différentes (0.67)
+    a, b, c = _recipe(1, range(0, 20)), _recipe(2, range(2, 22)), _recipe(3, range(4, 24))
+    assert _jaccard(a, b) > 0.8 and _jaccard(b, c) > 0.8 and _jaccard(a, c) < 0.7
+    threshold = 0.75
+
+    roots = recipe_dedup.duplicate_clusters([a, b, c], threshold, bands=64, rows=2)
+
+    assert roots[0] != roots[2]
+    assert len(set(roots.tolist())) == 2
+
+def test_groups_respect_threshold_for_every_pair():
+    rng = np.random.RandomState(0)
+    base = [rng.choice(200, 15, replace=False) for _ in range(20)]
+    recipes = []
+    for k, words in enumerate(base):
+        for variant in range(4):
+            # Variantes : un ou deux mots remplacés
+            changed = words.copy()
+            changed[:variant % 3] = 1000 + 10 * k + variant
+            recipes.append(_recipe(len(recipes) + 1, changed))
+    threshold = 0.7
+
+    roots = recipe_dedup.duplicate_clusters(recipes, threshold)
+    signatures = recipe_dedup.minhash_signatures(
+        [recipe_dedup.recipe_tokens(r) for r in recipes],
+        recipe_dedup.DEDUP_BANDS * recipe_dedup.DEDUP_ROWS
+    )
+
+    assert len(set(roots.tolist())) < len(recipes)
+    for root in set(roots.tolist()):
+        members = np.flatnonzero(roots == root)
+        assert root == members.min()
+        for i in members:
+            for j in members:
+                assert (signatures[i] == signatures[j]).mean() >= threshold
+
+def test_training_classes_map_duplicates_to_canonical_recipe():
+    recipes = [_recipe(10, range(10)), _recipe(11, range(20, 30)), _recipe(12, range(10))]
+
+    classes = recipe_dedup.training_classes(recipes)
+
+    assert classes.num_classes == 2
+    assert classes.labels.tolist() == [0, 1, 0]
+    assert classes.recipe_ids == [10, 11]
@@ -0,0 +1,111 @@
+"""Matrice des features de recettes précalculée (CSR en mémoire partagée)"""
+
+import numpy as np
+import pytest
+
+import recipe_features
+from conftest import make_recipes, write_data
+from dataset_loader import load_recipe_catalog
+from feature_extractor import FeatureExtractor
+from generation_model import GenerationModel
+
+@pytest.fixture
+def catalog(data_dir):
+    write_data(data_dir, recipes=make_recipes(40))
+    return load_recipe_catalog()
+
+@pytest.fixture
+def extractor(catalog):
+    extractor = FeatureExtractor()
+    extractor.build_vocabularies_from_catalog(catalog)
+    extractor.calculate_dataset_stats_from_catalog(catalog)
+    return extractor
+
+def test_matrix_rows_equal_per_recipe_features(catalog, extractor):
+    matrix = recipe_features.get_recipe_feature_matrix(catalog, extractor)
+
+    expected = np.array([extractor.extract_recipe_features(catalog.recipe(i)) for i in range(len(catalog))])
+    assert matrix.matrix.shape == expected.shape
+    np.testing.assert_allclose(matrix.matrix.toarray(), expected, rtol=1e-6, atol=1e-6)
+    assert matrix.ids.tolist() == [int(i) for i in catalog.ids]
+
+def test_matrix_reopened_from_disk(catalog, extractor, monkeypatch):
+    compiled = recipe_features.get_recipe_feature_matrix(catalog, extractor)
+    assert recipe_features.get_recipe_feature_matrix(catalog, extractor) is compiled
+
+    # Autre worker : cache vide, matrice lue sur disque en mmap
+    monkeypatch.setattr(recipe_features, '_matrices', {})
+    reopened = recipe_features.get_recipe_feature_matrix(catalog, extractor)
+
+    assert reopened is not compiled
+    # Vue en lecture seule du fichier mappé, pas une copie
+    assert not reopened.matrix.data.flags.owndata and not reopened.matrix.data.flags.writeable
+    assert (reopened.matrix != compiled.matrix).nnz == 0
+
+def test_request_scores_count_shared_features(catalog, extractor):
+    matrix = recipe_features.get_recipe_feature_matrix(catalog, extractor)
+    recipe = catalog.recipe(4)
+    request = extractor.extract_user_request_features_batch(
+        [recipe['ingredients'][:2]], [recipe['recipe_type']], [recipe['cuisine_type']],
+        [recipe['is_healthy']], [[]], extractor.stats, sparse=True
+    )
+
+    scores = matrix.scores(recipe_features.request_query(extractor, request))
+
+    # 2 ingrédients communs + type + cuisine + santé
+    assert scores[4] == pytest.approx(5.0)
+    assert scores.max() == pytest.approx(5.0)
+    np.testing.assert_allclose(matrix.scores(recipe_features.request_query(extractor, request), [4, 0]), scores[[4, 0]])
+
+class _FixedModel:
+    """Modèle Keras figé : mêmes probabilités pour toute requête"""
+
+    def __init__(self, probabilities):
+        self.probabilities = np.asarray([probabilities], dtype=np.float32)
+
+    def predict(self, X, verbose=0):
+        return self.probabilities
+
+def _generation_model(catalog, extractor):
+    model = GenerationModel()
+    model.catalog = catalog
+    model.feature_extractor = extractor
+    model.feature_matrix = recipe_features.get_recipe_feature_matrix(catalog, extractor)
+    model.sparse_input = False
+    return model
+
+def _request(extractor, recipe):
+    return extractor.extract_user_request_features_batch(
+        [recipe['ingredients']], [recipe['recipe_type']], [recipe['cuisine_type']],
+        [recipe['is_healthy']], [[]], extractor.stats
+    )[0]
+
+def test_generation_model_keeps_model_order(catalog, extractor):
+    model = _generation_model(catalog, extractor)
+    # La recette 4 correspond parfaitement à la requête, mais le modèle préfère la recette 1
+    probabilities = np.full(len(catalog), 0.02, dtype=np.float32)
+    probabilities[1] = 0.047
+    probabilities[4] = 0.025
+    model.model = _FixedModel(probabilities)
+    request = _request(extractor, catalog.recipe(4))
+
+    predictions = model.predict(request, top_k=3)
+
+    assert predictions[0]['recipeId'] == int(np.argmax(probabilities)) == 1
+    assert [p['score'] for p in predictions] == sorted((p['score'] for p in predictions), reverse=True)
+    assert predictions[1]['recipeId'] == 4
+    assert predictions[1]['matchScore'] == pytest.approx(1.0)
+    assert predictions[0]['matchScore'] < 1.0
+
+def test_generation_model_blends_feature_match_when_weighted(catalog, extractor):
+    model = _generation_model(catalog, extractor)
+    request = _request(extractor, catalog.recipe(4))
+    predictions = [{'recipeId': 1, 'score': 0.047}, {'recipeId': 4, 'score': 0.025}, {'recipeId': 2, 'score': 0.02}]
+
+    assert [r['recipeId'] for r in model.rerank([dict(p) for p in predictions], request, weight=0)] == [1, 4, 2]
+    assert [r['recipeId'] for r in model.rerank([dict(p) for p in predictions], request, weight=0.05)][0] == 1
+
+    ranked = model.rerank([dict(p) for p in predictions], request, weight=0.5)
+
+    assert ranked[0]['recipeId'] == 4
+    assert sorted(r['recipeId'] for r in ranked) == [1, 2, 4]
@@ -0,0 +1,94 @@
+"""Instantané partagé de data.json : réutilisé tant que rien ne change, rechargé sinon"""
+
+import json
+import os
+
+import database
+from conftest import make_recipes, write_data
+
+def _interaction(user_id, recipe_id):
+    return {'user_id': user_id, 'recipe_template_id': recipe_id, 'interaction_type': 'view'}
+
+def _rewrite_in_place(path, data):
+    """Réécriture externe non atomique : même inode, même taille, seul le mtime change"""
+    st = os.stat(path)
+    payload = json.dumps(data).encode('utf-8')
+    assert len(payload) == st.st_size
+    with open(path, 'r+b') as f:
+        f.write(payload)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert os.stat(path).st_ino == st.st_ino
+
+def test_snapshot_shared_between_reads(data_dir):
+    write_data(data_dir, recipes=make_recipes(5))
+
+    snapshot = database.load_snapshot()
+
+    assert database.load_snapshot() is snapshot
+    assert database.load_section('recipes') is snapshot['recipes']
+    assert [r['id'] for r in snapshot['recipes']] == [1, 2, 3, 4, 5]
+
+def test_journal_append_refreshes_snapshot_without_reindexing(data_dir):
+    write_data(data_dir, recipes=make_recipes(5), interactions=[_interaction(1, 1)])
+    before = database.load_snapshot()
+    sections = database._sections_state
+
+    database.append_interactions([_interaction(1, 2), _interaction(2, 3)])
+    after = database.load_snapshot()
+
+    assert after is not before
+    assert [i['recipe_template_id'] for i in after['interactions']] == [1, 2, 3]
+    assert [i['recipe_template_id'] for i in before['interactions']] == [1]
+    # Fichier de base inchangé : ni réindexé ni redécodé
+    assert database._sections_state is sections
+    assert after['recipes'] is before['recipes']
+    assert database.load_snapshot() is after
+
+def test_external_journal_append_is_seen(data_dir):
+    write_data(data_dir)
+    database.append_interactions([_interaction(1, 1)])
+    assert len(database.load_snapshot()['interactions']) == 1
+
+    # Autre processus : ajout direct au journal, sans passer par ce module
+    with open(data_dir / 'data.journal.ndjson', 'ab') as f:
+        f.write(json.dumps({'seq': 2, 'op': 'add_interaction', 'record': _interaction(4, 9)}).encode('utf-8') + b'\n')
+
+    assert [i['user_id'] for i in database.load_snapshot()['interactions']] == [1, 4]
+    assert database.load_user_interactions(4) == [_interaction(4, 9)]
+
+def test_external_atomic_rewrite_is_seen(data_dir):
+    write_data(data_dir, recipes=make_recipes(3))
+    before = database.load_snapshot()
+    version = database.catalog_version()
+
+    tmp = data_dir / 'data.json.tmp'
+    tmp.write_text(json.dumps({'recipes': make_recipes(4), 'user_profiles': [], 'interactions': []}), encoding='utf-8')
+    os.replace(tmp, data_dir / 'data.json')
+
+    assert len(database.load_section('recipes')) == 4
+    assert len(database.load_snapshot()['recipes']) == 4
+    assert len(before['recipes']) == 3
+    assert database.catalog_version() != version
+
+def test_external_in_place_rewrite_same_size_is_seen(data_dir):
+    recipes = make_recipes(3)
+    write_data(data_dir, recipes=recipes)
+    data = json.loads((data_dir / 'data.json').read_text(encoding='utf-8'))
+    assert database.load_section('recipes')[0]['name'] == 'Recipe 1'
+
+    data['recipes'][0]['name'] = 'Recipe X'
+    _rewrite_in_place(data_dir / 'data.json', data)
+
+    assert database.load_section('recipes')[0]['name'] == 'Recipe X'
+    assert database.load_snapshot()['recipes'][0]['name'] == 'Recipe X'
+
+def test_save_data_invalidates_even_with_same_signature(data_dir, monkeypatch):
+    write_data(data_dir, recipes=make_recipes(2))
+    assert len(database.load_section('recipes')) == 2
+    # Système de fichiers à résolution grossière : la signature ne change pas
+    signature = database._file_signature()
+    monkeypatch.setattr(database, '_file_signature', lambda: signature)
+
+    database.save_data({'recipes': make_recipes(3), 'user_profiles': [], 'interactions': []})
+
+    assert len(database.load_section('recipes')) == 3
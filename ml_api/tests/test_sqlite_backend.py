@@ -0,0 +1,57 @@
+"""Backend SQLite : version du catalogue et cache des recettes"""
+
+import database
+import sqlite_backend
+
+from conftest import make_recipes, write_data
+
+def _migrate(data_dir, recipes):
+    write_data(data_dir, recipes=recipes)
+    sqlite_backend.migrate_from_json()
+
+def test_catalog_version_changes_on_in_place_edit(sqlite_dir):
+    _migrate(sqlite_dir, make_recipes(5))
+    before = database.catalog_version()
+
+    # Même nombre de lignes, même id max, même seconde
+    conn = sqlite_backend.get_connection()
+    with conn:
+        conn.execute("UPDATE recipe_templates SET name = 'Renamed', updated_at = updated_at WHERE id = 2")
+
+    assert database.catalog_version() != before
+
+def test_catalog_version_changes_on_delete_and_reinsert(sqlite_dir):
+    _migrate(sqlite_dir, make_recipes(5))
+    conn = sqlite_backend.get_connection()
+    versions = {database.catalog_version()}
+    with conn:
+        conn.execute('DELETE FROM recipe_templates WHERE id = 3')
+    versions.add(database.catalog_version())
+    sqlite_backend.migrate_from_json()
+    versions.add(database.catalog_version())
+
+    assert len(versions) == 3
+
+def test_catalog_version_stable_without_recipe_writes(sqlite_dir):
+    _migrate(sqlite_dir, make_recipes(5))
+    before = database.catalog_version()
+
+    database.upsert_user_profile({'user_id': 1, 'email': 'a@x'})
+    database.append_interactions([{'user_id': 1, 'recipe_template_id': 1, 'interaction_type': 'like'}])
+
+    assert database.catalog_version() == before
+
+def test_load_recipe_templates_cached_per_version(sqlite_dir):
+    _migrate(sqlite_dir, make_recipes(5))
+
+    first = database.load_recipe_templates()
+    assert database.load_recipe_templates() is first
+    assert [r['id'] for r in first] == [1, 2, 3, 4, 5]
+
+    conn = sqlite_backend.get_connection()
+    with conn:
+        conn.execute("UPDATE recipe_templates SET name = 'Renamed' WHERE id = 2")
+
+    reloaded = database.load_recipe_templates()
+    assert reloaded is not first
+    assert reloaded[1]['name'] == 'Renamed'
@@ -0,0 +1,75 @@
+"""Synchronisation incrémentale des utilisateurs (source SQLite à la place de MySQL)"""
+
+import sqlite3
+
+import pytest
+
+import database
+import sync_existing_users
+
+@pytest.fixture
+def source(data_dir, monkeypatch):
+    monkeypatch.setattr(sync_existing_users, 'SYNC_STATE_FILE', data_dir / 'sync_state.json')
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, updated_at TEXT);
+        CREATE INDEX idx_users_updated_at ON users (updated_at);
+        CREATE TABLE user_profiles (
+            user_id INTEGER UNIQUE, age INTEGER, gender TEXT, activity_level TEXT,
+            dietary_preference TEXT, allergies TEXT, health_conditions TEXT, updated_at TEXT
+        );
+        CREATE INDEX idx_profiles_updated_at ON user_profiles (updated_at);
+    """)
+    yield conn
+    conn.close()
+
+def _sync(conn, **kwargs):
+    return sync_existing_users.sync_users_from_mysql(conn=conn, paramstyle='qmark', **kwargs)
+
+def _add_user(conn, user_id, updated_at, diet='normal', profile_updated_at=None):
+    conn.execute('INSERT INTO users VALUES (?, ?, ?)', (user_id, f'u{user_id}@x', updated_at))
+    conn.execute(
+        "INSERT INTO user_profiles VALUES (?, 30, 'other', 'light', ?, '[]', '[]', ?)",
+        (user_id, diet, profile_updated_at or updated_at)
+    )
+
+def test_incremental_sync_rereads_same_second_and_profile_changes(source):
+    for user_id in range(1, 6):
+        _add_user(source, user_id, f'2026-01-01 10:00:0{user_id}')
+
+    first = _sync(source, batch_size=2)
+    assert first['users'] == 5 and first['created'] == 5 and first['batches'] == 3
+    assert sync_existing_users.load_sync_state() == {'changed_at': '2026-01-01 10:00:05'}
+
+    # Même seconde que le filigrane, id plus petit que le dernier appliqué
+    source.execute("UPDATE users SET email = 'new@x' WHERE id = 2")
+    source.execute("UPDATE users SET updated_at = '2026-01-01 10:00:05' WHERE id = 2")
+    # Profil seul modifié
+    source.execute("UPDATE user_profiles SET dietary_preference = 'vegan', updated_at = '2026-01-01 10:00:07' WHERE user_id = 3")
+
+    second = _sync(source)
+
+    assert database.load_user_profile(2)['email'] == 'new@x'
+    assert database.load_user_profile(3)['dietary_preference'] == 'vegan'
+    assert sync_existing_users.load_sync_state() == {'changed_at': '2026-01-01 10:00:07'}
+    # Fenêtre de recouvrement : les utilisateurs récents sont relus, sans doublon
+    assert second['created'] == 0 and second['users'] == second['updated'] == 5
+
+def test_incremental_sync_skips_rows_before_overlap_window(source, monkeypatch):
+    monkeypatch.setattr(sync_existing_users, 'SYNC_OVERLAP_SECONDS', 60)
+    _add_user(source, 1, '2026-01-01 09:00:00')
+    _add_user(source, 2, '2026-01-01 10:00:00')
+    _sync(source)
+
+    _add_user(source, 3, '2026-01-01 10:00:30')
+    report = _sync(source)
+
+    assert report['users'] == 2  # Utilisateur 2 (recouvrement) et utilisateur 3
+    assert report['created'] == 1
+    assert database.load_user_profile(3) is not None
+
+def test_full_sync_ignores_watermark(source):
+    _add_user(source, 1, '2026-01-01 09:00:00')
+    _sync(source)
+
+    assert _sync(source, full=True)['users'] == 1
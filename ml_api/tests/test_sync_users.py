@@ -0,0 +1,78 @@
+"""Synchronisation groupée des utilisateurs (/api/ml/sync-users), backends JSON et SQLite"""
+
+import pytest
+
+import database
+from conftest import write_data
+
+@pytest.fixture(params=['json', 'sqlite'])
+def client(request, data_dir):
+    import app
+    if request.param == 'sqlite':
+        request.getfixturevalue('sqlite_dir')
+    else:
+        write_data(data_dir)
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
+
+def _user(user_id, email='u@x', **profile):
+    return {'userId': user_id, 'email': email, 'profile': {'allergies': [], 'health_conditions': [], **profile}}
+
+def _sync(client, users):
+    return client.post('/api/ml/sync-users', json={'users': users})
+
+def test_batch_over_limit_rejected(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'SYNC_USERS_MAX_BATCH', 2)
+
+    response = _sync(client, [_user(1), _user(2), _user(3)])
+
+    assert response.status_code == 413
+    assert database.load_user_profile(1) is None
+
+def test_users_must_be_a_list(client):
+    assert client.post('/api/ml/sync-users', json={'users': {'userId': 1}}).status_code == 400
+    assert client.post('/api/ml/sync-users', json={}).status_code == 400
+
+def test_per_record_statuses(client):
+    _sync(client, [_user(1, 'a@x', age=30)])
+
+    response = _sync(client, [
+        _user(1, 'a2@x', age=31),               # Déjà connu
+        _user(2, 'b@x', gender='female'),       # Nouveau
+        {'email': 'sans-id@x', 'profile': {}},  # userId manquant
+        _user(0),                               # userId vide, refusé comme /sync-user
+        'pas un objet',
+    ])
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [(r['userId'], r['status']) for r in body['results']] == [
+        (1, 'updated'), (2, 'created'), (None, 'error'), (None, 'error'), (None, 'error')
+    ]
+    assert all(r['error'] == 'userId is required' for r in body['results'] if r['status'] == 'error')
+    assert 'error' not in body['results'][0]
+    assert (body['synced'], body['created'], body['updated'], body['errors']) == (2, 1, 1, 3)
+    assert body['success'] is False
+    assert database.load_user_profile(1)['age'] == 31
+    assert database.load_user_profile(2)['gender'] == 'female'
+
+def test_duplicate_ids_in_one_batch(client):
+    response = _sync(client, [_user(5, 'first@x', age=20), _user(5, 'last@x', age=21)])
+
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['created', 'updated']
+    assert body['success'] is True
+    # Dernier enregistrement du lot retenu
+    profile = database.load_user_profile(5)
+    assert (profile['email'], profile['age']) == ('last@x', 21)
+
+def test_resync_without_email_keeps_stored_email(client):
+    _sync(client, [_user(7, 'kept@x', age=40)])
+
+    response = _sync(client, [_user(7, None, age=41)])
+
+    assert response.get_json()['results'] == [{'userId': 7, 'status': 'updated'}]
+    profile = database.load_user_profile(7)
+    assert profile['email'] == 'kept@x'
+    assert profile['age'] == 41
@@ -0,0 +1,84 @@
+"""Pipeline tf.data d'entraînement : lots denses et creux, labels alignés, prédictions par lot"""
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+tf = pytest.importorskip('tensorflow')
+
+from training_data import make_dataset, predict_classes
+
+def _data(n=53, features=12, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((n, features), dtype=np.float32)
+    X[X < 0.7] = 0.0
+    # La première colonne identifie la ligne : on retrouve son label dans chaque lot
+    X[:, 0] = np.arange(n)
+    y = (np.arange(n) * 7) % 5
+    return X, y
+
+def _batches(dataset):
+    batches = []
+    for features, labels in dataset:
+        if isinstance(features, tf.SparseTensor):
+            features = tf.sparse.to_dense(features)
+        batches.append((features.numpy(), labels.numpy()))
+    return batches
+
+def test_sparse_batches_equal_dense_batches():
+    X, y = _data()
+
+    dense = _batches(make_dataset(X, y, batch_size=8))
+    sparse = _batches(make_dataset(sp.csr_matrix(X), y, batch_size=8))
+
+    assert len(dense) == len(sparse) == 7
+    for (dense_x, dense_y), (sparse_x, sparse_y) in zip(dense, sparse):
+        np.testing.assert_array_equal(dense_x, sparse_x)
+        np.testing.assert_array_equal(dense_y, sparse_y)
+    np.testing.assert_array_equal(np.concatenate([b[0] for b in dense]), X)
+    np.testing.assert_array_equal(np.concatenate([b[1] for b in dense]), y)
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_labels_follow_rows_after_shuffle(sparse):
+    X, y = _data()
+    dataset = make_dataset(sp.csr_matrix(X) if sparse else X, y, batch_size=8, shuffle=True, seed=3)
+
+    epochs = []
+    for _ in range(2):
+        rows = []
+        for features, labels in _batches(dataset):
+            ids = features[:, 0].astype(np.int64)
+            np.testing.assert_array_equal(labels, y[ids])
+            np.testing.assert_array_equal(features, X[ids])
+            rows.extend(ids)
+        assert sorted(rows) == list(range(len(X)))
+        epochs.append(rows)
+
+    # Ordre différent à chaque epoch, jamais l'ordre d'origine
+    assert epochs[0] != epochs[1]
+    assert epochs[0] != list(range(len(X)))
+
+def test_dense_batches_read_from_the_array():
+    X, y = _data()
+    dataset = make_dataset(X, y, batch_size=8)
+
+    # Aucune copie de la matrice dans le graphe : une modification est visible au lot suivant
+    X[0, 1] = 99.0
+    first_features, _ = next(iter(dataset))
+
+    assert first_features.numpy()[0, 1] == 99.0
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_predict_classes_matches_predict_argmax(sparse):
+    X, y = _data()
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(X.shape[1],), sparse=sparse),
+        tf.keras.layers.Dense(6, activation='relu'),
+        tf.keras.layers.Dense(5, activation='softmax'),
+    ])
+
+    predicted = predict_classes(model, make_dataset(sp.csr_matrix(X) if sparse else X, y, batch_size=8))
+
+    np.testing.assert_array_equal(predicted, np.argmax(model.predict(X, verbose=0), axis=1))
+    assert predict_classes(model, make_dataset(X[:0], y[:0], batch_size=8)).shape == (0,)
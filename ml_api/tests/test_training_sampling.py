@@ -0,0 +1,98 @@
+"""Requêtes d'entraînement simulées, tirées en une fois avec NumPy"""
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from classification_model import ClassificationModel
+from conftest import make_recipes
+from feature_extractor import COMMON_ALLERGENS, FeatureExtractor
+
+CUISINES = ['Italian', 'Tunisian', 'French', 'Asian', 'Mediterranean', 'Mexican', 'Indian', 'American', 'Other']
+PER_RECIPE = 400
+
+@pytest.fixture
+def extractor():
+    extractor = FeatureExtractor()
+    extractor.build_vocabularies(make_recipes(30))
+    return extractor
+
+def _sample(extractor, recipes, seed=0, **kwargs):
+    np.random.seed(seed)
+    return extractor.extract_sampled_request_features(recipes, PER_RECIPE, CUISINES, **kwargs)
+
+def _layout(extractor):
+    vocab_size = extractor.ingredient_width()
+    cuisine_size = len(extractor.cuisine_types) or 10
+    return vocab_size, vocab_size + 1, vocab_size + 1 + cuisine_size
+
+def test_rows_follow_their_recipe(extractor):
+    recipes = make_recipes(30)
+    X = _sample(extractor, recipes)
+    vocab_size, cuisine_col, healthy_col = _layout(extractor)
+    assert X.shape == (len(recipes) * PER_RECIPE, healthy_col + 1 + len(COMMON_ALLERGENS))
+
+    for position, recipe in enumerate(recipes):
+        rows = X[position * PER_RECIPE:(position + 1) * PER_RECIPE]
+        own = [extractor.ingredient_column(extractor.ingredient_key(ing))[0] for ing in recipe['ingredients']]
+        outside = np.delete(rows[:, :vocab_size], own, axis=1)
+        assert not outside.any()
+        # 30 à 80 % des ingrédients, au moins un, sans remise
+        counts = rows[:, own].sum(axis=1)
+        assert counts.min() >= max(1, int(len(own) * 0.3))
+        assert counts.max() <= max(1, int(len(own) * 0.8))
+        assert set(np.unique(rows[:, own])) <= {0.0, 1.0}
+
+        assert (rows[:, vocab_size] == (recipe['recipe_type'] != 'sweet')).all()
+        assert (rows[:, healthy_col] == recipe['is_healthy']).all()
+        assert not rows[:, healthy_col + 1:].any()
+        # Une cuisine au plus (les cuisines tirées hors vocabulaire restent vides)
+        assert rows[:, cuisine_col:healthy_col].sum(axis=1).max() == 1
+
+def test_sampling_rates(extractor):
+    recipes = make_recipes(30)
+    X = _sample(extractor, recipes)
+    _, cuisine_col, healthy_col = _layout(extractor)
+
+    # Cuisine de la recette dans 70 % des cas, plus les tirages au hasard qui retombent dessus
+    recipe_cuisines = np.repeat([extractor.cuisine_types[r['cuisine_type'].lower()] for r in recipes], PER_RECIPE)
+    matches = X[np.arange(X.shape[0]), cuisine_col + recipe_cuisines].mean()
+    assert matches == pytest.approx(0.7 + 0.3 / len(CUISINES), abs=0.02)
+
+    # Chaque ingrédient d'une recette a la même chance d'être tiré
+    recipe = recipes[3]
+    rows = X[3 * PER_RECIPE:4 * PER_RECIPE]
+    own = [extractor.ingredient_column(extractor.ingredient_key(ing))[0] for ing in recipe['ingredients']]
+    frequencies = rows[:, own].mean(axis=0)
+    assert frequencies.max() - frequencies.min() < 0.15
+
+def test_sparse_matches_dense(extractor):
+    recipes = make_recipes(12)
+    dense = _sample(extractor, recipes, seed=7)
+    sparse = _sample(extractor, recipes, seed=7, sparse=True)
+    assert sp.issparse(sparse)
+    np.testing.assert_array_equal(sparse.toarray(), dense)
+
+def test_training_data_labels_follow_rows():
+    recipes = make_recipes(40)
+    model = ClassificationModel()
+    model.dedup_threshold = None
+    model.sparse_input = False
+    np.random.seed(0)
+    X_train, y_train, X_val, y_val, X_test, y_test = model.prepare_training_data(recipes)
+
+    X = np.vstack([X_train, X_val, X_test])
+    y = np.concatenate([y_train, y_val, y_test])
+    per_recipe = max(20, 5000 // len(recipes))
+    assert X.shape[0] == len(y) == len(recipes) * per_recipe
+    assert len(y_train) == int(len(y) * 0.7)
+    np.testing.assert_array_equal(y, np.repeat(np.arange(len(recipes)), per_recipe))
+
+    # Chaque ligne ne contient que des ingrédients de la recette de son label
+    extractor = model.feature_extractor
+    vocab_size = extractor.ingredient_width()
+    for label in (0, 17, len(recipes) - 1):
+        own = [extractor.ingredient_column(extractor.ingredient_key(ing))[0] for ing in recipes[label]['ingredients']]
+        rows = X[y == label, :vocab_size]
+        assert not np.delete(rows, own, axis=1).any()
+        assert (rows[:, own].sum(axis=1) >= 1).all()
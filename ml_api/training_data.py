@@ -0,0 +1,80 @@
+"""
+Pipeline d'entraînement tf.data pour les modèles de classification et de génération
+Les labels sont des entiers (une classe par exemple, perte sparse_categorical_crossentropy) :
+pas de matrice one-hot exemples x classes, la mémoire reste proportionnelle au nombre
+d'exemples. Le dataset parcourt des lots d'index d'exemples ; chaque lot est lu dans les
+features (lignes denses lues dans le tableau NumPy, sans copie de la matrice dans le graphe,
+ou tranches de la matrice CSR en SparseTensor pour les modèles à entrée creuse) par un map
+parallèle, avec préchargement du lot suivant.
+"""
+
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+import tensorflow as tf
+
+def make_dataset(
+    X,
+    y: np.ndarray,
+    batch_size: int,
+    shuffle: bool = False,
+    seed: Optional[int] = None
+) -> tf.data.Dataset:
+    """
+    Dataset de lots (features, labels entiers) pour model.fit / evaluate.
+    X : ndarray (N x F) ou scipy.sparse (lots en tf.SparseTensor) ; shuffle : ordre
+    aléatoire différent à chaque epoch (comme model.fit sur des tableaux)
+    """
+    n = X.shape[0]
+    labels = tf.constant(np.asarray(y, dtype=np.int32))
+
+    if sp.issparse(X):
+        X = sp.csr_matrix(X, dtype=np.float32)
+        X.sum_duplicates()  # Colonnes triées dans chaque ligne : SparseTensor ordonné
+        indptr = tf.constant(X.indptr.astype(np.int64))
+        indices = tf.constant(X.indices.astype(np.int64))
+        data = tf.constant(X.data)
+        n_features = X.shape[1]
+
+        def gather(rows):
+            # Positions des valeurs non nulles de chaque ligne du lot
+            positions = tf.ragged.range(tf.gather(indptr, rows), tf.gather(indptr, rows + 1))
+            sparse_indices = tf.stack(
+                [positions.value_rowids(), tf.gather(indices, positions.flat_values)], axis=1
+            )
+            features = tf.SparseTensor(
+                sparse_indices,
+                tf.gather(data, positions.flat_values),
+                tf.stack([tf.size(rows, out_type=tf.int64), n_features])
+            )
+            return features, tf.gather(labels, rows)
+    else:
+        # Lignes du lot lues dans le tableau lui-même (pas de tf.constant : la matrice
+        # d'entraînement n'est pas recopiée dans le graphe)
+        X = np.asarray(X, dtype=np.float32)
+        n_features = X.shape[1]
+
+        def gather(rows):
+            features = tf.numpy_function(lambda r: X[r], [rows], tf.float32, stateful=False)
+            features.set_shape([None, n_features])
+            return features, tf.gather(labels, rows)
+
+    dataset = tf.data.Dataset.range(n)
+    if shuffle:
+        dataset = dataset.shuffle(n, seed=seed, reshuffle_each_iteration=True)
+    return (
+        dataset.batch(batch_size)
+        .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+def predict_classes(model, dataset: tf.data.Dataset) -> np.ndarray:
+    """Classe prédite de chaque exemple (argmax par lot, sans matrice exemples x classes complète)"""
+    predictions = [
+        np.argmax(model.predict_on_batch(features), axis=1)
+        for features, _ in dataset
+    ]
+    if not predictions:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(predictions)